@@ -1,6 +1,8 @@
 import logging
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
 import base64
+import inspect
 import os
 import sys
 import subprocess
@@ -8,15 +10,14 @@ import time
 
 import mcp.types as types
 # Import vnc_client from the current directory
-from vnc_client import VNCClient, capture_vnc_screen
+from vnc_client import capture_vnc_screen, capture_vnc_screen_region, wait_for_vnc_screen
+from image_encoder import IMAGE_FORMATS, image_options
+from screen_geometry import screen_geometry
+from vnc_session import session_pool
+from host_registry import DEFAULT_HOST, MacHost, load_hosts
+from metrics import metrics
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger('action_handlers')
-logger.setLevel(logging.DEBUG)
 
 # Load environment variables for VNC connection
 MACOS_HOST = os.environ.get('MACOS_HOST', '')
@@ -39,34 +40,70 @@ if not MACOS_HOST:
 if not MACOS_PASSWORD:
     logger.warning("MACOS_PASSWORD environment variable is not set")
 
+# Machines the tools can drive: the MACOS_HOST one (selected when a call names no host)
+# plus any fleet from MACOS_HOSTS / MACOS_HOSTS_FILE, which shares its credentials by default
+hosts = load_hosts(
+    default=MacHost(DEFAULT_HOST, MACOS_HOST, MACOS_PORT, MACOS_PASSWORD, MACOS_USERNAME, VNC_ENCRYPTION,
+                    pool=session_pool) if MACOS_HOST else None,
+    defaults={"password": MACOS_PASSWORD, "username": MACOS_USERNAME, "encryption": VNC_ENCRYPTION}
+)
+
+
+def _source_size(arguments: dict[str, Any]) -> Tuple[Optional[int], Optional[int]]:
+    """Read the source_width/source_height the coordinates refer to.
+
+    Missing values are returned as None and default to the size of the screenshots.
+    """
+    source_size = tuple(None if arguments.get(key) is None else int(arguments[key])
+                        for key in ("source_width", "source_height"))
+    if any(value is not None and value <= 0 for value in source_size):
+        raise ValueError("Source dimensions must be positive values")
+    return source_size
+
 
 async def handle_remote_macos_get_screen(arguments: dict[str, Any]) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
     """Connect to a remote MacOs machine and get a screenshot of the remote desktop."""
-    # Use environment variables
-    host = MACOS_HOST
-    port = MACOS_PORT
-    password = MACOS_PASSWORD
-    username = MACOS_USERNAME
-    encryption = VNC_ENCRYPTION
+    # Connection details of the machine the call targets
+    target = hosts.resolve(arguments.get("host"))
+    host, port, password, username, encryption = (
+        target.host, target.port, target.password, target.username, target.encryption)
+
+    # Screenshot encoding options; anything not given uses the server defaults. Checked
+    # before connecting, as a failed capture discards its pooled connection
+    quality = arguments.get("quality")
+    compression = arguments.get("compression")
+    try:
+        image_format = image_options(arguments.get("format"), quality, compression)[0]
+    except ValueError as e:
+        return [types.TextContent(type="text", text=f"Error: {str(e)}")]
+    since_frame = arguments.get("since_frame")
+    show_cursor = bool(arguments.get("show_cursor", False))
 
     # Capture screen using helper method
+    frame_info = {}
     success, screen_data, error_message, dimensions = await capture_vnc_screen(
-        host=host, port=port, password=password, username=username, encryption=encryption
+        host=host, port=port, password=password, username=username, encryption=encryption,
+        pool=target.pool, frame_info=frame_info, image_format=image_format, quality=quality,
+        compression=compression, since_frame=since_frame, show_cursor=show_cursor
     )
 
     if not success:
         return [types.TextContent(type="text", text=error_message)]
 
+    if frame_info.get("regions") is not None:
+        return _delta_screen_result(frame_info, since_frame, image_format, dimensions)
+
     # Encode image in base64
-    base64_data = base64.b64encode(screen_data).decode('utf-8')
+    with metrics.timer("vnc_capture_stage_seconds", stage="base64"):
+        base64_data = base64.b64encode(screen_data).decode('utf-8')
 
     # Return image content with dimensions
     width, height = dimensions
-    return [
+    result = [
         types.ImageContent(
             type="image",
             data=base64_data,
-            mimeType="image/png",
+            mimeType=IMAGE_FORMATS[image_format],
             alt_text=f"Screenshot from remote MacOs machine at {host}:{port}"
         ),
         types.TextContent(
@@ -74,52 +111,248 @@ async def handle_remote_macos_get_screen(arguments: dict[str, Any]) -> list[type
             text=f"Image dimensions: {width}x{height}"
         )
     ]
+    if frame_info.get("age_ms") is not None:
+        result.append(types.TextContent(
+            type="text",
+            text=f"Frame sequence: {frame_info['sequence']}, age: {frame_info['age_ms']}ms"
+        ))
+    if frame_info.get("frame"):
+        result.append(types.TextContent(
+            type="text",
+            text=f"Frame: {frame_info['frame']} (pass as since_frame to get only the changes)"
+        ))
+    return result
+
+
+def _delta_screen_result(frame_info: dict[str, Any], since_frame: str, image_format: str,
+                         dimensions: Tuple[int, int]) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    """Build the reply for a screenshot that only contains the regions changed since an earlier frame."""
+    regions = frame_info["regions"]
+    if not regions:
+        return [types.TextContent(type="text", text=f"No change since frame {since_frame}. Frame: {frame_info['frame']}")]
+
+    width, height = dimensions
+    result = [types.TextContent(
+        type="text",
+        text=f"{len(regions)} region(s) changed since frame {since_frame} on the {width}x{height} screen. "
+             f"Frame: {frame_info['frame']}"
+    )]
+    for region in regions:
+        result.append(types.TextContent(
+            type="text",
+            text=f"Region at x={region['x']}, y={region['y']}, size {region['width']}x{region['height']}:"
+        ))
+        result.append(types.ImageContent(
+            type="image",
+            data=base64.b64encode(region["data"]).decode('utf-8'),
+            mimeType=IMAGE_FORMATS[image_format]
+        ))
+    return result
+
+
+async def handle_remote_macos_get_screen_region(arguments: dict[str, Any]) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    """Capture one region of the remote screen at native or requested resolution."""
+    # Connection details of the machine the call targets
+    target = hosts.resolve(arguments.get("host"))
+    host, port, password, username, encryption = (
+        target.host, target.port, target.password, target.username, target.encryption)
+
+    # Get required parameters from arguments
+    x = arguments.get("x")
+    y = arguments.get("y")
+    width = arguments.get("width")
+    height = arguments.get("height")
+    source_size = _source_size(arguments)
+    output_width = arguments.get("output_width")
+    output_height = arguments.get("output_height")
+
+    if x is None or y is None or width is None or height is None:
+        raise ValueError("x, y, width and height are required")
+
+    # Ensure region dimensions are positive
+    if int(width) <= 0 or int(height) <= 0:
+        raise ValueError("Region width and height must be positive values")
+
+    quality = arguments.get("quality")
+    compression = arguments.get("compression")
+    try:
+        image_format = image_options(arguments.get("format"), quality, compression)[0]
+    except ValueError as e:
+        return [types.TextContent(type="text", text=f"Error: {str(e)}")]
+    frame_info = {}
+    success, screen_data, error_message, dimensions = await capture_vnc_screen_region(
+        host=host, port=port, password=password, region=(int(x), int(y), int(width), int(height)),
+        source_size=source_size, username=username, encryption=encryption,
+        pool=target.pool, output_size=(output_width and int(output_width), output_height and int(output_height)),
+        image_format=image_format, quality=quality, compression=compression,
+        frame_info=frame_info, show_cursor=bool(arguments.get("show_cursor", False))
+    )
+
+    if not success:
+        return [types.TextContent(type="text", text=error_message)]
+
+    region_x, region_y, region_width, region_height = frame_info["region"]
+    image_width, image_height = dimensions
+    with metrics.timer("vnc_capture_stage_seconds", stage="base64"):
+        base64_data = base64.b64encode(screen_data).decode('utf-8')
+    return [
+        types.ImageContent(
+            type="image",
+            data=base64_data,
+            mimeType=IMAGE_FORMATS[image_format],
+            alt_text=f"Screen region from remote MacOs machine at {host}:{port}"
+        ),
+        types.TextContent(
+            type="text",
+            text=f"Image dimensions: {image_width}x{image_height} "
+                 f"(screen pixels x={region_x}, y={region_y}, size {region_width}x{region_height})"
+        )
+    ]
+
+
+async def handle_remote_macos_get_screens(arguments: dict[str, Any]) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    """Capture the screens of several remote MacOs machines concurrently.
+
+    Every machine is captured in its own worker thread over its own session pool,
+    so one slow handshake does not delay the others. Machines that fail or do not
+    answer within the timeout are reported, and the other screenshots are returned.
+    """
+    names = arguments.get("hosts") or hosts.names()
+    timeout = float(arguments.get("timeout", 15))
+    thumbnail_size = tuple(None if arguments.get(key) is None else int(arguments[key])
+                           for key in ("thumbnail_width", "thumbnail_height"))
+
+    if not isinstance(names, list):
+        raise ValueError("hosts must be a list of host names")
+    if not 0 < timeout <= 120:
+        raise ValueError("timeout must be between 0 and 120 seconds")
+    if any(size is not None and size <= 0 for size in thumbnail_size):
+        raise ValueError("Thumbnail dimensions must be positive values")
+    quality = arguments.get("quality")
+    try:
+        image_format = image_options(arguments.get("format"), quality)[0]
+    except ValueError as e:
+        return [types.TextContent(type="text", text=f"Error: {str(e)}")]
+    # Resolve every name before connecting anywhere, so a typo fails the whole call
+    targets = [hosts.resolve(name) for name in dict.fromkeys(names)]
+    if not targets:
+        raise ValueError("No remote MacOs machine is configured (set MACOS_HOST, MACOS_HOSTS or MACOS_HOSTS_FILE)")
+
+    async def capture(target):
+        try:
+            return await asyncio.wait_for(capture_vnc_screen(
+                host=target.host, port=target.port, password=target.password, username=target.username,
+                encryption=target.encryption, pool=target.pool, image_format=image_format, quality=quality,
+                thumbnail_size=thumbnail_size if any(thumbnail_size) else None
+            ), timeout)
+        except asyncio.TimeoutError:
+            # The capture keeps running in its worker thread and returns its connection to the pool
+            return False, None, f"No screenshot within {timeout:g}s", None
+        except Exception as e:
+            return False, None, str(e), None
+
+    start_time = time.time()
+    captures = await asyncio.gather(*(capture(target) for target in targets))
+
+    results: list[types.TextContent | types.ImageContent | types.EmbeddedResource] = []
+    captured = 0
+    for target, (success, screen_data, error_message, dimensions) in zip(targets, captures):
+        if not success:
+            results.append(types.TextContent(type="text", text=f"Host {target.name} failed: {error_message}"))
+            continue
+        captured += 1
+        width, height = dimensions
+        results.append(types.TextContent(
+            type="text",
+            text=f"Host {target.name} ({target.host}:{target.port}): image dimensions {width}x{height}"
+        ))
+        results.append(types.ImageContent(
+            type="image",
+            data=base64.b64encode(screen_data).decode('utf-8'),
+            mimeType=IMAGE_FORMATS[image_format],
+            alt_text=f"Screenshot from remote MacOs machine {target.name}"
+        ))
+
+    processing_time = round(time.time() - start_time, 3)
+    results.append(types.TextContent(
+        type="text",
+        text=f"Captured {captured}/{len(targets)} hosts\nProcessing time: {processing_time}s"
+    ))
+    return results
+
+
+async def handle_remote_macos_wait_for_screen(arguments: dict[str, Any]) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    """Wait until the remote screen (or a region of it) changes or becomes stable."""
+    # Connection details of the machine the call targets
+    target = hosts.resolve(arguments.get("host"))
+    host, port, password, username, encryption = (
+        target.host, target.port, target.password, target.username, target.encryption)
+
+    until = arguments.get("until", "change")
+    stable_ms = int(arguments.get("stable_ms", 500))
+    timeout = float(arguments.get("timeout", 10))
+    source_size = _source_size(arguments)
+
+    if until not in ("change", "stable"):
+        raise ValueError("until must be 'change' or 'stable'")
+    if stable_ms < 0 or not 0 < timeout <= 120:
+        raise ValueError("stable_ms must not be negative and timeout must be between 0 and 120 seconds")
+
+    region = None
+    bounds = [arguments.get(key) for key in ("x", "y", "width", "height")]
+    if any(value is not None for value in bounds):
+        if any(value is None for value in bounds):
+            raise ValueError("x, y, width and height must be given together")
+        region = tuple(int(value) for value in bounds)
+
+    success, result, error_message, _ = await wait_for_vnc_screen(
+        host=host, port=port, password=password, username=username, encryption=encryption,
+        pool=target.pool, until=until, region=region, source_size=source_size,
+        stable_ms=stable_ms, timeout=timeout
+    )
+
+    if not success:
+        return [types.TextContent(type="text", text=error_message)]
+
+    subject = "Screen region" if region else "Screen"
+    if result["status"] == "changed":
+        text = f"{subject} changed after {result['elapsed_ms']}ms."
+    elif result["status"] == "stable":
+        text = (f"{subject} stable for {stable_ms}ms after {result['elapsed_ms']}ms "
+                f"({result['changes']} change(s) while waiting).")
+    else:
+        text = f"Timed out after {result['elapsed_ms']}ms ({result['changes']} change(s) while waiting)."
+    return [types.TextContent(type="text", text=f"{text} Frame: {result['frame']}")]
 
 
 def handle_remote_macos_mouse_scroll(arguments: dict[str, Any]) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
     """Perform a mouse scroll action on a remote MacOs machine."""
-    # Use environment variables
-    host = MACOS_HOST
-    port = MACOS_PORT
-    password = MACOS_PASSWORD
-    username = MACOS_USERNAME
-    encryption = VNC_ENCRYPTION
+    # Connection details of the machine the call targets
+    target = hosts.resolve(arguments.get("host"))
+    host, port, password, username, encryption = (
+        target.host, target.port, target.password, target.username, target.encryption)
 
     # Get required parameters from arguments
     x = arguments.get("x")
     y = arguments.get("y")
-    source_width = int(arguments.get("source_width", 1366))
-    source_height = int(arguments.get("source_height", 768))
+    source_size = _source_size(arguments)
     direction = arguments.get("direction", "down")
 
     if x is None or y is None:
         raise ValueError("x and y coordinates are required")
 
-    # Ensure source dimensions are positive
-    if source_width <= 0 or source_height <= 0:
-        raise ValueError("Source dimensions must be positive values")
-
-    # Initialize VNC client
-    vnc = VNCClient(host=host, port=port, password=password, username=username, encryption=encryption)
-
-    # Connect to remote MacOs machine
-    success, error_message = vnc.connect()
-    if not success:
+    # Get a connected VNC client from the session pool
+    vnc, error_message = target.pool.acquire(host, port, password, username, encryption)
+    if vnc is None:
         error_msg = f"Failed to connect to remote MacOs machine at {host}:{port}. {error_message}"
         return [types.TextContent(type="text", text=error_msg)]
 
     try:
-        # Get target screen dimensions
-        target_width = vnc.width
-        target_height = vnc.height
-
-        # Scale coordinates
-        scaled_x = int((x / source_width) * target_width)
-        scaled_y = int((y / source_height) * target_height)
-
-        # Ensure coordinates are within the screen bounds
-        scaled_x = max(0, min(scaled_x, target_width - 1))
-        scaled_y = max(0, min(scaled_y, target_height - 1))
+        # Map the coordinates with the cached geometry of this screen size
+        geometry = screen_geometry(vnc.width, vnc.height)
+        source_width, source_height = geometry.resolve_source(source_size)
+        target_width, target_height = geometry.screen_size
+        scaled_x, scaled_y = geometry.to_screen(x, y, source_size)
 
         # First move the mouse to the target location without clicking
         move_result = vnc.send_pointer_event(scaled_x, scaled_y, 0)
@@ -132,13 +365,10 @@ def handle_remote_macos_mouse_scroll(arguments: dict[str, Any]) -> list[types.Te
 
         # Send the appropriate page key based on direction
         key = special_keys["up" if direction.lower() == "up" else "down"]
-        key_result = vnc.send_key_event(key, True) and vnc.send_key_event(key, False)
+        key_result = vnc.send_key_combination([key])
 
         # Prepare the response with useful details
-        scale_factors = {
-            "x": target_width / source_width,
-            "y": target_height / source_height
-        }
+        scale_x, scale_y = geometry.source_scale(source_size)
 
         return [types.TextContent(
             type="text",
@@ -146,87 +376,66 @@ def handle_remote_macos_mouse_scroll(arguments: dict[str, Any]) -> list[types.Te
 Page {direction} key press {'succeeded' if key_result else 'failed'}
 Source dimensions: {source_width}x{source_height}
 Target dimensions: {target_width}x{target_height}
-Scale factors: {scale_factors['x']:.4f}x, {scale_factors['y']:.4f}y"""
+Scale factors: {scale_x:.4f}x, {scale_y:.4f}y"""
         )]
     finally:
-        # Close VNC connection
-        vnc.close()
+        # Return VNC connection to the pool for the next call
+        target.pool.release(vnc)
 
 
 def handle_remote_macos_mouse_click(arguments: dict[str, Any]) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
     """Perform a mouse click action on a remote MacOs machine."""
-    # Use environment variables
-    host = MACOS_HOST
-    port = MACOS_PORT
-    password = MACOS_PASSWORD
-    username = MACOS_USERNAME
-    encryption = VNC_ENCRYPTION
+    # Connection details of the machine the call targets
+    target = hosts.resolve(arguments.get("host"))
+    host, port, password, username, encryption = (
+        target.host, target.port, target.password, target.username, target.encryption)
 
     # Get required parameters from arguments
     x = arguments.get("x")
     y = arguments.get("y")
-    source_width = int(arguments.get("source_width", 1366))
-    source_height = int(arguments.get("source_height", 768))
+    source_size = _source_size(arguments)
     button = int(arguments.get("button", 1))
 
     if x is None or y is None:
         raise ValueError("x and y coordinates are required")
 
-    # Ensure source dimensions are positive
-    if source_width <= 0 or source_height <= 0:
-        raise ValueError("Source dimensions must be positive values")
-
-    # Initialize VNC client
-    vnc = VNCClient(host=host, port=port, password=password, username=username, encryption=encryption)
-
-    # Connect to remote MacOs machine
-    success, error_message = vnc.connect()
-    if not success:
+    # Get a connected VNC client from the session pool
+    vnc, error_message = target.pool.acquire(host, port, password, username, encryption)
+    if vnc is None:
         error_msg = f"Failed to connect to remote MacOs machine at {host}:{port}. {error_message}"
         return [types.TextContent(type="text", text=error_msg)]
 
     try:
-        # Get target screen dimensions
-        target_width = vnc.width
-        target_height = vnc.height
-
-        # Scale coordinates
-        scaled_x = int((x / source_width) * target_width)
-        scaled_y = int((y / source_height) * target_height)
-
-        # Ensure coordinates are within the screen bounds
-        scaled_x = max(0, min(scaled_x, target_width - 1))
-        scaled_y = max(0, min(scaled_y, target_height - 1))
+        # Map the coordinates with the cached geometry of this screen size
+        geometry = screen_geometry(vnc.width, vnc.height)
+        source_width, source_height = geometry.resolve_source(source_size)
+        target_width, target_height = geometry.screen_size
+        scaled_x, scaled_y = geometry.to_screen(x, y, source_size)
 
         # Single click
         result = vnc.send_mouse_click(scaled_x, scaled_y, button, False)
 
         # Prepare the response with useful details
-        scale_factors = {
-            "x": target_width / source_width,
-            "y": target_height / source_height
-        }
+        scale_x, scale_y = geometry.source_scale(source_size)
 
         return [types.TextContent(
             type="text",
             text=f"""Mouse click (button {button}) from source ({x}, {y}) to target ({scaled_x}, {scaled_y}) {'succeeded' if result else 'failed'}
 Source dimensions: {source_width}x{source_height}
 Target dimensions: {target_width}x{target_height}
-Scale factors: {scale_factors['x']:.4f}x, {scale_factors['y']:.4f}y"""
+Scale factors: {scale_x:.4f}x, {scale_y:.4f}y"""
         )]
     finally:
-        # Close VNC connection
-        vnc.close()
+        # Return VNC connection to the pool for the next call
+        target.pool.release(vnc)
 
 
 def handle_remote_macos_send_keys(arguments: dict[str, Any]) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
     """Send keyboard input to a remote MacOs machine."""
-    # Use environment variables
-    host = MACOS_HOST
-    port = MACOS_PORT
-    password = MACOS_PASSWORD
-    username = MACOS_USERNAME
-    encryption = VNC_ENCRYPTION
+    # Connection details of the machine the call targets
+    target = hosts.resolve(arguments.get("host"))
+    host, port, password, username, encryption = (
+        target.host, target.port, target.password, target.username, target.encryption)
 
     # Get required parameters from arguments
     text = arguments.get("text")
@@ -236,12 +445,9 @@ def handle_remote_macos_send_keys(arguments: dict[str, Any]) -> list[types.TextC
     if not text and not special_key and not key_combination:
         raise ValueError("Either text, special_key, or key_combination must be provided")
 
-    # Initialize VNC client
-    vnc = VNCClient(host=host, port=port, password=password, username=username, encryption=encryption)
-
-    # Connect to remote MacOs machine
-    success, error_message = vnc.connect()
-    if not success:
+    # Get a connected VNC client from the session pool
+    vnc, error_message = target.pool.acquire(host, port, password, username, encryption)
+    if vnc is None:
         error_msg = f"Failed to connect to remote MacOs machine at {host}:{port}. {error_message}"
         return [types.TextContent(type="text", text=error_msg)]
 
@@ -306,7 +512,8 @@ def handle_remote_macos_send_keys(arguments: dict[str, Any]) -> list[types.TextC
         if special_key:
             if special_key.lower() in special_keys:
                 key = special_keys[special_key.lower()]
-                if vnc.send_key_event(key, True) and vnc.send_key_event(key, False):
+                # Press and release in a single write
+                if vnc.send_key_combination([key]):
                     result_message.append(f"Sent special key: {special_key}")
                 else:
                     result_message.append(f"Failed to send special key: {special_key}")
@@ -349,138 +556,101 @@ def handle_remote_macos_send_keys(arguments: dict[str, Any]) -> list[types.TextC
 
         return [types.TextContent(type="text", text="\n".join(result_message))]
     finally:
-        vnc.close()
+        # Return VNC connection to the pool for the next call
+        target.pool.release(vnc)
 
 
 def handle_remote_macos_mouse_double_click(arguments: dict[str, Any]) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
     """Perform a mouse double-click action on a remote MacOs machine."""
-    # Use environment variables
-    host = MACOS_HOST
-    port = MACOS_PORT
-    password = MACOS_PASSWORD
-    username = MACOS_USERNAME
-    encryption = VNC_ENCRYPTION
+    # Connection details of the machine the call targets
+    target = hosts.resolve(arguments.get("host"))
+    host, port, password, username, encryption = (
+        target.host, target.port, target.password, target.username, target.encryption)
 
     # Get required parameters from arguments
     x = arguments.get("x")
     y = arguments.get("y")
-    source_width = int(arguments.get("source_width", 1366))
-    source_height = int(arguments.get("source_height", 768))
+    source_size = _source_size(arguments)
     button = int(arguments.get("button", 1))
 
     if x is None or y is None:
         raise ValueError("x and y coordinates are required")
 
-    # Ensure source dimensions are positive
-    if source_width <= 0 or source_height <= 0:
-        raise ValueError("Source dimensions must be positive values")
-
-    # Initialize VNC client
-    vnc = VNCClient(host=host, port=port, password=password, username=username, encryption=encryption)
-
-    # Connect to remote MacOs machine
-    success, error_message = vnc.connect()
-    if not success:
+    # Get a connected VNC client from the session pool
+    vnc, error_message = target.pool.acquire(host, port, password, username, encryption)
+    if vnc is None:
         error_msg = f"Failed to connect to remote MacOs machine at {host}:{port}. {error_message}"
         return [types.TextContent(type="text", text=error_msg)]
 
     try:
-        # Get target screen dimensions
-        target_width = vnc.width
-        target_height = vnc.height
-
-        # Scale coordinates
-        scaled_x = int((x / source_width) * target_width)
-        scaled_y = int((y / source_height) * target_height)
-
-        # Ensure coordinates are within the screen bounds
-        scaled_x = max(0, min(scaled_x, target_width - 1))
-        scaled_y = max(0, min(scaled_y, target_height - 1))
+        # Map the coordinates with the cached geometry of this screen size
+        geometry = screen_geometry(vnc.width, vnc.height)
+        source_width, source_height = geometry.resolve_source(source_size)
+        target_width, target_height = geometry.screen_size
+        scaled_x, scaled_y = geometry.to_screen(x, y, source_size)
 
         # Double click
         result = vnc.send_mouse_click(scaled_x, scaled_y, button, True)
 
         # Prepare the response with useful details
-        scale_factors = {
-            "x": target_width / source_width,
-            "y": target_height / source_height
-        }
+        scale_x, scale_y = geometry.source_scale(source_size)
 
         return [types.TextContent(
             type="text",
             text=f"""Mouse double-click (button {button}) from source ({x}, {y}) to target ({scaled_x}, {scaled_y}) {'succeeded' if result else 'failed'}
 Source dimensions: {source_width}x{source_height}
 Target dimensions: {target_width}x{target_height}
-Scale factors: {scale_factors['x']:.4f}x, {scale_factors['y']:.4f}y"""
+Scale factors: {scale_x:.4f}x, {scale_y:.4f}y"""
         )]
     finally:
-        # Close VNC connection
-        vnc.close()
+        # Return VNC connection to the pool for the next call
+        target.pool.release(vnc)
 
 
 def handle_remote_macos_mouse_move(arguments: dict[str, Any]) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
     """Move the mouse cursor on a remote MacOs machine."""
-    # Use environment variables
-    host = MACOS_HOST
-    port = MACOS_PORT
-    password = MACOS_PASSWORD
-    username = MACOS_USERNAME
-    encryption = VNC_ENCRYPTION
+    # Connection details of the machine the call targets
+    target = hosts.resolve(arguments.get("host"))
+    host, port, password, username, encryption = (
+        target.host, target.port, target.password, target.username, target.encryption)
 
     # Get required parameters from arguments
     x = arguments.get("x")
     y = arguments.get("y")
-    source_width = int(arguments.get("source_width", 1366))
-    source_height = int(arguments.get("source_height", 768))
+    source_size = _source_size(arguments)
 
     if x is None or y is None:
         raise ValueError("x and y coordinates are required")
 
-    # Ensure source dimensions are positive
-    if source_width <= 0 or source_height <= 0:
-        raise ValueError("Source dimensions must be positive values")
-
-    # Initialize VNC client
-    vnc = VNCClient(host=host, port=port, password=password, username=username, encryption=encryption)
-
-    # Connect to remote MacOs machine
-    success, error_message = vnc.connect()
-    if not success:
+    # Get a connected VNC client from the session pool
+    vnc, error_message = target.pool.acquire(host, port, password, username, encryption)
+    if vnc is None:
         error_msg = f"Failed to connect to remote MacOs machine at {host}:{port}. {error_message}"
         return [types.TextContent(type="text", text=error_msg)]
 
     try:
-        # Get target screen dimensions
-        target_width = vnc.width
-        target_height = vnc.height
-
-        # Scale coordinates
-        scaled_x = int((x / source_width) * target_width)
-        scaled_y = int((y / source_height) * target_height)
-
-        # Ensure coordinates are within the screen bounds
-        scaled_x = max(0, min(scaled_x, target_width - 1))
-        scaled_y = max(0, min(scaled_y, target_height - 1))
+        # Map the coordinates with the cached geometry of this screen size
+        geometry = screen_geometry(vnc.width, vnc.height)
+        source_width, source_height = geometry.resolve_source(source_size)
+        target_width, target_height = geometry.screen_size
+        scaled_x, scaled_y = geometry.to_screen(x, y, source_size)
 
         # Move mouse pointer (button_mask=0 means no buttons are pressed)
         result = vnc.send_pointer_event(scaled_x, scaled_y, 0)
 
         # Prepare the response with useful details
-        scale_factors = {
-            "x": target_width / source_width,
-            "y": target_height / source_height
-        }
+        scale_x, scale_y = geometry.source_scale(source_size)
 
         return [types.TextContent(
             type="text",
             text=f"""Mouse move from source ({x}, {y}) to target ({scaled_x}, {scaled_y}) {'succeeded' if result else 'failed'}
 Source dimensions: {source_width}x{source_height}
 Target dimensions: {target_width}x{target_height}
-Scale factors: {scale_factors['x']:.4f}x, {scale_factors['y']:.4f}y"""
+Scale factors: {scale_x:.4f}x, {scale_y:.4f}y"""
         )]
     finally:
-        # Close VNC connection
-        vnc.close()
+        # Return VNC connection to the pool for the next call
+        target.pool.release(vnc)
 
 
 def handle_remote_macos_open_application(arguments: dict[str, Any]) -> List[types.TextContent]:
@@ -494,12 +664,10 @@ def handle_remote_macos_open_application(arguments: dict[str, Any]) -> List[type
     Returns:
         List containing a TextContent with the result
     """
-    # Use environment variables
-    host = MACOS_HOST
-    port = MACOS_PORT
-    password = MACOS_PASSWORD
-    username = MACOS_USERNAME
-    encryption = VNC_ENCRYPTION
+    # Connection details of the machine the call targets
+    target = hosts.resolve(arguments.get("host"))
+    host, port, password, username, encryption = (
+        target.host, target.port, target.password, target.username, target.encryption)
 
     identifier = arguments.get("identifier")
     if not identifier:
@@ -507,12 +675,9 @@ def handle_remote_macos_open_application(arguments: dict[str, Any]) -> List[type
 
     start_time = time.time()
 
-    # Initialize VNC client
-    vnc = VNCClient(host=host, port=port, password=password, username=username, encryption=encryption)
-
-    # Connect to remote MacOs machine
-    success, error_message = vnc.connect()
-    if not success:
+    # Get a connected VNC client from the session pool
+    vnc, error_message = target.pool.acquire(host, port, password, username, encryption)
+    if vnc is None:
         error_msg = f"Failed to connect to remote MacOs machine at {host}:{port}. {error_message}"
         return [types.TextContent(type="text", text=error_msg)]
 
@@ -521,13 +686,8 @@ def handle_remote_macos_open_application(arguments: dict[str, Any]) -> List[type
         cmd_key = 0xffeb  # Command key
         space_key = 0x20  # Space key
 
-        # Press Command+Space
-        vnc.send_key_event(cmd_key, True)
-        vnc.send_key_event(space_key, True)
-
-        # Release Command+Space
-        vnc.send_key_event(space_key, False)
-        vnc.send_key_event(cmd_key, False)
+        # Press and release Command+Space in one write
+        vnc.send_key_combination([cmd_key, space_key])
 
         # Small delay to let Spotlight open
         time.sleep(0.5)
@@ -538,10 +698,9 @@ def handle_remote_macos_open_application(arguments: dict[str, Any]) -> List[type
         # Small delay to let Spotlight find the app
         time.sleep(0.5)
 
-        # Press Enter to launch
+        # Press and release Enter to launch
         enter_key = 0xff0d
-        vnc.send_key_event(enter_key, True)
-        vnc.send_key_event(enter_key, False)
+        vnc.send_key_combination([enter_key])
 
         end_time = time.time()
         processing_time = round(end_time - start_time, 3)
@@ -552,26 +711,23 @@ def handle_remote_macos_open_application(arguments: dict[str, Any]) -> List[type
         )]
 
     finally:
-        # Close VNC connection
-        vnc.close()
+        # Return VNC connection to the pool for the next call
+        target.pool.release(vnc)
 
 
 def handle_remote_macos_mouse_drag_n_drop(arguments: dict[str, Any]) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
     """Perform a mouse drag operation on a remote MacOs machine."""
-    # Use environment variables
-    host = MACOS_HOST
-    port = MACOS_PORT
-    password = MACOS_PASSWORD
-    username = MACOS_USERNAME
-    encryption = VNC_ENCRYPTION
+    # Connection details of the machine the call targets
+    target = hosts.resolve(arguments.get("host"))
+    host, port, password, username, encryption = (
+        target.host, target.port, target.password, target.username, target.encryption)
 
     # Get required parameters from arguments
     start_x = arguments.get("start_x")
     start_y = arguments.get("start_y")
     end_x = arguments.get("end_x")
     end_y = arguments.get("end_y")
-    source_width = int(arguments.get("source_width", 1366))
-    source_height = int(arguments.get("source_height", 768))
+    source_size = _source_size(arguments)
     button = int(arguments.get("button", 1))
     steps = int(arguments.get("steps", 10))
     delay_ms = int(arguments.get("delay_ms", 10))
@@ -580,35 +736,19 @@ def handle_remote_macos_mouse_drag_n_drop(arguments: dict[str, Any]) -> list[typ
     if any(x is None for x in [start_x, start_y, end_x, end_y]):
         raise ValueError("start_x, start_y, end_x, and end_y coordinates are required")
 
-    # Ensure source dimensions are positive
-    if source_width <= 0 or source_height <= 0:
-        raise ValueError("Source dimensions must be positive values")
-
-    # Initialize VNC client
-    vnc = VNCClient(host=host, port=port, password=password, username=username, encryption=encryption)
-
-    # Connect to remote MacOs machine
-    success, error_message = vnc.connect()
-    if not success:
+    # Get a connected VNC client from the session pool
+    vnc, error_message = target.pool.acquire(host, port, password, username, encryption)
+    if vnc is None:
         error_msg = f"Failed to connect to remote MacOs machine at {host}:{port}. {error_message}"
         return [types.TextContent(type="text", text=error_msg)]
 
     try:
-        # Get target screen dimensions
-        target_width = vnc.width
-        target_height = vnc.height
-
-        # Scale coordinates
-        scaled_start_x = int((start_x / source_width) * target_width)
-        scaled_start_y = int((start_y / source_height) * target_height)
-        scaled_end_x = int((end_x / source_width) * target_width)
-        scaled_end_y = int((end_y / source_height) * target_height)
-
-        # Ensure coordinates are within the screen bounds
-        scaled_start_x = max(0, min(scaled_start_x, target_width - 1))
-        scaled_start_y = max(0, min(scaled_start_y, target_height - 1))
-        scaled_end_x = max(0, min(scaled_end_x, target_width - 1))
-        scaled_end_y = max(0, min(scaled_end_y, target_height - 1))
+        # Map the coordinates with the cached geometry of this screen size
+        geometry = screen_geometry(vnc.width, vnc.height)
+        source_width, source_height = geometry.resolve_source(source_size)
+        target_width, target_height = geometry.screen_size
+        scaled_start_x, scaled_start_y = geometry.to_screen(start_x, start_y, source_size)
+        scaled_end_x, scaled_end_y = geometry.to_screen(end_x, end_y, source_size)
 
         # Calculate step sizes
         dx = (scaled_end_x - scaled_start_x) / steps
@@ -636,10 +776,7 @@ def handle_remote_macos_mouse_drag_n_drop(arguments: dict[str, Any]) -> list[typ
             return [types.TextContent(type="text", text="Failed to release mouse button")]
 
         # Prepare the response with useful details
-        scale_factors = {
-            "x": target_width / source_width,
-            "y": target_height / source_height
-        }
+        scale_x, scale_y = geometry.source_scale(source_size)
 
         return [types.TextContent(
             type="text",
@@ -648,11 +785,166 @@ From source ({start_x}, {start_y}) to ({end_x}, {end_y})
 From target ({scaled_start_x}, {scaled_start_y}) to ({scaled_end_x}, {scaled_end_y})
 Source dimensions: {source_width}x{source_height}
 Target dimensions: {target_width}x{target_height}
-Scale factors: {scale_factors['x']:.4f}x, {scale_factors['y']:.4f}y
+Scale factors: {scale_x:.4f}x, {scale_y:.4f}y
 Steps: {steps}
 Delay: {delay_ms}ms"""
         )]
 
     finally:
-        # Close VNC connection
-        vnc.close()
\ No newline at end of file
+        # Return VNC connection to the pool for the next call
+        target.pool.release(vnc)
+
+
+def handle_remote_macos_set_clipboard(arguments: dict[str, Any]) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    """Put text on the clipboard of a remote MacOs machine, optionally pasting it."""
+    # Connection details of the machine the call targets
+    target = hosts.resolve(arguments.get("host"))
+    host, port, password, username, encryption = (
+        target.host, target.port, target.password, target.username, target.encryption)
+
+    text = arguments.get("text")
+    paste = arguments.get("paste", False)
+
+    if not isinstance(text, str):
+        raise ValueError("text is required")
+
+    # Get a connected VNC client from the session pool
+    vnc, error_message = target.pool.acquire(host, port, password, username, encryption)
+    if vnc is None:
+        error_msg = f"Failed to connect to remote MacOs machine at {host}:{port}. {error_message}"
+        return [types.TextContent(type="text", text=error_msg)]
+
+    try:
+        if not vnc.clipboard.can_send(text):
+            return [types.TextContent(
+                type="text",
+                text="Failed to set clipboard: this server only accepts Latin-1 clipboard text"
+            )]
+        result = vnc.paste_text(text) if paste else vnc.set_clipboard(text)
+        action = "Set and pasted" if paste else "Set"
+        return [types.TextContent(
+            type="text",
+            text=f"{action} clipboard text ({len(text)} characters) {'succeeded' if result else 'failed'}"
+        )]
+    finally:
+        # Return VNC connection to the pool for the next call
+        target.pool.release(vnc)
+
+
+def handle_remote_macos_get_clipboard(arguments: dict[str, Any]) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    """Read the clipboard of a remote MacOs machine, optionally copying the selection first."""
+    # Connection details of the machine the call targets
+    target = hosts.resolve(arguments.get("host"))
+    host, port, password, username, encryption = (
+        target.host, target.port, target.password, target.username, target.encryption)
+
+    copy_selection = arguments.get("copy_selection", False)
+    timeout = arguments.get("timeout", 3)
+
+    if not isinstance(timeout, (int, float)) or timeout <= 0:
+        raise ValueError("timeout must be a positive number of seconds")
+
+    # Get a connected VNC client from the session pool
+    vnc, error_message = target.pool.acquire(host, port, password, username, encryption)
+    if vnc is None:
+        error_msg = f"Failed to connect to remote MacOs machine at {host}:{port}. {error_message}"
+        return [types.TextContent(type="text", text=error_msg)]
+
+    try:
+        text = vnc.get_clipboard(copy_selection=copy_selection, timeout=timeout)
+        if text is None:
+            return [types.TextContent(
+                type="text",
+                text=f"No clipboard text received from the remote MacOs machine within {timeout}s"
+            )]
+        return [types.TextContent(type="text", text=text)]
+    finally:
+        # Return VNC connection to the pool for the next call
+        target.pool.release(vnc)
+
+
+# Actions of remote_macos_batch and the tool handler that runs each of them
+BATCH_ACTIONS: Dict[str, Callable[[dict[str, Any]], Any]] = {
+    "move": handle_remote_macos_mouse_move,
+    "click": handle_remote_macos_mouse_click,
+    "double_click": handle_remote_macos_mouse_double_click,
+    "keys": handle_remote_macos_send_keys,
+    "drag": handle_remote_macos_mouse_drag_n_drop,
+    "scroll": handle_remote_macos_mouse_scroll,
+    "wait": handle_remote_macos_wait_for_screen,
+    "screenshot": handle_remote_macos_get_screen,
+    "set_clipboard": handle_remote_macos_set_clipboard,
+    "get_clipboard": handle_remote_macos_get_clipboard,
+}
+
+
+async def handle_remote_macos_batch(arguments: dict[str, Any]) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    """Run a list of actions in order over a single VNC connection."""
+    # Connection details of the machine the call targets
+    target = hosts.resolve(arguments.get("host"))
+    host, port, password, username, encryption = (
+        target.host, target.port, target.password, target.username, target.encryption)
+
+    actions = arguments.get("actions")
+    screenshot = arguments.get("screenshot", False)
+    stop_on_error = arguments.get("stop_on_error", True)
+
+    if not isinstance(actions, list) or not actions:
+        raise ValueError("actions must be a non-empty list")
+    for index, action in enumerate(actions, 1):
+        if not isinstance(action, dict) or action.get("action") not in BATCH_ACTIONS:
+            raise ValueError(f"Step {index}: action must be one of {', '.join(BATCH_ACTIONS)}")
+        if action.get("host") not in (None, target.name):
+            raise ValueError(f"Step {index}: all steps run on the batch's host '{target.name}'")
+    if screenshot:
+        # True for a default screenshot, or the remote_macos_get_screen arguments to use
+        actions = actions + [{"action": "screenshot", **(screenshot if isinstance(screenshot, dict) else {})}]
+
+    # Hold one connection for the whole batch; the handlers get it back from the pool
+    vnc, error_message = await asyncio.to_thread(target.pool.acquire, host, port, password, username, encryption)
+    if vnc is None:
+        error_msg = f"Failed to connect to remote MacOs machine at {host}:{port}. {error_message}"
+        return [types.TextContent(type="text", text=error_msg)]
+
+    start_time = time.time()
+    results: list[types.TextContent | types.ImageContent | types.EmbeddedResource] = []
+    completed = 0
+    discard = False
+    try:
+        with target.pool.pinned(vnc) as pin:
+            for index, action in enumerate(actions, 1):
+                name = action["action"]
+                handler = BATCH_ACTIONS[name]
+                step_arguments = {key: value for key, value in action.items() if key != "action"}
+                step_arguments["host"] = target.name
+                try:
+                    if inspect.iscoroutinefunction(handler):
+                        contents = await handler(step_arguments)
+                    else:
+                        contents = await asyncio.to_thread(handler, step_arguments)
+                except Exception as e:
+                    # Bad arguments only fail their step; the connection is kept unless a
+                    # handler released it as broken, which sets pin.discard
+                    logger.warning(f"Batch step {index} ({name}) failed: {str(e)}")
+                    results.append(types.TextContent(type="text", text=f"Step {index} ({name}) failed: {str(e)}"))
+                    if stop_on_error and not pin.discard:
+                        break
+                else:
+                    completed += 1
+                    for content in contents:
+                        if content.type == "text":
+                            content = types.TextContent(type="text", text=f"Step {index} ({name}): {content.text}")
+                        results.append(content)
+                if pin.discard:
+                    results.append(types.TextContent(type="text", text="Stopped: the VNC connection was lost"))
+                    break
+            discard = pin.discard
+    finally:
+        await asyncio.to_thread(target.pool.release, vnc, discard)
+
+    processing_time = round(time.time() - start_time, 3)
+    results.append(types.TextContent(
+        type="text",
+        text=f"Batch completed {completed}/{len(actions)} steps\nProcessing time: {processing_time}s"
+    ))
+    return results
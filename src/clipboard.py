@@ -0,0 +1,163 @@
+import os
+import struct
+import zlib
+import logging
+from typing import List, Optional
+
+from event_writer import can_cut_text, client_cut_text
+
+logger = logging.getLogger('clipboard')
+
+# Pseudo-encoding announcing support for the extended clipboard, which carries UTF-8
+# text compressed with zlib instead of plain Latin-1
+EXTENDED_CLIPBOARD = -1063131698  # 0xC0A1E5CE
+
+# Extended clipboard formats (low 16 bits of the flags) and actions (high 8 bits)
+TEXT_FORMAT = 1 << 0
+CAPS = 1 << 24
+REQUEST = 1 << 25
+PEEK = 1 << 26
+NOTIFY = 1 << 27
+PROVIDE = 1 << 28
+FORMAT_MASK = 0xFFFF
+
+# ClientCutText and ServerCutText: type, padding, signed length (negative for extended messages)
+CUT_TEXT = struct.Struct('>Bxxxi')
+FLAGS = struct.Struct('>I')
+
+# Clipboard text larger than this is ignored
+VNC_CLIPBOARD_MAX_SIZE = int(os.environ.get('VNC_CLIPBOARD_MAX_SIZE', str(10 * 1024 * 1024)))
+
+
+def extended_message(flags: int, data: bytes = b'') -> bytes:
+    """Encode an extended clipboard ClientCutText message."""
+    payload = FLAGS.pack(flags) + data
+    return CUT_TEXT.pack(6, -len(payload)) + payload
+
+
+class Clipboard:
+    """Clipboard state of one connection.
+
+    Handles ServerCutText messages and encodes ClientCutText messages, using the
+    extended clipboard once the server has announced support for it.
+    """
+
+    def __init__(self, max_size: int = VNC_CLIPBOARD_MAX_SIZE):
+        self.max_size = max_size
+        self.text: Optional[str] = None  # Latest clipboard text received from the server
+        self.sequence = 0  # Number of clipboard texts received
+        self.server_actions = 0  # Extended clipboard actions the server accepts (0 = not supported)
+        self._local_text: Optional[str] = None  # Latest text sent, provided again on request
+
+    @property
+    def extended(self) -> bool:
+        """Whether the server announced extended clipboard text support."""
+        return bool(self.server_actions)
+
+    def can_send(self, text: str) -> bool:
+        """Whether text can be put on the server's clipboard on this connection."""
+        return bool(self.server_actions & PROVIDE) or can_cut_text(text)
+
+    def set_message(self, text: str) -> bytes:
+        """Encode a message putting text on the server's clipboard.
+
+        Raises:
+            UnicodeEncodeError: If the text is not Latin-1 and the server lacks the extended clipboard
+        """
+        message = self._provide(text) if self.server_actions & PROVIDE else client_cut_text(text)
+        self._local_text = text
+        return message
+
+    def request_message(self) -> Optional[bytes]:
+        """Encode a request for the server's clipboard text, or None if the server cannot be asked."""
+        if not self.server_actions & REQUEST:
+            return None
+        return extended_message(REQUEST | TEXT_FORMAT)
+
+    def accepts(self, length: int) -> bool:
+        """Whether the body of a ServerCutText message is small enough to be read.
+
+        Args:
+            length: The signed length field; negative for extended clipboard messages
+        """
+        if length >= 0:
+            return length <= self.max_size
+        # Extended messages add flags, a text size and zlib framing, which grows data
+        # that does not compress by well under 0.1%
+        return -length <= self.max_size + self.max_size // 1000 + 64
+
+    def received(self, length: int, data: bytes) -> List[bytes]:
+        """Handle the body of a ServerCutText message.
+
+        Args:
+            length: The signed length field; negative for extended clipboard messages
+            data: The abs(length) bytes following it
+
+        Returns:
+            List[bytes]: Replies to send to the server
+        """
+        if length >= 0:
+            self._store(data.decode('latin-1'))
+            return []
+        if len(data) < FLAGS.size:
+            logger.warning("Ignoring truncated extended clipboard message")
+            return []
+
+        flags = FLAGS.unpack_from(data)[0]
+        if flags & CAPS:
+            return self._caps(flags)
+        if flags & PROVIDE:
+            self._read_provide(flags, data[FLAGS.size:])
+        elif flags & NOTIFY:
+            if flags & TEXT_FORMAT and self.server_actions & REQUEST:
+                # The clipboard changed; ask for the new text
+                return [extended_message(REQUEST | TEXT_FORMAT)]
+        elif flags & PEEK:
+            return [extended_message(NOTIFY | (TEXT_FORMAT if self._local_text is not None else 0))]
+        elif flags & REQUEST:
+            if flags & TEXT_FORMAT and self._local_text is not None:
+                return [self._provide(self._local_text)]
+        return []
+
+    def _caps(self, flags: int) -> List[bytes]:
+        """Handle the server's capabilities and announce ours."""
+        if not flags & TEXT_FORMAT:
+            logger.debug("Server's extended clipboard does not support text")
+            return []
+        self.server_actions = flags & (REQUEST | PEEK | NOTIFY | PROVIDE)
+        logger.debug(f"Extended clipboard enabled (server actions 0x{self.server_actions >> 24:02x})")
+        # Our capabilities: text of up to max_size bytes
+        return [extended_message(CAPS | REQUEST | NOTIFY | PROVIDE | TEXT_FORMAT, FLAGS.pack(self.max_size))]
+
+    def _provide(self, text: str) -> bytes:
+        """Encode an extended clipboard provide message carrying text."""
+        # Extended clipboard text is null-terminated UTF-8 with CRLF line endings
+        data = text.replace('\r\n', '\n').replace('\n', '\r\n').encode('utf-8') + b'\0'
+        return extended_message(PROVIDE | TEXT_FORMAT, zlib.compress(FLAGS.pack(len(data)) + data))
+
+    def _read_provide(self, flags: int, data: bytes) -> None:
+        """Read the text out of an extended clipboard provide message."""
+        if not flags & TEXT_FORMAT:
+            return
+        try:
+            # One zlib stream holding a size and the data of each format, in bit order; text is first
+            stream = zlib.decompressobj()
+            header = stream.decompress(data, FLAGS.size)
+            size = FLAGS.unpack(header)[0]
+            if size > self.max_size:
+                logger.warning(f"Ignoring {size} byte clipboard text (VNC_CLIPBOARD_MAX_SIZE is {self.max_size})")
+                return
+            text = stream.decompress(stream.unconsumed_tail, size)
+        except (zlib.error, struct.error) as e:
+            logger.warning(f"Ignoring malformed extended clipboard data: {str(e)}")
+            return
+        self._store(text.rstrip(b'\0').decode('utf-8', errors='replace').replace('\r\n', '\n'))
+
+    def _store(self, text: str) -> None:
+        """Record clipboard text received from the server."""
+        if len(text) > self.max_size:
+            logger.warning(f"Ignoring {len(text)} character clipboard text")
+            return
+        self.text = text
+        self.sequence += 1
+        logger.debug("Received %d characters of clipboard text", len(text))
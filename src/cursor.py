@@ -0,0 +1,75 @@
+import os
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from framebuffer import Rect, pixels_to_rgb
+
+logger = logging.getLogger('cursor')
+
+# Who draws the mouse pointer:
+#   local  - the server sends the pointer shape once (Cursor pseudo-encoding) and leaves it
+#            out of the framebuffer, so pointer moves cause no screen updates; screenshots
+#            draw it on request
+#   server - the server draws the pointer into the framebuffer
+CURSOR_MODES = ("local", "server")
+VNC_CURSOR = os.environ.get('VNC_CURSOR', 'local')
+
+
+def cursor_data_size(width: int, height: int, pixel_format) -> int:
+    """Payload size of a Cursor pseudo-rectangle: the pixels followed by a 1-bit transparency mask."""
+    return width * height * (pixel_format.bits_per_pixel // 8) + (width + 7) // 8 * height
+
+
+class Cursor:
+    """Mouse pointer shape received with the Cursor pseudo-encoding."""
+
+    def __init__(self, image: Image.Image, hotspot: Tuple[int, int]):
+        """Create a cursor.
+
+        Args:
+            image: RGBA image of the pointer; transparent where the mask is clear
+            hotspot: Position of the pointer's hotspot within the image
+        """
+        self.image = image
+        self.hotspot = hotspot
+
+    @classmethod
+    def decode(cls, hotspot_x: int, hotspot_y: int, width: int, height: int, data: bytes, pixel_format,
+               colour_map: Optional[np.ndarray] = None) -> Optional["Cursor"]:
+        """Decode the payload of a Cursor pseudo-rectangle.
+
+        Args:
+            hotspot_x: X position of the hotspot (the rectangle's x)
+            hotspot_y: Y position of the hotspot (the rectangle's y)
+            width: Width of the pointer image
+            height: Height of the pointer image
+            data: Pixels in the connection's pixel format, then the transparency bitmask
+            pixel_format: The connection's PixelFormat
+            colour_map: The server's colour map, for colour map pixel formats
+
+        Returns:
+            Optional[Cursor]: The cursor, or None for an empty (hidden) pointer
+        """
+        if width == 0 or height == 0:
+            return None
+        pixel_size = pixel_format.bits_per_pixel // 8
+        pixel_bytes = width * height * pixel_size
+        pixels = np.frombuffer(data, dtype=np.uint8, count=pixel_bytes).reshape(height, width, pixel_size)
+        # One bit per pixel, most significant bit first, rows padded to whole bytes
+        mask = np.frombuffer(data, dtype=np.uint8, offset=pixel_bytes).reshape(height, (width + 7) // 8)
+        alpha = np.unpackbits(mask, axis=1)[:, :width] * np.uint8(255)
+
+        rgba = np.dstack([pixels_to_rgb(pixels, pixel_format, colour_map), alpha])
+        return cls(Image.fromarray(rgba, 'RGBA'), (hotspot_x, hotspot_y))
+
+    def rect(self, x: int, y: int) -> Rect:
+        """Return the screen area covered by the pointer with its hotspot at (x, y)."""
+        return x - self.hotspot[0], y - self.hotspot[1], self.image.width, self.image.height
+
+    def draw(self, img: Image.Image, x: int, y: int) -> None:
+        """Draw the pointer onto an image with its hotspot at (x, y) in image coordinates."""
+        left, top, _, _ = self.rect(x, y)
+        img.paste(self.image, (left, top), self.image)
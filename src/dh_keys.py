@@ -0,0 +1,101 @@
+import os
+import logging
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Deque, Dict, Set, Tuple
+
+logger = logging.getLogger('dh_keys')
+
+# Ephemeral key pairs generated ahead of time for each Diffie-Hellman group a server
+# has used, so a reconnect does not wait for key generation (0 disables)
+VNC_DH_KEY_POOL = int(os.environ.get('VNC_DH_KEY_POOL', '4'))
+
+# Groups to keep key pairs for; servers normally all send the same one
+MAX_GROUPS = 8
+
+# A Diffie-Hellman group: (prime, generator)
+Group = Tuple[int, int]
+# An ephemeral key pair: (private exponent, public value)
+KeyPair = Tuple[int, int]
+
+
+@lru_cache(maxsize=MAX_GROUPS)
+def dh_parameters(prime: int, generator: int):
+    """Return the cryptography parameter object of a Diffie-Hellman group.
+
+    Loading parameters checks the prime, which takes tens of milliseconds, while a
+    server sends the same group on every connection.
+
+    Raises:
+        ImportError: If the cryptography package is not installed
+    """
+    from cryptography.hazmat.primitives.asymmetric import dh
+    return dh.DHParameterNumbers(prime, generator).parameters()
+
+
+def generate_key_pair(prime: int, generator: int) -> KeyPair:
+    """Generate an ephemeral key pair for a Diffie-Hellman group."""
+    private_key = dh_parameters(prime, generator).generate_private_key()
+    return private_key.private_numbers().x, private_key.public_key().public_numbers().y
+
+
+class DHKeyPool:
+    """Ephemeral key pairs generated in the background, ahead of the handshakes using them.
+
+    Every key pair is handed out once. After the first handshake with a group, a
+    background thread keeps ``size`` key pairs ready for it.
+    """
+
+    def __init__(self, size: int = VNC_DH_KEY_POOL):
+        self.size = max(0, size)
+        self._lock = threading.Lock()
+        self._keys: Dict[Group, Deque[KeyPair]] = {}
+        self._filling: Set[Group] = set()
+
+    def take(self, prime: int, generator: int) -> KeyPair:
+        """Return an unused key pair for a group, generating one if none is ready."""
+        group = (prime, generator)
+        with self._lock:
+            keys = self._keys.get(group)
+            key_pair = keys.popleft() if keys else None
+        if key_pair is None:
+            key_pair = generate_key_pair(prime, generator)
+        self._refill(group)
+        return key_pair
+
+    def ready(self, prime: int, generator: int) -> int:
+        """Return the number of key pairs ready for a group."""
+        with self._lock:
+            return len(self._keys.get((prime, generator), ()))
+
+    def _refill(self, group: Group) -> None:
+        """Start topping up the key pairs of a group unless that is already under way."""
+        with self._lock:
+            if self.size == 0 or group in self._filling:
+                return
+            if group not in self._keys and len(self._keys) >= MAX_GROUPS:
+                return
+            self._keys.setdefault(group, deque())
+            self._filling.add(group)
+        threading.Thread(target=self._fill, args=(group,), name="vnc-dh-keygen", daemon=True).start()
+
+    def _fill(self, group: Group) -> None:
+        """Generate key pairs for a group until it has size of them."""
+        try:
+            while True:
+                with self._lock:
+                    if len(self._keys[group]) >= self.size:
+                        return
+                key_pair = generate_key_pair(*group)
+                with self._lock:
+                    self._keys[group].append(key_pair)
+        except Exception as e:
+            logger.warning(f"Failed to pre-generate Diffie-Hellman keys: {str(e)}")
+        finally:
+            with self._lock:
+                self._filling.discard(group)
+
+
+# Shared by all connections of this process
+dh_key_pool = DHKeyPool()
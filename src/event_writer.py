@@ -0,0 +1,114 @@
+import struct
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+
+# Layouts of the client-to-server input messages
+KEY_EVENT = struct.Struct('>BBxxI')  # type 4, down flag, padding, keysym
+POINTER_EVENT = struct.Struct('>BBHH')  # type 5, button mask, x, y
+CLIENT_CUT_TEXT = struct.Struct('>BxxxI')  # type 6, padding, text length
+
+SHIFT_KEYSYM = 0xffe1  # Left shift
+COMMAND_KEYSYM = 0xffeb  # Left command
+
+
+def key_event(key: int, down: bool) -> bytes:
+    """Encode a KeyEvent message."""
+    return KEY_EVENT.pack(4, 1 if down else 0, key)
+
+
+def pointer_event(x: int, y: int, button_mask: int) -> bytes:
+    """Encode a PointerEvent message."""
+    return POINTER_EVENT.pack(5, button_mask & 0xFF, x, y)
+
+
+def can_cut_text(text: str) -> bool:
+    """Whether text fits a ClientCutText message, which carries Latin-1 only."""
+    try:
+        text.encode('latin-1')
+        return True
+    except UnicodeEncodeError:
+        return False
+
+
+def client_cut_text(text: str) -> bytes:
+    """Encode a ClientCutText message, which sets the server's clipboard.
+
+    Raises:
+        UnicodeEncodeError: If the text is not Latin-1
+    """
+    # Lines end with a single newline in RFB clipboard text
+    data = text.replace('\r\n', '\n').encode('latin-1')
+    return CLIENT_CUT_TEXT.pack(6, len(data)) + data
+
+
+@lru_cache(maxsize=512)
+def keystroke(key: int, shift: bool = False) -> bytes:
+    """Encode pressing and releasing a key, optionally while holding shift.
+
+    Typed text repeats the same few keys, so the encoded sequences are cached.
+    """
+    if shift:
+        return key_event(SHIFT_KEYSYM, True) + keystroke(key) + key_event(SHIFT_KEYSYM, False)
+    return key_event(key, True) + key_event(key, False)
+
+
+class EventWriter:
+    """Collects the input events of one logical action so they are sent in a single write.
+
+    Sending every 8-byte KeyEvent on its own costs a system call and, without
+    TCP_NODELAY, a Nagle delay each; a keystroke or key combination is sent as one
+    buffer instead.
+    """
+
+    def __init__(self, width: int, height: int):
+        """Create a writer for a screen.
+
+        Args:
+            width: Framebuffer width, pointer positions are clamped to it
+            height: Framebuffer height, pointer positions are clamped to it
+        """
+        self.width = width
+        self.height = height
+        self._buffer = bytearray()
+        self.count = 0  # Number of buffered messages
+        self.position: Optional[Tuple[int, int]] = None  # Pointer position of the latest pointer event
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def key(self, key: int, down: bool) -> "EventWriter":
+        """Add a key press or release."""
+        self._buffer += key_event(key, down)
+        self.count += 1
+        return self
+
+    def keystroke(self, key: int, shift: bool = False) -> "EventWriter":
+        """Add pressing and releasing a key, optionally while holding shift."""
+        self._buffer += keystroke(key, shift)
+        self.count += 4 if shift else 2
+        return self
+
+    def key_combination(self, keys: Iterable[int]) -> "EventWriter":
+        """Add pressing keys in order and releasing them in reverse order."""
+        keys = list(keys)
+        for key in keys:
+            self.key(key, True)
+        for key in reversed(keys):
+            self.key(key, False)
+        return self
+
+    def pointer(self, x: int, y: int, button_mask: int) -> "EventWriter":
+        """Add a pointer event, clamping the position to the framebuffer."""
+        x = max(0, min(x, self.width - 1))
+        y = max(0, min(y, self.height - 1))
+        self._buffer += pointer_event(x, y, button_mask)
+        self.count += 1
+        self.position = (x, y)
+        return self
+
+    def take(self) -> bytes:
+        """Return the buffered messages and empty the buffer."""
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        self.count = 0
+        return data
@@ -0,0 +1,319 @@
+import logging
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger('framebuffer')
+
+# Changed areas are tracked on a grid of square tiles of this size
+DIRTY_TILE_SIZE = 64
+
+Rect = Tuple[int, int, int, int]
+
+
+def rgb_rawmode(pixel_format) -> Optional[str]:
+    """Return the PIL raw mode matching a pixel layout, if there is one.
+
+    Args:
+        pixel_format: The connection's PixelFormat
+
+    Returns:
+        Optional[str]: Raw mode such as "XRGB", or None if PIL cannot unpack the layout
+    """
+    fmt = pixel_format
+    pixel_size = fmt.bits_per_pixel // 8
+    if not fmt.true_color or (fmt.red_max, fmt.green_max, fmt.blue_max) != (255, 255, 255):
+        return None
+    shifts = [fmt.red_shift, fmt.green_shift, fmt.blue_shift]
+    if any(shift % 8 or shift // 8 >= pixel_size for shift in shifts):
+        return None
+
+    layout = ['X'] * pixel_size
+    for channel, shift in zip('RGB', shifts):
+        index = shift // 8 if not fmt.big_endian else pixel_size - 1 - shift // 8
+        layout[index] = channel
+    rawmode = ''.join(layout)
+    return rawmode if rawmode in ('RGB', 'BGR', 'RGBX', 'BGRX', 'XRGB', 'XBGR') else None
+
+
+def channel_mask(pixel_format) -> int:
+    """Return the bits of a pixel value used by the red, green and blue channels."""
+    fmt = pixel_format
+    return ((fmt.red_max << fmt.red_shift) | (fmt.green_max << fmt.green_shift)
+            | (fmt.blue_max << fmt.blue_shift))
+
+
+def pixel_values(pixels: np.ndarray, pixel_format) -> np.ndarray:
+    """Combine the bytes of packed pixels into integer pixel values.
+
+    Args:
+        pixels: uint8 array of shape (..., bytes per pixel)
+        pixel_format: The connection's PixelFormat
+
+    Returns:
+        np.ndarray: uint32 array of shape (...)
+    """
+    pixel_size = pixels.shape[-1]
+    if pixel_size == 1:
+        return pixels[..., 0].astype(np.uint32)
+    dtype = np.dtype(f'u{pixel_size}').newbyteorder('>' if pixel_format.big_endian else '<')
+    return np.ascontiguousarray(pixels).view(dtype)[..., 0].astype(np.uint32)
+
+
+def packed_pixels(values: np.ndarray, pixel_format) -> np.ndarray:
+    """Split integer pixel values into the bytes of packed pixels (the inverse of pixel_values()).
+
+    Args:
+        values: Integer array of shape (...)
+        pixel_format: The connection's PixelFormat
+
+    Returns:
+        np.ndarray: uint8 array of shape (..., bytes per pixel)
+    """
+    pixel_size = pixel_format.bits_per_pixel // 8
+    dtype = np.dtype(f'u{pixel_size}').newbyteorder('>' if pixel_format.big_endian else '<')
+    # Scalars lose a non-native byte order in astype(), so always work on an array
+    packed = np.ascontiguousarray(np.asarray(values).astype(dtype))
+    return packed.view(np.uint8).reshape(np.shape(values) + (pixel_size,))
+
+
+def _channel_lut(channel_max: int) -> np.ndarray:
+    """Lookup table scaling channel values 0..channel_max to 0..255."""
+    levels = np.arange(channel_max + 1, dtype=np.uint32)
+    return ((levels * 255 + channel_max // 2) // max(channel_max, 1)).astype(np.uint8)
+
+
+def pixels_to_rgb(pixels: np.ndarray, pixel_format, colour_map: Optional[np.ndarray] = None) -> np.ndarray:
+    """Convert packed pixels to RGB.
+
+    Args:
+        pixels: uint8 array of shape (..., bytes per pixel)
+        pixel_format: The connection's PixelFormat (8, 16 or 32 bits per pixel)
+        colour_map: Array of shape (entries, 3) with the server's colour map, used when
+                    the pixel format is not true colour
+
+    Returns:
+        np.ndarray: uint8 array of shape (..., 3)
+    """
+    fmt = pixel_format
+    values = pixel_values(pixels, fmt)
+
+    if not fmt.true_color:
+        if colour_map is None:
+            logger.warning("No colour map received for a colour map pixel format")
+            return np.zeros(values.shape + (3,), dtype=np.uint8)
+        # Pixel values beyond the colour map are treated as black
+        padded = np.concatenate([colour_map, np.zeros((1, 3), dtype=np.uint8)])
+        return padded[np.minimum(values, len(colour_map))]
+
+    rgb = np.empty(values.shape + (3,), dtype=np.uint8)
+    for channel, (shift, channel_max) in enumerate(((fmt.red_shift, fmt.red_max),
+                                                    (fmt.green_shift, fmt.green_max),
+                                                    (fmt.blue_shift, fmt.blue_max))):
+        rgb[..., channel] = _channel_lut(channel_max)[(values >> shift) & channel_max]
+    return rgb
+
+
+def pixels_to_image(pixels: np.ndarray, pixel_format, colour_map: Optional[np.ndarray] = None) -> Image.Image:
+    """Convert packed pixels to an RGB image.
+
+    Args:
+        pixels: uint8 array of shape (height, width, bytes per pixel)
+        pixel_format: The connection's PixelFormat
+        colour_map: The server's colour map, for colour map pixel formats
+
+    Returns:
+        Image.Image: RGB image
+    """
+    rawmode = rgb_rawmode(pixel_format)
+    if rawmode:
+        # Byte-aligned 8-bit channels can be unpacked by PIL directly
+        height, width = pixels.shape[:2]
+        return Image.frombytes('RGB', (width, height), pixels.tobytes(), 'raw', rawmode)
+    return Image.fromarray(pixels_to_rgb(pixels, pixel_format, colour_map), 'RGB')
+
+
+def rgb_to_pixels(rgb: np.ndarray, pixel_format) -> np.ndarray:
+    """Pack RGB values into the connection's pixel format.
+
+    Args:
+        rgb: Array of shape (..., 3) with 8-bit red, green and blue values
+        pixel_format: The connection's (true colour) PixelFormat
+
+    Returns:
+        np.ndarray: uint8 array of shape (..., bytes per pixel)
+    """
+    fmt = pixel_format
+    pixel_size = fmt.bits_per_pixel // 8
+    rgb = np.asarray(rgb, dtype=np.uint32)
+    if not fmt.true_color:
+        # There is no reverse colour map lookup; only error fills get here
+        return np.zeros(rgb.shape[:-1] + (pixel_size,), dtype=np.uint8)
+    value = (((rgb[..., 0] * fmt.red_max + 127) // 255) << fmt.red_shift
+             | ((rgb[..., 1] * fmt.green_max + 127) // 255) << fmt.green_shift
+             | ((rgb[..., 2] * fmt.blue_max + 127) // 255) << fmt.blue_shift)
+    return packed_pixels(value, fmt)
+
+
+def tile_regions(tiles: np.ndarray, width: int, height: int, tile_size: int = DIRTY_TILE_SIZE) -> List[Rect]:
+    """Turn a grid of changed tiles into a short list of rectangles.
+
+    Runs of changed tiles in each tile row become one rectangle, and runs that
+    span the same columns in consecutive rows are merged.
+
+    Args:
+        tiles: Boolean array of shape (tile rows, tile columns)
+        width: Framebuffer width, used to clip the rightmost tiles
+        height: Framebuffer height, used to clip the bottom tiles
+        tile_size: Tile size in pixels
+
+    Returns:
+        List[Rect]: (x, y, width, height) rectangles in pixels
+    """
+    open_runs = {}  # (first column, end column) -> [first row, end row]
+    regions = []
+    for row in range(tiles.shape[0]):
+        # Column indices where a run of changed tiles starts or ends
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], tiles[row].astype(np.int8), [0]))))
+        runs = set(zip(edges[::2].tolist(), edges[1::2].tolist()))
+        for run in list(open_runs):
+            if run not in runs:
+                regions.append((run, open_runs.pop(run)))
+        for run in runs:
+            open_runs.setdefault(run, [row, row + 1])[1] = row + 1
+    regions.extend(open_runs.items())
+
+    rects = []
+    for (first_column, end_column), (first_row, end_row) in sorted(regions, key=lambda item: (item[1][0], item[0][0])):
+        x, y = first_column * tile_size, first_row * tile_size
+        rects.append((x, y, min(end_column * tile_size, width) - x, min(end_row * tile_size, height) - y))
+    return rects
+
+
+def merge_regions(rects: List[Rect], width: int, height: int, tile_size: int = DIRTY_TILE_SIZE) -> List[Rect]:
+    """Merge possibly overlapping rectangles into tile-aligned, non-overlapping ones."""
+    tiles = np.zeros(((height + tile_size - 1) // tile_size, (width + tile_size - 1) // tile_size), dtype=bool)
+    for x, y, w, h in rects:
+        if w > 0 and h > 0:
+            tiles[y // tile_size:(y + h + tile_size - 1) // tile_size,
+                  x // tile_size:(x + w + tile_size - 1) // tile_size] = True
+    return tile_regions(tiles, width, height, tile_size)
+
+
+class Framebuffer:
+    """Remote screen contents kept in the connection's pixel format.
+
+    The pixels live in one preallocated NumPy array of shape
+    (height, width, bytes per pixel). Decoders write rectangles straight into
+    it, and an RGB image is only produced when a screenshot is requested.
+    """
+
+    def __init__(self, width: int, height: int, pixel_format):
+        """Allocate a black framebuffer.
+
+        Args:
+            width: Width in pixels
+            height: Height in pixels
+            pixel_format: PixelFormat of the pixels written into the framebuffer
+        """
+        self.pixel_format = pixel_format
+        self.pixel_size = pixel_format.bits_per_pixel // 8
+        self.pixels = np.zeros((height, width, self.pixel_size), dtype=np.uint8)
+        # Rectangles updated since the last take_dirty()
+        self.dirty: List[Rect] = [(0, 0, width, height)]
+
+    @property
+    def width(self) -> int:
+        """Width in pixels."""
+        return self.pixels.shape[1]
+
+    @property
+    def height(self) -> int:
+        """Height in pixels."""
+        return self.pixels.shape[0]
+
+    def resize(self, width: int, height: int) -> None:
+        """Change the framebuffer size, keeping the overlapping contents."""
+        pixels = np.zeros((height, width, self.pixel_size), dtype=np.uint8)
+        rows, columns = min(height, self.height), min(width, self.width)
+        pixels[:rows, :columns] = self.pixels[:rows, :columns]
+        self.pixels = pixels
+        self.dirty = [(0, 0, width, height)]
+
+    def row_views(self, x: int, y: int, width: int, height: int) -> Iterator[memoryview]:
+        """Yield writable byte views covering a rectangle, in wire order.
+
+        Full-width rectangles are contiguous and yield a single view; others
+        yield one view per row.
+        """
+        if x == 0 and width == self.width:
+            yield memoryview(self.pixels[y:y + height]).cast('B')
+            return
+        for row in range(y, y + height):
+            yield memoryview(self.pixels[row, x:x + width]).cast('B')
+
+    def write(self, x: int, y: int, width: int, height: int, data: bytes) -> None:
+        """Copy packed pixels into a rectangle."""
+        self.pixels[y:y + height, x:x + width] = np.frombuffer(data, dtype=np.uint8).reshape(
+            height, width, self.pixel_size)
+
+    def put(self, x: int, y: int, pixels: np.ndarray) -> None:
+        """Copy an array of shape (height, width, bytes per pixel) into the framebuffer."""
+        self.pixels[y:y + pixels.shape[0], x:x + pixels.shape[1]] = pixels
+
+    def put_rgb(self, x: int, y: int, rgb: np.ndarray) -> None:
+        """Copy an RGB array of shape (height, width, 3) into the framebuffer."""
+        self.put(x, y, rgb_to_pixels(rgb, self.pixel_format))
+
+    def fill(self, x: int, y: int, width: int, height: int, pixel: bytes) -> None:
+        """Fill a rectangle with one packed pixel value."""
+        self.pixels[y:y + height, x:x + width] = np.frombuffer(pixel, dtype=np.uint8)
+
+    def fill_rgb(self, x: int, y: int, width: int, height: int, color: Tuple[int, int, int]) -> None:
+        """Fill a rectangle with an RGB colour."""
+        self.pixels[y:y + height, x:x + width] = rgb_to_pixels(np.array(color), self.pixel_format)
+
+    def copy_rect(self, src_x: int, src_y: int, x: int, y: int, width: int, height: int) -> None:
+        """Copy a rectangle from elsewhere in the framebuffer (CopyRect)."""
+        # NumPy buffers overlapping assignments, so source and destination may overlap
+        self.pixels[y:y + height, x:x + width] = self.pixels[src_y:src_y + height, src_x:src_x + width]
+
+    def mark_dirty(self, x: int, y: int, width: int, height: int) -> None:
+        """Record that a rectangle was updated."""
+        self.dirty.append((x, y, width, height))
+
+    def take_dirty(self) -> List[Rect]:
+        """Return the rectangles updated since the previous call and start a new list."""
+        dirty, self.dirty = self.dirty, []
+        return dirty
+
+    def changed_regions(self, previous: np.ndarray, tile_size: int = DIRTY_TILE_SIZE) -> List[Rect]:
+        """Compare the framebuffer with an earlier copy of its pixels.
+
+        Args:
+            previous: Earlier contents of self.pixels, of the same shape
+            tile_size: Tile size in pixels
+
+        Returns:
+            List[Rect]: Tile-aligned rectangles covering every changed pixel
+        """
+        changed = (self.pixels != previous).any(axis=2)
+        rows, columns = -(-self.height // tile_size), -(-self.width // tile_size)
+        padded = np.zeros((rows * tile_size, columns * tile_size), dtype=bool)
+        padded[:self.height, :self.width] = changed
+        tiles = padded.reshape(rows, tile_size, columns, tile_size).any(axis=(1, 3))
+        return tile_regions(tiles, self.width, self.height, tile_size)
+
+    def to_image(self, colour_map: Optional[np.ndarray] = None, region: Optional[Rect] = None) -> Image.Image:
+        """Return the framebuffer contents as a new RGB image.
+
+        Args:
+            colour_map: The server's colour map, for colour map pixel formats
+            region: (x, y, width, height) to convert (default: the whole framebuffer)
+        """
+        pixels = self.pixels
+        if region is not None:
+            x, y, width, height = region
+            pixels = pixels[y:y + height, x:x + width]
+        return pixels_to_image(pixels, self.pixel_format, colour_map)
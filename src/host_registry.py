@@ -0,0 +1,230 @@
+import os
+import json
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+from vnc_session import VNCSessionPool, VNC_POOL_MAX_SIZE
+
+logger = logging.getLogger('host_registry')
+
+# Fleet configuration, in addition to (or instead of) the single MACOS_HOST machine:
+#   MACOS_HOSTS_FILE - JSON file mapping machine names to their connection settings
+#   MACOS_HOSTS      - comma separated name=host[:port] entries sharing the MACOS_* credentials;
+#                      IPv6 addresses are written as [address] or [address]:port
+MACOS_HOSTS_FILE = os.environ.get('MACOS_HOSTS_FILE', '')
+MACOS_HOSTS = os.environ.get('MACOS_HOSTS', '')
+
+# Name of the machine configured with MACOS_HOST, used when a tool call names no host
+DEFAULT_HOST = "default"
+
+# Settings a machine in MACOS_HOSTS_FILE may have
+HOST_SETTINGS = ("host", "port", "password", "password_env", "username", "encryption", "max_sessions")
+
+
+class MacHost:
+    """A remote MacOs machine and the session pool its tool calls share."""
+
+    def __init__(self, name: str, host: str, port: int = 5900, password: str = "", username: str = "",
+                 encryption: str = "prefer_on", max_sessions: int = VNC_POOL_MAX_SIZE,
+                 pool: Optional[VNCSessionPool] = None):
+        """Describe a machine.
+
+        Args:
+            name: Name tool calls use to select the machine
+            host: Hostname or IP address
+            port: VNC port
+            password: VNC or macOS account password
+            username: macOS account username (optional)
+            encryption: Encryption preference
+            max_sessions: Connections (and so concurrent tool calls) allowed to this machine
+            pool: Session pool to use instead of a new one of max_sessions connections
+        """
+        self.name = name
+        self.host = host
+        self.port = port
+        self.password = password
+        self.username = username
+        self.encryption = encryption
+        self.pool = pool if pool is not None else VNCSessionPool(max_size=max_sessions)
+
+    @property
+    def max_sessions(self) -> int:
+        return self.pool.max_size
+
+    def __repr__(self) -> str:
+        return f"MacHost({self.name!r}, {self.host}:{self.port})"
+
+
+class HostRegistry:
+    """The machines one server drives, each with its own session pool.
+
+    Separate pools keep a slow or unreachable machine from holding up calls to the
+    others, and cap the connections opened to each machine on its own.
+    """
+
+    def __init__(self, hosts: Optional[List[MacHost]] = None):
+        self._hosts: Dict[str, MacHost] = {}
+        for host in hosts or []:
+            self.add(host)
+
+    def add(self, host: MacHost) -> None:
+        """Register a machine.
+
+        A machine already registered under another name (same host, port and username)
+        shares that entry's session pool, so listing it twice does not double the
+        connections allowed to it.
+
+        Raises:
+            ValueError: If a machine with the same name is already registered
+        """
+        if host.name in self._hosts:
+            raise ValueError(f"Duplicate host name '{host.name}'")
+        for other in self._hosts.values():
+            if (other.host, other.port, other.username) == (host.host, host.port, host.username):
+                logger.info(f"Host '{host.name}' is the same machine as '{other.name}', sharing its sessions")
+                host.pool = other.pool
+                break
+        self._hosts[host.name] = host
+
+    def names(self) -> List[str]:
+        """Return the names of the registered machines in registration order."""
+        return list(self._hosts)
+
+    def __iter__(self) -> Iterator[MacHost]:
+        return iter(list(self._hosts.values()))
+
+    def __len__(self) -> int:
+        return len(self._hosts)
+
+    def resolve(self, name: Optional[str] = None) -> MacHost:
+        """Find the machine a tool call targets.
+
+        Args:
+            name: Machine name from the call's host argument; when omitted, the default
+                  machine, or the only one if just one is registered
+
+        Returns:
+            MacHost: The machine
+
+        Raises:
+            ValueError: If the name is unknown, or omitted while several machines but
+                        no default one are registered
+        """
+        if name:
+            host = self._hosts.get(name)
+            if host is None:
+                raise ValueError(f"Unknown host '{name}', expected one of: {', '.join(self._hosts) or 'none'}")
+            return host
+        if DEFAULT_HOST in self._hosts:
+            return self._hosts[DEFAULT_HOST]
+        if len(self._hosts) == 1:
+            return next(iter(self._hosts.values()))
+        if not self._hosts:
+            raise ValueError("No remote MacOs machine is configured (set MACOS_HOST, MACOS_HOSTS or MACOS_HOSTS_FILE)")
+        raise ValueError(f"host is required, one of: {', '.join(self._hosts)}")
+
+    def close_all(self) -> None:
+        """Close the idle connections of every machine."""
+        for host in self:
+            host.pool.close_all()
+
+
+def parse_host_list(value: str, defaults: Dict[str, Any]) -> List[MacHost]:
+    """Parse a MACOS_HOSTS list of name=host[:port] entries.
+
+    An entry without a name is named after its address. IPv6 addresses are put in
+    brackets, as in mini=[fd00::11]:5901. The machines use the password, username
+    and encryption in defaults.
+
+    Raises:
+        ValueError: If an entry is malformed
+    """
+    hosts = []
+    for entry in value.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, address = entry.rpartition('=')
+        if address.startswith('['):
+            address, bracket, port = address[1:].partition(']')
+            if not bracket or (port and not port.startswith(':')):
+                raise ValueError(f"Invalid MACOS_HOSTS entry '{entry}', expected name=[address][:port]")
+            port = port[1:]
+        elif address.count(':') > 1:
+            raise ValueError(f"Invalid MACOS_HOSTS entry '{entry}', IPv6 addresses must be written as [address]")
+        else:
+            address, _, port = address.partition(':')
+        if not address:
+            raise ValueError(f"Invalid MACOS_HOSTS entry '{entry}', expected name=host[:port]")
+        try:
+            settings = dict(defaults, host=address, port=int(port) if port else defaults.get("port", 5900))
+        except ValueError:
+            raise ValueError(f"Invalid port in MACOS_HOSTS entry '{entry}'")
+        hosts.append(MacHost(name or address, **settings))
+    return hosts
+
+
+def load_hosts_file(path: str, defaults: Dict[str, Any]) -> List[MacHost]:
+    """Load the machines of a MACOS_HOSTS_FILE.
+
+    The file is a JSON object mapping machine names to objects with a ``host`` and
+    optionally ``port``, ``password`` (or ``password_env``, the name of an environment
+    variable holding it), ``username``, ``encryption`` and ``max_sessions``. Missing
+    settings are taken from defaults.
+
+    Raises:
+        ValueError: If the file cannot be read or has an invalid entry
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(f"Cannot read MACOS_HOSTS_FILE {path}: {str(e)}")
+    if not isinstance(config, dict):
+        raise ValueError(f"MACOS_HOSTS_FILE {path} must contain an object mapping names to hosts")
+
+    hosts = []
+    for name, entry in config.items():
+        if not isinstance(entry, dict) or not entry.get("host"):
+            raise ValueError(f"Host '{name}' in {path} needs a 'host' setting")
+        unknown = set(entry) - set(HOST_SETTINGS)
+        if unknown:
+            raise ValueError(f"Host '{name}' in {path} has unknown settings: {', '.join(sorted(unknown))}")
+        settings = dict(defaults, **entry)
+        password_env = settings.pop("password_env", None)
+        if password_env:
+            settings["password"] = os.environ.get(password_env, "")
+        settings["port"] = int(settings["port"])
+        settings["max_sessions"] = int(settings["max_sessions"])
+        hosts.append(MacHost(name, **settings))
+    return hosts
+
+
+def load_hosts(default: Optional[MacHost] = None, defaults: Optional[Dict[str, Any]] = None,
+               hosts_file: str = MACOS_HOSTS_FILE, host_list: str = MACOS_HOSTS) -> HostRegistry:
+    """Build the registry of machines from the fleet configuration.
+
+    Args:
+        default: The MACOS_HOST machine, registered as DEFAULT_HOST
+        defaults: Settings for machines that do not give their own (port, password,
+                  username, encryption, max_sessions)
+        hosts_file: Path of a MACOS_HOSTS_FILE, or empty
+        host_list: A MACOS_HOSTS list, or empty
+
+    Returns:
+        HostRegistry: The machines
+
+    Raises:
+        ValueError: If the configuration is invalid
+    """
+    defaults = dict({"port": 5900, "max_sessions": VNC_POOL_MAX_SIZE}, **(defaults or {}))
+    registry = HostRegistry([default] if default is not None else [])
+    if hosts_file:
+        for host in load_hosts_file(hosts_file, defaults):
+            registry.add(host)
+    if host_list:
+        for host in parse_host_list(host_list, defaults):
+            registry.add(host)
+    if len(registry) > 1:
+        logger.info(f"Configured {len(registry)} remote MacOs machines: {', '.join(registry.names())}")
+    return registry
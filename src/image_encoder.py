@@ -0,0 +1,111 @@
+import io
+import os
+import logging
+from typing import Optional, Tuple, Union
+
+from PIL import Image, features
+
+logger = logging.getLogger('image_encoder')
+
+# MIME type of each screenshot format
+IMAGE_FORMATS = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+}
+
+# Encoder effort presets: PNG zlib level and WebP method
+COMPRESSION_PRESETS = {
+    "fast": (1, 0),
+    "default": (6, 4),
+    "best": (9, 6),
+}
+
+# Defaults for remote_macos_get_screen when the call does not choose
+SCREENSHOT_FORMAT = os.environ.get('VNC_SCREENSHOT_FORMAT', 'png')
+SCREENSHOT_QUALITY = int(os.environ.get('VNC_SCREENSHOT_QUALITY', '80'))
+SCREENSHOT_COMPRESSION = os.environ.get('VNC_SCREENSHOT_COMPRESSION', 'fast')
+
+
+def normalize_format(image_format: Optional[str]) -> str:
+    """Validate a screenshot format name, falling back to VNC_SCREENSHOT_FORMAT.
+
+    Raises:
+        ValueError: If the format is not supported
+    """
+    image_format = (image_format or SCREENSHOT_FORMAT).lower()
+    if image_format == "jpg":
+        image_format = "jpeg"
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unsupported image format: {image_format}. Use one of {', '.join(IMAGE_FORMATS)}")
+    if image_format == "webp" and not features.check('webp'):
+        raise ValueError("WebP is not supported by this Pillow build")
+    return image_format
+
+
+def image_options(image_format: Optional[str] = None, quality: Optional[int] = None,
+                  compression: Optional[Union[str, int]] = None) -> Tuple[str, int, Union[str, int]]:
+    """Validate screenshot encoding options, filling in the VNC_SCREENSHOT_* defaults.
+
+    Tool handlers call this before connecting, so a bad argument is reported without
+    discarding the pooled connection the capture would have used.
+
+    Returns:
+        Tuple[str, int, Union[str, int]]: (image_format, quality, compression) where
+            compression is a preset name or a PNG zlib level
+
+    Raises:
+        ValueError: If an option is not supported or out of range
+    """
+    image_format = normalize_format(image_format)
+    try:
+        quality = SCREENSHOT_QUALITY if quality is None else int(quality)
+    except (TypeError, ValueError):
+        raise ValueError(f"quality must be a number between 1 and 100, got {quality}")
+    if not 1 <= quality <= 100:
+        raise ValueError(f"quality must be between 1 and 100, got {quality}")
+
+    compression = SCREENSHOT_COMPRESSION if compression is None else compression
+    if isinstance(compression, str) and compression.isdigit():
+        compression = int(compression)
+    if isinstance(compression, int):
+        if not 0 <= compression <= 9:
+            raise ValueError(f"compression level must be between 0 and 9, got {compression}")
+    elif compression not in COMPRESSION_PRESETS:
+        raise ValueError(f"compression must be one of {', '.join(COMPRESSION_PRESETS)} or 0-9, got {compression}")
+    return image_format, quality, compression
+
+
+def encode_image(img: Image.Image, image_format: Optional[str] = None, quality: Optional[int] = None,
+                 compression: Optional[Union[str, int]] = None) -> bytes:
+    """Encode a screenshot in a single pass.
+
+    Args:
+        img: RGB image to encode
+        image_format: "png", "jpeg" or "webp" (default: VNC_SCREENSHOT_FORMAT)
+        quality: JPEG/WebP quality 1-100 (default: VNC_SCREENSHOT_QUALITY)
+        compression: Encoder effort, "fast", "default" or "best", or a PNG zlib level 0-9
+                     (default: VNC_SCREENSHOT_COMPRESSION)
+
+    Returns:
+        bytes: Encoded image data
+
+    Raises:
+        ValueError: If an argument is out of range
+    """
+    image_format, quality, compression = image_options(image_format, quality, compression)
+    if isinstance(compression, int):
+        png_level, webp_method = compression, min(compression * 6 // 9, 6)
+    else:
+        png_level, webp_method = COMPRESSION_PRESETS[compression]
+
+    output = io.BytesIO()
+    if image_format == "png":
+        # optimize=True would re-run zlib with several strategies; only worth it for "best"
+        img.save(output, format='PNG', compress_level=png_level, optimize=compression == "best")
+    elif image_format == "jpeg":
+        img.save(output, format='JPEG', quality=quality)
+    else:
+        img.save(output, format='WEBP', quality=quality, method=webp_method)
+    logger.debug("Encoded %dx%d screenshot as %s: %d bytes", img.width, img.height, image_format, output.tell())
+    return output.getvalue()
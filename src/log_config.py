@@ -0,0 +1,130 @@
+import os
+import sys
+import json
+import logging
+import itertools
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# Logging configuration of the server process:
+#   VNC_LOG_LEVEL    - level of all loggers (default INFO)
+#   VNC_LOG_LEVELS   - per-logger levels, e.g. "vnc_client=DEBUG,action_handlers=WARNING"
+#   VNC_LOG_FORMAT   - "text" or "json" (one JSON object per line)
+#   VNC_LOG_FILE     - write to this file instead of stderr
+#   VNC_LOG_SAMPLE   - log only every Nth per-input-event debug message (1 logs all)
+VNC_LOG_LEVEL = os.environ.get('VNC_LOG_LEVEL', 'INFO')
+VNC_LOG_LEVELS = os.environ.get('VNC_LOG_LEVELS', '')
+VNC_LOG_FORMAT = os.environ.get('VNC_LOG_FORMAT', 'text')
+VNC_LOG_FILE = os.environ.get('VNC_LOG_FILE', '')
+VNC_LOG_SAMPLE = int(os.environ.get('VNC_LOG_SAMPLE', '100'))
+
+LOG_FORMATS = ("text", "json")
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else was passed with extra= and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+# Handler installed by configure_logging(), replaced when it is called again
+_handler: Optional[logging.Handler] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as single-line JSON objects, including fields passed with extra=."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def parse_levels(value: str) -> Dict[str, int]:
+    """Parse a VNC_LOG_LEVELS list of logger=LEVEL entries.
+
+    Raises:
+        ValueError: If an entry is malformed or names an unknown level
+    """
+    levels = {}
+    for entry in value.split(','):
+        if not entry.strip():
+            continue
+        name, _, level = entry.partition('=')
+        if not name.strip() or not level.strip():
+            raise ValueError(f"Invalid VNC_LOG_LEVELS entry '{entry}', expected logger=LEVEL")
+        levels[name.strip()] = _level(level)
+    return levels
+
+
+def _level(name: str) -> int:
+    """Resolve a level name such as "debug"."""
+    level = logging.getLevelName(name.strip().upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level: {name}")
+    return level
+
+
+def configure_logging(level: str = VNC_LOG_LEVEL, levels: str = VNC_LOG_LEVELS, log_format: str = VNC_LOG_FORMAT,
+                      log_file: str = VNC_LOG_FILE) -> None:
+    """Set up the root logger of the server process.
+
+    Replaces the handler of an earlier call, so it can be called again to reconfigure.
+    Messages go to stderr by default; stdout carries the MCP protocol.
+
+    Args:
+        level: Level of all loggers
+        levels: Per-logger levels (see parse_levels())
+        log_format: "text" or "json"
+        log_file: Path to append to instead of stderr
+
+    Raises:
+        ValueError: If a setting is invalid
+    """
+    global _handler
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"VNC_LOG_FORMAT must be one of {', '.join(LOG_FORMATS)}, got {log_format}")
+    root_level = _level(level)
+    logger_levels = parse_levels(levels)
+
+    handler = logging.FileHandler(log_file, encoding='utf-8') if log_file else logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+
+    root = logging.getLogger()
+    if _handler is not None:
+        root.removeHandler(_handler)
+        _handler.close()
+    root.addHandler(handler)
+    root.setLevel(root_level)
+    _handler = handler
+    for name, logger_level in logger_levels.items():
+        logging.getLogger(name).setLevel(logger_level)
+
+
+class SampledLogger:
+    """Debug logging for messages repeated per input event, keeping one in every ``every``.
+
+    Nothing is formatted unless the logger is enabled for DEBUG and the message is
+    one that is kept, so streaming input costs a level check per event.
+    """
+
+    def __init__(self, logger: logging.Logger, every: int = VNC_LOG_SAMPLE):
+        self.logger = logger
+        self.every = max(1, every)
+        self._counter = itertools.count(1)
+
+    def debug(self, msg: str, *args) -> None:
+        """Log a debug message with %-style arguments if it is the one in every ``every`` kept."""
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        count = next(self._counter)
+        if self.every == 1:
+            self.logger.debug(msg, *args)
+        elif count % self.every == 1:
+            self.logger.debug(msg + " (event %d, logging 1 in %d)", *args, count, self.every)
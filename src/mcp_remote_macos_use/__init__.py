@@ -4,8 +4,6 @@ import logging
 import sys
 import os
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger('mcp_remote_macos_use')
 
 # Add src directory to path to allow importing action_handlers and vnc_client
@@ -13,6 +11,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 def main():
     """Entry point for the MCP Remote MacOS Use server."""
+    from log_config import configure_logging
+    configure_logging()
     logger.debug("Starting mcp_remote_macos_use main()")
     parser = argparse.ArgumentParser(description='VNC MCP Server')
     args = parser.parse_args()
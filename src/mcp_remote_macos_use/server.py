@@ -12,6 +12,7 @@ import json
 import os
 from base64 import b64encode
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import sys
 
 # Import MCP server libraries
@@ -26,28 +27,35 @@ from .livekit_handler import LiveKitHandler
 
 # Import VNC client functionality from the src directory
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from log_config import configure_logging
+
+# Configure logging (VNC_LOG_LEVEL, VNC_LOG_FORMAT, ...) before the modules below log their settings
+configure_logging()
+
 from vnc_client import VNCClient, capture_vnc_screen
+from metrics import VNC_METRICS_PORT, metrics, start_prometheus_server
 
 # Import action handlers from the src directory
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from action_handlers import (
     handle_remote_macos_get_screen,
+    handle_remote_macos_get_screen_region,
+    handle_remote_macos_get_screens,
+    handle_remote_macos_wait_for_screen,
     handle_remote_macos_mouse_scroll,
     handle_remote_macos_send_keys,
     handle_remote_macos_mouse_move,
     handle_remote_macos_mouse_click,
     handle_remote_macos_mouse_double_click,
     handle_remote_macos_open_application,
-    handle_remote_macos_mouse_drag_n_drop
+    handle_remote_macos_mouse_drag_n_drop,
+    handle_remote_macos_set_clipboard,
+    handle_remote_macos_get_clipboard,
+    handle_remote_macos_batch,
+    hosts
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger('mcp_remote_macos_use')
-logger.setLevel(logging.DEBUG)
 
 # Load environment variables for VNC connection
 MACOS_HOST = os.environ.get('MACOS_HOST', '')
@@ -55,6 +63,16 @@ MACOS_PORT = int(os.environ.get('MACOS_PORT', '5900'))
 MACOS_USERNAME = os.environ.get('MACOS_USERNAME', '')
 MACOS_PASSWORD = os.environ.get('MACOS_PASSWORD', '')
 VNC_ENCRYPTION = os.environ.get('VNC_ENCRYPTION', 'prefer_on')
+# A fleet of machines, in addition to or instead of MACOS_HOST (see host_registry.py)
+MACOS_HOSTS = os.environ.get('MACOS_HOSTS', '')
+MACOS_HOSTS_FILE = os.environ.get('MACOS_HOSTS_FILE', '')
+
+# Worker threads running the blocking VNC calls; a fleet screenshot needs one per machine
+VNC_WORKER_THREADS = int(os.environ.get('VNC_WORKER_THREADS', '64'))
+
+# MCP resources exposing the metrics
+METRICS_URI = "metrics://vnc"
+PROMETHEUS_METRICS_URI = "metrics://vnc/prometheus"
 
 # LiveKit configuration
 LIVEKIT_URL = os.environ.get('LIVEKIT_URL', '')
@@ -67,16 +85,18 @@ logger.info(f"MACOS_PORT from environment: {MACOS_PORT}")
 logger.info(f"MACOS_USERNAME from environment: {'Set' if MACOS_USERNAME else 'Not set'}")
 logger.info(f"MACOS_PASSWORD from environment: {'Set' if MACOS_PASSWORD else 'Not set (Required)'}")
 logger.info(f"VNC_ENCRYPTION from environment: {VNC_ENCRYPTION}")
+logger.info(f"MACOS_HOSTS from environment: {'Set' if MACOS_HOSTS else 'Not set'}")
+logger.info(f"MACOS_HOSTS_FILE from environment: {MACOS_HOSTS_FILE or 'Not set'}")
 logger.info(f"LIVEKIT_URL from environment: {'Set' if LIVEKIT_URL else 'Not set'}")
 logger.info(f"LIVEKIT_API_KEY from environment: {'Set' if LIVEKIT_API_KEY else 'Not set'}")
 logger.info(f"LIVEKIT_API_SECRET from environment: {'Set' if LIVEKIT_API_SECRET else 'Not set'}")
 
 # Validate required environment variables
-if not MACOS_HOST:
+if not MACOS_HOST and not (MACOS_HOSTS or MACOS_HOSTS_FILE):
     logger.error("MACOS_HOST environment variable is required but not set")
     raise ValueError("MACOS_HOST environment variable is required but not set")
 
-if not MACOS_PASSWORD:
+if MACOS_HOST and not MACOS_PASSWORD:
     logger.error("MACOS_PASSWORD environment variable is required but not set")
     raise ValueError("MACOS_PASSWORD environment variable is required but not set")
 
@@ -85,6 +105,13 @@ async def main():
     """Run the Remote MacOS MCP server."""
     logger.info("Remote MacOS computer use server starting")
 
+    if VNC_METRICS_PORT:
+        start_prometheus_server(int(VNC_METRICS_PORT))
+
+    # asyncio's default executor has only a few threads, too few to capture a fleet concurrently
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=VNC_WORKER_THREADS, thread_name_prefix="vnc-worker"))
+
     # Initialize LiveKit handler if environment variables are set
     livekit_handler = None
     if all([LIVEKIT_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET]):
@@ -108,11 +135,11 @@ async def main():
             livekit_handler = None
 
     # Validate required environment variables
-    if not MACOS_HOST:
+    if not MACOS_HOST and not (MACOS_HOSTS or MACOS_HOSTS_FILE):
         logger.error("MACOS_HOST environment variable is required but not set")
         raise ValueError("MACOS_HOST environment variable is required but not set")
 
-    if not MACOS_PASSWORD:
+    if MACOS_HOST and not MACOS_PASSWORD:
         logger.error("MACOS_PASSWORD environment variable is required but not set")
         raise ValueError("MACOS_PASSWORD environment variable is required but not set")
 
@@ -120,22 +147,129 @@ async def main():
 
     @server.list_resources()
     async def handle_list_resources() -> list[types.Resource]:
-        return []
+        return [
+            types.Resource(
+                uri=METRICS_URI,
+                name="VNC metrics",
+                description="Handshake phase, screen capture stage and tool call timings, connection "
+                            "counters and per-host session pool occupancy",
+                mimeType="application/json"
+            ),
+            types.Resource(
+                uri=PROMETHEUS_METRICS_URI,
+                name="VNC metrics (Prometheus)",
+                description="The counters and histograms in the Prometheus text format",
+                mimeType="text/plain"
+            ),
+        ]
 
     @server.read_resource()
     async def handle_read_resource(uri: types.AnyUrl) -> str:
-        return ""
+        if str(uri) == METRICS_URI:
+            return json.dumps({
+                "metrics": metrics.snapshot(),
+                "pools": {host.name: host.pool.stats() for host in hosts},
+            }, indent=2)
+        if str(uri) == PROMETHEUS_METRICS_URI:
+            return metrics.to_prometheus()
+        raise ValueError(f"Unknown resource: {uri}")
 
     @server.list_tools()
     async def handle_list_tools() -> list[types.Tool]:
         """List available tools"""
-        return [
+        tools = [
             types.Tool(
                 name="remote_macos_get_screen",
                 description="Connect to a remote MacOs machine and get a screenshot of the remote desktop. Uses environment variables for connection details.",
                 inputSchema={
                     "type": "object",
-                    "properties": {}
+                    "properties": {
+                        "format": {
+                            "type": "string",
+                            "description": "Image format of the screenshot. JPEG and WebP are much smaller and faster to encode than PNG",
+                            "enum": ["png", "jpeg", "webp"]
+                        },
+                        "quality": {"type": "integer", "description": "JPEG/WebP quality (1-100)", "minimum": 1, "maximum": 100},
+                        "compression": {
+                            "type": "string",
+                            "description": "Encoder effort: 'fast', 'default' or 'best', or a PNG zlib level '0'-'9'"
+                        },
+                        "since_frame": {
+                            "type": "string",
+                            "description": "Frame identifier from an earlier screenshot. If only part of the screen changed since then, only the changed regions are returned with their coordinates, or a 'no change' answer"
+                        },
+                        "show_cursor": {
+                            "type": "boolean",
+                            "description": "Draw the mouse pointer at its last position (always returns a full screenshot)",
+                            "default": False
+                        }
+                    }
+                },
+            ),
+            types.Tool(
+                name="remote_macos_get_screen_region",
+                description="Capture one region of the remote MacOs screen, such as a dialog or text field, at native resolution or a requested size. Much cheaper than a full screenshot and keeps detail that full-screen downscaling loses.",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "x": {"type": "integer", "description": "Left edge of the region (in source dimensions)"},
+                        "y": {"type": "integer", "description": "Top edge of the region (in source dimensions)"},
+                        "width": {"type": "integer", "description": "Width of the region (in source dimensions)"},
+                        "height": {"type": "integer", "description": "Height of the region (in source dimensions)"},
+                        "source_width": {"type": "integer", "description": "Width of the reference screen for coordinate scaling (default: width of the screenshots from remote_macos_get_screen)"},
+                        "source_height": {"type": "integer", "description": "Height of the reference screen for coordinate scaling (default: height of the screenshots from remote_macos_get_screen)"},
+                        "output_width": {"type": "integer", "description": "Width to scale the region to (default: native resolution; aspect ratio kept if only one side is given)"},
+                        "output_height": {"type": "integer", "description": "Height to scale the region to (default: native resolution; aspect ratio kept if only one side is given)"},
+                        "format": {"type": "string", "description": "Image format", "enum": ["png", "jpeg", "webp"]},
+                        "quality": {"type": "integer", "description": "JPEG/WebP quality (1-100)", "minimum": 1, "maximum": 100},
+                        "compression": {"type": "string", "description": "Encoder effort: 'fast', 'default' or 'best', or a PNG zlib level '0'-'9'"},
+                        "show_cursor": {"type": "boolean", "description": "Draw the mouse pointer at its last position", "default": False}
+                    },
+                    "required": ["x", "y", "width", "height"]
+                },
+            ),
+            types.Tool(
+                name="remote_macos_get_screens",
+                description="Capture the screens of several configured MacOs machines at once, e.g. to survey a fleet. Machines are captured concurrently; ones that fail or time out are reported and the other screenshots are still returned.",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "hosts": {
+                            "type": "array",
+                            "description": "Names of the machines to capture (default: all configured machines)",
+                            "items": {"type": "string", "enum": hosts.names()}
+                        },
+                        "timeout": {"type": "number", "description": "Seconds to wait for each machine", "default": 15},
+                        "thumbnail_width": {"type": "integer", "description": "Shrink each screenshot to at most this width", "minimum": 1},
+                        "thumbnail_height": {"type": "integer", "description": "Shrink each screenshot to at most this height", "minimum": 1},
+                        "format": {"type": "string", "description": "Image format of the screenshots", "enum": ["png", "jpeg", "webp"]},
+                        "quality": {"type": "integer", "description": "JPEG/WebP quality (1-100)", "minimum": 1, "maximum": 100}
+                    },
+                    "required": []
+                },
+            ),
+            types.Tool(
+                name="remote_macos_wait_for_screen",
+                description="Wait on the remote MacOs machine until the screen (or a region of it) changes, or until it has stopped changing, without taking screenshots. Use it after an action instead of polling remote_macos_get_screen.",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "until": {
+                            "type": "string",
+                            "description": "'change' returns on the first change, 'stable' once nothing has changed for stable_ms",
+                            "enum": ["change", "stable"],
+                            "default": "change"
+                        },
+                        "stable_ms": {"type": "integer", "description": "Quiet period in milliseconds for 'stable'", "default": 500},
+                        "timeout": {"type": "number", "description": "Maximum seconds to wait (up to 120)", "default": 10},
+                        "x": {"type": "integer", "description": "Left edge of the region to watch (in source dimensions, optional)"},
+                        "y": {"type": "integer", "description": "Top edge of the region to watch (in source dimensions, optional)"},
+                        "width": {"type": "integer", "description": "Width of the region to watch (in source dimensions, optional)"},
+                        "height": {"type": "integer", "description": "Height of the region to watch (in source dimensions, optional)"},
+                        "source_width": {"type": "integer", "description": "Width of the reference screen for coordinate scaling (default: width of the screenshots from remote_macos_get_screen)"},
+                        "source_height": {"type": "integer", "description": "Height of the reference screen for coordinate scaling (default: height of the screenshots from remote_macos_get_screen)"}
+                    },
+                    "required": []
                 },
             ),
             types.Tool(
@@ -146,8 +280,8 @@ async def main():
                     "properties": {
                         "x": {"type": "integer", "description": "X coordinate for mouse position (in source dimensions)"},
                         "y": {"type": "integer", "description": "Y coordinate for mouse position (in source dimensions)"},
-                        "source_width": {"type": "integer", "description": "Width of the reference screen for coordinate scaling", "default": 1366},
-                        "source_height": {"type": "integer", "description": "Height of the reference screen for coordinate scaling", "default": 768},
+                        "source_width": {"type": "integer", "description": "Width of the reference screen for coordinate scaling (default: width of the screenshots from remote_macos_get_screen)"},
+                        "source_height": {"type": "integer", "description": "Height of the reference screen for coordinate scaling (default: height of the screenshots from remote_macos_get_screen)"},
                         "direction": {
                             "type": "string",
                             "description": "Scroll direction",
@@ -179,8 +313,8 @@ async def main():
                     "properties": {
                         "x": {"type": "integer", "description": "X coordinate for mouse position (in source dimensions)"},
                         "y": {"type": "integer", "description": "Y coordinate for mouse position (in source dimensions)"},
-                        "source_width": {"type": "integer", "description": "Width of the reference screen for coordinate scaling", "default": 1366},
-                        "source_height": {"type": "integer", "description": "Height of the reference screen for coordinate scaling", "default": 768}
+                        "source_width": {"type": "integer", "description": "Width of the reference screen for coordinate scaling (default: width of the screenshots from remote_macos_get_screen)"},
+                        "source_height": {"type": "integer", "description": "Height of the reference screen for coordinate scaling (default: height of the screenshots from remote_macos_get_screen)"}
                     },
                     "required": ["x", "y"]
                 },
@@ -193,8 +327,8 @@ async def main():
                     "properties": {
                         "x": {"type": "integer", "description": "X coordinate for mouse position (in source dimensions)"},
                         "y": {"type": "integer", "description": "Y coordinate for mouse position (in source dimensions)"},
-                        "source_width": {"type": "integer", "description": "Width of the reference screen for coordinate scaling", "default": 1366},
-                        "source_height": {"type": "integer", "description": "Height of the reference screen for coordinate scaling", "default": 768},
+                        "source_width": {"type": "integer", "description": "Width of the reference screen for coordinate scaling (default: width of the screenshots from remote_macos_get_screen)"},
+                        "source_height": {"type": "integer", "description": "Height of the reference screen for coordinate scaling (default: height of the screenshots from remote_macos_get_screen)"},
                         "button": {"type": "integer", "description": "Mouse button (1=left, 2=middle, 3=right)", "default": 1}
                     },
                     "required": ["x", "y"]
@@ -208,8 +342,8 @@ async def main():
                     "properties": {
                         "x": {"type": "integer", "description": "X coordinate for mouse position (in source dimensions)"},
                         "y": {"type": "integer", "description": "Y coordinate for mouse position (in source dimensions)"},
-                        "source_width": {"type": "integer", "description": "Width of the reference screen for coordinate scaling", "default": 1366},
-                        "source_height": {"type": "integer", "description": "Height of the reference screen for coordinate scaling", "default": 768},
+                        "source_width": {"type": "integer", "description": "Width of the reference screen for coordinate scaling (default: width of the screenshots from remote_macos_get_screen)"},
+                        "source_height": {"type": "integer", "description": "Height of the reference screen for coordinate scaling (default: height of the screenshots from remote_macos_get_screen)"},
                         "button": {"type": "integer", "description": "Mouse button (1=left, 2=middle, 3=right)", "default": 1}
                     },
                     "required": ["x", "y"]
@@ -239,8 +373,8 @@ async def main():
                         "start_y": {"type": "integer", "description": "Starting Y coordinate (in source dimensions)"},
                         "end_x": {"type": "integer", "description": "Ending X coordinate (in source dimensions)"},
                         "end_y": {"type": "integer", "description": "Ending Y coordinate (in source dimensions)"},
-                        "source_width": {"type": "integer", "description": "Width of the reference screen for coordinate scaling", "default": 1366},
-                        "source_height": {"type": "integer", "description": "Height of the reference screen for coordinate scaling", "default": 768},
+                        "source_width": {"type": "integer", "description": "Width of the reference screen for coordinate scaling (default: width of the screenshots from remote_macos_get_screen)"},
+                        "source_height": {"type": "integer", "description": "Height of the reference screen for coordinate scaling (default: height of the screenshots from remote_macos_get_screen)"},
                         "button": {"type": "integer", "description": "Mouse button (1=left, 2=middle, 3=right)", "default": 1},
                         "steps": {"type": "integer", "description": "Number of intermediate points for smooth dragging", "default": 10},
                         "delay_ms": {"type": "integer", "description": "Delay between steps in milliseconds", "default": 10}
@@ -248,13 +382,82 @@ async def main():
                     "required": ["start_x", "start_y", "end_x", "end_y"]
                 },
             ),
+            types.Tool(
+                name="remote_macos_set_clipboard",
+                description="Put text on the clipboard of the remote MacOs machine, and optionally paste it with Command+V. Much faster than typing long text, and keeps its formatting.",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "text": {"type": "string", "description": "Text to put on the clipboard"},
+                        "paste": {"type": "boolean", "description": "Paste the text into the focused application", "default": False}
+                    },
+                    "required": ["text"]
+                },
+            ),
+            types.Tool(
+                name="remote_macos_get_clipboard",
+                description="Read the clipboard text of the remote MacOs machine. With copy_selection, presses Command+C first to read the currently selected text, without taking a screenshot.",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "copy_selection": {"type": "boolean", "description": "Copy the current selection (Command+C) and return it", "default": False},
+                        "timeout": {"type": "number", "description": "Seconds to wait for the clipboard text", "default": 3}
+                    },
+                    "required": []
+                },
+            ),
+            types.Tool(
+                name="remote_macos_batch",
+                description="Run several actions in order over one connection in a single call, e.g. click, type, press enter and take a screenshot. Each step takes the same arguments as the matching tool and reports its own result.",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "actions": {
+                            "type": "array",
+                            "description": "Steps to run in order. Each step has an 'action' and the arguments of the matching tool: move (remote_macos_mouse_move), click, double_click, keys (remote_macos_send_keys), drag (remote_macos_mouse_drag_n_drop), scroll, wait (remote_macos_wait_for_screen), screenshot (remote_macos_get_screen), set_clipboard or get_clipboard",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "action": {
+                                        "type": "string",
+                                        "enum": ["move", "click", "double_click", "keys", "drag", "scroll", "wait", "screenshot",
+                                                 "set_clipboard", "get_clipboard"]
+                                    }
+                                },
+                                "required": ["action"]
+                            }
+                        },
+                        "screenshot": {
+                            "type": ["boolean", "object"],
+                            "description": "Take a screenshot after the last step; true, or the remote_macos_get_screen arguments to use",
+                            "default": False
+                        },
+                        "stop_on_error": {"type": "boolean", "description": "Skip the remaining steps after a step fails", "default": True}
+                    },
+                    "required": ["actions"]
+                },
+            ),
         ]
+        # Every tool can target any configured machine
+        for tool in tools:
+            if "hosts" in tool.inputSchema["properties"]:
+                continue
+            tool.inputSchema["properties"]["host"] = {
+                "type": "string",
+                "description": "Name of the remote MacOs machine to use; defaults to the MACOS_HOST machine",
+                "enum": hosts.names()
+            }
+        return tools
 
     @server.call_tool()
     async def handle_call_tool(
         name: str, arguments: dict[str, Any] | None
     ) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
         """Handle tool execution requests"""
+        # Blocking VNC handlers run in worker threads so that concurrent tool calls
+        # and LiveKit callbacks are not stalled by network I/O
+        started = time.perf_counter()
+        result = "ok"
         try:
             if not arguments:
                 arguments = {}
@@ -262,33 +465,55 @@ async def main():
             if name == "remote_macos_get_screen":
                 return await handle_remote_macos_get_screen(arguments)
 
+            elif name == "remote_macos_get_screen_region":
+                return await handle_remote_macos_get_screen_region(arguments)
+
+            elif name == "remote_macos_get_screens":
+                return await handle_remote_macos_get_screens(arguments)
+
+            elif name == "remote_macos_wait_for_screen":
+                return await handle_remote_macos_wait_for_screen(arguments)
+
             elif name == "remote_macos_mouse_scroll":
-                return handle_remote_macos_mouse_scroll(arguments)
+                return await asyncio.to_thread(handle_remote_macos_mouse_scroll, arguments)
 
             elif name == "remote_macos_send_keys":
-                return handle_remote_macos_send_keys(arguments)
+                return await asyncio.to_thread(handle_remote_macos_send_keys, arguments)
 
             elif name == "remote_macos_mouse_move":
-                return handle_remote_macos_mouse_move(arguments)
+                return await asyncio.to_thread(handle_remote_macos_mouse_move, arguments)
 
             elif name == "remote_macos_mouse_click":
-                return handle_remote_macos_mouse_click(arguments)
+                return await asyncio.to_thread(handle_remote_macos_mouse_click, arguments)
 
             elif name == "remote_macos_mouse_double_click":
-                return handle_remote_macos_mouse_double_click(arguments)
+                return await asyncio.to_thread(handle_remote_macos_mouse_double_click, arguments)
 
             elif name == "remote_macos_open_application":
-                return handle_remote_macos_open_application(arguments)
+                return await asyncio.to_thread(handle_remote_macos_open_application, arguments)
 
             elif name == "remote_macos_mouse_drag_n_drop":
-                return handle_remote_macos_mouse_drag_n_drop(arguments)
+                return await asyncio.to_thread(handle_remote_macos_mouse_drag_n_drop, arguments)
+
+            elif name == "remote_macos_set_clipboard":
+                return await asyncio.to_thread(handle_remote_macos_set_clipboard, arguments)
+
+            elif name == "remote_macos_get_clipboard":
+                return await asyncio.to_thread(handle_remote_macos_get_clipboard, arguments)
+
+            elif name == "remote_macos_batch":
+                return await handle_remote_macos_batch(arguments)
 
             else:
                 raise ValueError(f"Unknown tool: {name}")
 
         except Exception as e:
+            result = "error"
             logger.error(f"Error in handle_call_tool: {str(e)}", exc_info=True)
             return [types.TextContent(type="text", text=f"Error: {str(e)}")]
+        finally:
+            metrics.observe("mcp_tool_seconds", time.perf_counter() - started, tool=name)
+            metrics.increment("mcp_tool_calls_total", tool=name, result=result)
 
     async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
         logger.info("Server running with stdio transport")
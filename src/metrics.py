@@ -0,0 +1,187 @@
+import os
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Tuple
+
+logger = logging.getLogger('metrics')
+
+# Serve the metrics in the Prometheus text format on this port (unset disables)
+VNC_METRICS_PORT = os.environ.get('VNC_METRICS_PORT', '')
+VNC_METRICS_HOST = os.environ.get('VNC_METRICS_HOST', '127.0.0.1')
+
+# Upper bounds (seconds) of the histogram buckets; the last bucket is +Inf
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# What each metric measures, shown as HELP in the Prometheus output
+DESCRIPTIONS = {
+    "vnc_handshake_seconds": "Duration of successful VNC handshakes",
+    "vnc_handshake_phase_seconds": "Duration of each phase of successful VNC handshakes",
+    "vnc_connects_total": "VNC connection attempts by result",
+    "vnc_pool_acquires_total": "Session pool acquires by result",
+    "vnc_capture_stage_seconds": "Duration of each stage of screen captures",
+    "mcp_tool_seconds": "Duration of MCP tool calls",
+    "mcp_tool_calls_total": "MCP tool calls by tool and result",
+}
+
+# A metric with its labels, e.g. ("vnc_capture_stage_seconds", (("stage", "encode"),))
+Series = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class Histogram:
+    """Count, sum and bucketed counts of observed durations."""
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.buckets[bisect_left(BUCKETS, value)] += 1
+
+
+class Metrics:
+    """Process-wide counters and duration histograms.
+
+    Recording takes a lock and a few additions, so it is cheap enough for every
+    handshake phase and capture stage.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Series, int] = {}
+        self._histograms: Dict[Series, Histogram] = {}
+
+    def increment(self, name: str, amount: int = 1, **labels: str) -> None:
+        """Add to a counter."""
+        series = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[series] = self._counters.get(series, 0) + amount
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        """Record a duration in a histogram."""
+        series = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(series)
+            if histogram is None:
+                histogram = self._histograms[series] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        """Record the duration of a block in a histogram, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self) -> None:
+        """Forget all recorded values."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Return the current values.
+
+        Returns:
+            Dict mapping metric names to their series, each a dict with its "labels" and
+            either a "value" (counters) or "count", "sum" and "mean" in milliseconds and
+            cumulative "buckets" keyed by upper bound (histograms)
+        """
+        result: Dict[str, List[Dict[str, Any]]] = {}
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                result.setdefault(name, []).append({"labels": dict(labels), "value": value})
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                buckets = {}
+                for bound, count in zip(BUCKETS + (float('inf'),), histogram.buckets):
+                    cumulative += count
+                    buckets["+Inf" if bound == float('inf') else f"{bound:g}"] = cumulative
+                result.setdefault(name, []).append({
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum_ms": round(histogram.sum * 1000, 3),
+                    "mean_ms": round(histogram.sum * 1000 / histogram.count, 3),
+                    "buckets": buckets,
+                })
+        return result
+
+    def to_prometheus(self) -> str:
+        """Return the values in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((series, (h.count, h.sum, list(h.buckets))) for series, h in self._histograms.items())
+
+        described = set()
+
+        def header(name: str, kind: str) -> None:
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {DESCRIPTIONS.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), (count, total, buckets) in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS + (float('inf'),), buckets):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float('inf') else f"{bound:g}"
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    """Format labels for the Prometheus text format."""
+    if not labels:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+class _PrometheusHandler(BaseHTTPRequestHandler):
+    """Serves /metrics in the Prometheus text format."""
+
+    def do_GET(self):
+        if self.path.split('?')[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.to_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("Metrics request from %s: " + format, self.client_address[0], *args)
+
+
+def start_prometheus_server(port: int, host: str = VNC_METRICS_HOST) -> ThreadingHTTPServer:
+    """Serve the metrics at http://host:port/metrics from a background thread.
+
+    Returns:
+        ThreadingHTTPServer: The server; shutdown() stops it
+    """
+    server = ThreadingHTTPServer((host, port), _PrometheusHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="vnc-metrics", daemon=True).start()
+    logger.info("Serving Prometheus metrics at http://%s:%s/metrics", host, server.server_port)
+    return server
+
+
+# Shared by all connections and tool calls of this process
+metrics = Metrics()
@@ -0,0 +1,204 @@
+import os
+import math
+import logging
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from PIL import Image
+
+logger = logging.getLogger('screen_geometry')
+
+# Resampling filters for scaling screenshots, from fastest to highest quality. "reduce"
+# averages whole blocks of pixels first (Image.reduce) and is the cheapest way to downscale.
+RESAMPLE_FILTERS = {
+    "reduce": Image.Resampling.BOX,
+    "nearest": Image.Resampling.NEAREST,
+    "box": Image.Resampling.BOX,
+    "bilinear": Image.Resampling.BILINEAR,
+    "bicubic": Image.Resampling.BICUBIC,
+    "lanczos": Image.Resampling.LANCZOS,
+}
+
+# How the screen is mapped onto the output size:
+#   fit     - scale to fit inside the output size, keeping the aspect ratio
+#   width   - scale to the output width, keeping the aspect ratio
+#   stretch - scale to exactly the output size (distorts non-16:9 screens)
+#   native  - no scaling
+OUTPUT_MODES = ("fit", "width", "stretch", "native")
+
+# Screenshot geometry used for every connection of this server. Clients rely on screenshots
+# of exactly the output size, so the aspect-preserving modes are opt-in.
+VNC_OUTPUT_SIZE = os.environ.get('VNC_OUTPUT_SIZE', '1366x768')
+VNC_OUTPUT_MODE = os.environ.get('VNC_OUTPUT_MODE', 'stretch')
+VNC_RESAMPLE = os.environ.get('VNC_RESAMPLE', 'lanczos')
+
+
+def _parse_size(value: str) -> Tuple[int, int]:
+    """Parse a "WIDTHxHEIGHT" size."""
+    try:
+        width, height = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise ValueError(f"Output size must look like 1366x768, got {value}")
+    if width <= 0 or height <= 0:
+        raise ValueError(f"Output size must be positive, got {value}")
+    return width, height
+
+
+class ScreenGeometry:
+    """Mapping between the remote screen and the screenshots sent to the client.
+
+    The output size and scale factors are computed once per screen size, and the
+    same mapping scales screenshots and maps coordinates back to the screen.
+    """
+
+    def __init__(self, screen_width: int, screen_height: int, output_size: str = VNC_OUTPUT_SIZE,
+                 mode: str = VNC_OUTPUT_MODE, resample: str = VNC_RESAMPLE):
+        """Compute the output geometry for a screen.
+
+        Args:
+            screen_width: Width of the remote screen in pixels
+            screen_height: Height of the remote screen in pixels
+            output_size: Output size as "WIDTHxHEIGHT" (default: VNC_OUTPUT_SIZE)
+            mode: One of OUTPUT_MODES (default: VNC_OUTPUT_MODE)
+            resample: One of RESAMPLE_FILTERS (default: VNC_RESAMPLE)
+
+        Raises:
+            ValueError: If a setting is invalid
+        """
+        if mode not in OUTPUT_MODES:
+            raise ValueError(f"Output mode must be one of {', '.join(OUTPUT_MODES)}, got {mode}")
+        if resample not in RESAMPLE_FILTERS:
+            raise ValueError(f"Resampling must be one of {', '.join(RESAMPLE_FILTERS)}, got {resample}")
+        self.screen_size = (screen_width, screen_height)
+        self.mode = mode
+        self.resample = resample
+
+        max_width, max_height = _parse_size(output_size)
+        if mode == "native" or screen_width <= 0 or screen_height <= 0:
+            width, height = screen_width, screen_height
+        elif mode == "stretch":
+            width, height = max_width, max_height
+        elif mode == "width":
+            width, height = max_width, round(screen_height * max_width / screen_width)
+        else:
+            scale = min(max_width / screen_width, max_height / screen_height)
+            width, height = round(screen_width * scale), round(screen_height * scale)
+            # 1366x768 is not exactly 16:9; don't shave a pixel off 16:9 screens for it
+            if abs(width - max_width) <= 1 and abs(height - max_height) <= 1:
+                width, height = max_width, max_height
+        self.output_size = (max(width, 1), max(height, 1))
+        # Output pixels per screen pixel
+        self.scale_x = self.output_size[0] / screen_width if screen_width else 1.0
+        self.scale_y = self.output_size[1] / screen_height if screen_height else 1.0
+
+    def scale_image(self, img: Image.Image) -> Image.Image:
+        """Scale a full-screen image to the output size."""
+        if img.size == self.output_size:
+            return img
+        if self.resample == "reduce":
+            # Integer block averaging first, then a box filter for the remainder
+            return img.resize(self.output_size, Image.Resampling.BOX, reducing_gap=1.0)
+        return img.resize(self.output_size, RESAMPLE_FILTERS[self.resample])
+
+    def scale_thumbnail(self, img: Image.Image, bounds: Tuple[Optional[int], Optional[int]]) -> Image.Image:
+        """Scale a full-screen image to fit in bounds, never larger than the output size.
+
+        Args:
+            img: The full-screen image
+            bounds: (width, height) to fit in, keeping the aspect ratio; None leaves a side unbounded
+
+        Returns:
+            Image.Image: The scaled image
+        """
+        scale = min([1.0] + [bound / size for bound, size in zip(bounds, self.output_size) if bound])
+        size = (max(1, round(self.output_size[0] * scale)), max(1, round(self.output_size[1] * scale)))
+        if img.size == size:
+            return img
+        if self.resample == "reduce":
+            return img.resize(size, Image.Resampling.BOX, reducing_gap=1.0)
+        return img.resize(size, RESAMPLE_FILTERS[self.resample])
+
+    def scale_region(self, img: Image.Image, region: Tuple[int, int, int, int]) -> Tuple[Tuple[int, int, int, int], Image.Image]:
+        """Cut a region out of a full-screen image and scale it like scale_image() would.
+
+        The region is widened to whole output pixels, so that it can be placed exactly
+        over an earlier screenshot.
+
+        Returns:
+            Tuple: The region in output coordinates and the scaled image of it
+        """
+        x, y, width, height = region
+        left, top = math.floor(x * self.scale_x), math.floor(y * self.scale_y)
+        right = min(math.ceil((x + width) * self.scale_x), self.output_size[0])
+        bottom = min(math.ceil((y + height) * self.scale_y), self.output_size[1])
+        box = (left / self.scale_x, top / self.scale_y, right / self.scale_x, bottom / self.scale_y)
+        resample = RESAMPLE_FILTERS[self.resample]
+        crop = img.resize((right - left, bottom - top), resample, box=box)
+        return (left, top, right - left, bottom - top), crop
+
+    def resolve_source(self, source_size: Optional[Tuple[Optional[int], Optional[int]]] = None) -> Tuple[int, int]:
+        """Fill in missing source dimensions with the output size."""
+        source_width, source_height = source_size or (None, None)
+        return (self.output_size[0] if source_width is None else source_width,
+                self.output_size[1] if source_height is None else source_height)
+
+    def source_scale(self, source_size: Optional[Tuple[Optional[int], Optional[int]]] = None) -> Tuple[float, float]:
+        """Return the screen pixels per source pixel for coordinates given in source_size.
+
+        Args:
+            source_size: (width, height) the coordinates refer to; missing values default to
+                         the output size
+        """
+        source_width, source_height = self.resolve_source(source_size)
+        if (source_width, source_height) == self.output_size:
+            return 1 / self.scale_x, 1 / self.scale_y
+        if source_width <= 0 or source_height <= 0:
+            raise ValueError("Source dimensions must be positive values")
+        return self.screen_size[0] / source_width, self.screen_size[1] / source_height
+
+    def to_screen(self, x: float, y: float, source_size: Optional[Tuple[Optional[int], Optional[int]]] = None) -> Tuple[int, int]:
+        """Map a point to screen pixels, clamped to the screen.
+
+        Args:
+            x: X coordinate in source coordinates
+            y: Y coordinate in source coordinates
+            source_size: (width, height) the coordinates refer to (default: the output size)
+        """
+        factor_x, factor_y = self.source_scale(source_size)
+        screen_width, screen_height = self.screen_size
+        return (max(0, min(int(x * factor_x), screen_width - 1)),
+                max(0, min(int(y * factor_y), screen_height - 1)))
+
+    def region_to_screen(self, region: Tuple[int, int, int, int],
+                         source_size: Optional[Tuple[Optional[int], Optional[int]]] = None) -> Optional[Tuple[int, int, int, int]]:
+        """Map a region to screen pixels, clipped to the screen.
+
+        Args:
+            region: (x, y, width, height) in source coordinates
+            source_size: (width, height) the coordinates refer to (default: the output size)
+
+        Returns:
+            Optional[Tuple[int, int, int, int]]: (x, y, width, height), or None if nothing of the
+                                                 region is on the screen
+        """
+        x, y, width, height = region
+        if width <= 0 or height <= 0:
+            return None
+        factor_x, factor_y = self.source_scale(source_size)
+        screen_width, screen_height = self.screen_size
+        left = max(0, math.floor(x * factor_x))
+        top = max(0, math.floor(y * factor_y))
+        right = min(screen_width, math.ceil((x + width) * factor_x))
+        bottom = min(screen_height, math.ceil((y + height) * factor_y))
+        if right <= left or bottom <= top:
+            return None
+        return left, top, right - left, bottom - top
+
+
+@lru_cache(maxsize=16)
+def screen_geometry(screen_width: int, screen_height: int) -> ScreenGeometry:
+    """Return the cached geometry for a screen size, using the server's output settings."""
+    geometry = ScreenGeometry(screen_width, screen_height)
+    logger.debug(f"Screen {screen_width}x{screen_height} maps to {geometry.output_size[0]}x{geometry.output_size[1]} "
+                 f"({geometry.mode}, {geometry.resample})")
+    return geometry
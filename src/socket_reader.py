@@ -0,0 +1,82 @@
+import socket
+
+
+class SocketReader:
+    """Buffered reader for the server-to-client side of an RFB connection.
+
+    Small reads are served from one preallocated buffer, which is refilled with
+    ``recv_into`` in chunks of up to ``buffer_size`` bytes, so a burst of short
+    messages costs a single system call. Large payloads bypass the buffer and are
+    received straight into the caller's memory.
+    """
+
+    def __init__(self, sock: socket.socket, buffer_size: int = 262144):
+        """Create a reader for a connected socket.
+
+        Args:
+            sock: Connected socket to read from
+            buffer_size: Size of the receive buffer in bytes
+        """
+        self.sock = sock
+        self.buffer_size = buffer_size
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0  # First unread byte
+        self._end = 0  # End of the received data
+
+    @property
+    def buffered(self) -> int:
+        """Number of bytes received from the socket but not read yet."""
+        return self._end - self._start
+
+    def read(self, size: int) -> memoryview:
+        """Read exactly size bytes.
+
+        The returned view points into the reader's buffer and is only valid until
+        the next read; copy it with ``bytes()`` to keep it longer.
+
+        Raises:
+            ConnectionError: If the server closes the connection first
+            OSError: If the socket fails or times out
+        """
+        if size > self.buffer_size:
+            data = memoryview(bytearray(size))
+            self.readinto(data)
+            return data
+        if self.buffered < size:
+            self._fill(size)
+        view = self._view[self._start:self._start + size]
+        self._start += size
+        return view
+
+    def readinto(self, view: memoryview) -> None:
+        """Fill a writable buffer, receiving directly into it once the buffered bytes are used up.
+
+        Raises:
+            ConnectionError: If the server closes the connection first
+            OSError: If the socket fails or times out
+        """
+        count = min(self.buffered, len(view))
+        view[:count] = self._view[self._start:self._start + count]
+        self._start += count
+        while count < len(view):
+            received = self.sock.recv_into(view[count:])
+            if not received:
+                raise ConnectionError("Connection closed by the server")
+            count += received
+
+    def _fill(self, size: int) -> None:
+        """Receive until at least size bytes are buffered."""
+        if self._start + size > self.buffer_size:
+            # Move the unread tail to the front to make room
+            pending = bytes(self._view[self._start:self._end])
+            self._view[:len(pending)] = pending
+            self._start, self._end = 0, len(pending)
+        elif self._start == self._end:
+            self._start = self._end = 0
+        while self.buffered < size:
+            received = self.sock.recv_into(self._view[self._end:])
+            if not received:
+                raise ConnectionError("Connection closed by the server")
+            self._end += received
+
@@ -0,0 +1,73 @@
+import os
+import logging
+from typing import Iterator, Optional
+
+logger = logging.getLogger('typing_pacer')
+
+# How send_text paces keystrokes:
+#   adaptive - send bursts of keystrokes and wait for the server to acknowledge each one,
+#              growing the bursts while acknowledgements are fast and shrinking them when
+#              the server falls behind
+#   fixed    - one character at a time with VNC_TYPING_DELAY_MS between characters
+TYPING_MODES = ("adaptive", "fixed")
+
+VNC_TYPING_MODE = os.environ.get('VNC_TYPING_MODE', 'adaptive')
+VNC_TYPING_DELAY_MS = float(os.environ.get('VNC_TYPING_DELAY_MS', '10'))
+VNC_TYPING_MAX_BURST = int(os.environ.get('VNC_TYPING_MAX_BURST', '64'))
+# Text at least this long is pasted through the clipboard instead of typed. Pasting replaces
+# the clipboard contents of the Mac, so it is off (0) unless configured.
+VNC_PASTE_THRESHOLD = int(os.environ.get('VNC_PASTE_THRESHOLD', '0'))
+
+# Acknowledgement times (seconds) below which bursts grow and above which they shrink
+ACK_FAST = 0.05
+ACK_SLOW = 0.25
+# Longest wait for an acknowledgement before typing continues with smaller bursts
+ACK_TIMEOUT = 2.0
+
+
+class TypingPacer:
+    """Splits text into bursts of keystrokes and adapts the burst size to the server."""
+
+    def __init__(self, mode: Optional[str] = None, delay_ms: float = VNC_TYPING_DELAY_MS,
+                 max_burst: int = VNC_TYPING_MAX_BURST):
+        """Create a pacer for one piece of text.
+
+        Args:
+            mode: One of TYPING_MODES (default: VNC_TYPING_MODE)
+            delay_ms: Pause after each character in "fixed" mode
+            max_burst: Largest number of characters per burst in "adaptive" mode
+
+        Raises:
+            ValueError: If the mode is unknown
+        """
+        self.mode = mode or VNC_TYPING_MODE
+        if self.mode not in TYPING_MODES:
+            raise ValueError(f"Typing mode must be one of {', '.join(TYPING_MODES)}, got {self.mode}")
+        self.delay = max(0.0, delay_ms) / 1000.0
+        self.max_burst = max(1, max_burst)
+        self.burst = 1 if self.mode == "fixed" else min(8, self.max_burst)
+
+    @property
+    def adaptive(self) -> bool:
+        """Whether each burst should be acknowledged by the server."""
+        return self.mode == "adaptive"
+
+    def bursts(self, text: str) -> Iterator[str]:
+        """Yield consecutive pieces of text, sized by the current burst size."""
+        position = 0
+        while position < len(text):
+            burst = text[position:position + self.burst]
+            position += len(burst)
+            yield burst
+
+    def acknowledged(self, elapsed: Optional[float]) -> None:
+        """Adapt the burst size to how long the server took to acknowledge the last burst.
+
+        Args:
+            elapsed: Acknowledgement time in seconds, or None if it timed out
+        """
+        if elapsed is not None and elapsed < ACK_FAST:
+            self.burst = min(self.burst * 2, self.max_burst)
+        elif elapsed is None or elapsed > ACK_SLOW:
+            self.burst = max(self.burst // 2, 1)
+            logger.debug("Slow typing acknowledgement (%s), burst size now %d", elapsed, self.burst)
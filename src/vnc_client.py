@@ -1,23 +1,44 @@
 import os
 import logging
 import socket
+import select
 import time
+import threading
 import io
+import zlib
+import struct
+import asyncio
+from collections import deque
+import numpy as np
 from PIL import Image
 import pyDes
-from typing import Optional, Tuple, List, Dict, Any
+from typing import Optional, Tuple, List, Dict, Any, Callable
+
+from dh_keys import dh_key_pool
+from framebuffer import (Framebuffer, Rect, channel_mask, merge_regions, packed_pixels, pixel_values,
+                         rgb_to_pixels)
+from socket_reader import SocketReader
+from event_writer import COMMAND_KEYSYM, EventWriter, key_event, pointer_event
+from clipboard import CUT_TEXT, EXTENDED_CLIPBOARD, Clipboard
+from cursor import CURSOR_MODES, VNC_CURSOR, Cursor, cursor_data_size
+from typing_pacer import ACK_TIMEOUT, VNC_PASTE_THRESHOLD, TypingPacer
+from image_encoder import encode_image
+from log_config import SampledLogger
+from metrics import metrics
+from screen_geometry import RESAMPLE_FILTERS, ScreenGeometry, screen_geometry
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger('vnc_client')
-logger.setLevel(logging.DEBUG)
+# Per-input-event messages are sampled (see VNC_LOG_SAMPLE)
+event_logger = SampledLogger(logger)
 
 
 async def capture_vnc_screen(host: str, port: int, password: str, username: Optional[str] = None,
-                             encryption: str = "prefer_on") -> Tuple[bool, Optional[bytes], Optional[str], Optional[Tuple[int, int]]]:
+                             encryption: str = "prefer_on", pool: Optional[Any] = None,
+                             frame_info: Optional[Dict[str, Any]] = None, image_format: Optional[str] = None,
+                             quality: Optional[int] = None, compression: Optional[Any] = None,
+                             since_frame: Optional[str] = None, show_cursor: bool = False,
+                             thumbnail_size: Optional[Tuple[Optional[int], Optional[int]]] = None
+                             ) -> Tuple[bool, Optional[bytes], Optional[str], Optional[Tuple[int, int]]]:
     """Capture a screenshot from a remote MacOs machine.
 
     Args:
@@ -26,22 +47,270 @@ async def capture_vnc_screen(host: str, port: int, password: str, username: Opti
         password: remote MacOs machine password
         username: remote MacOs machine username (optional)
         encryption: Encryption preference (default: "prefer_on")
+        pool: Session pool (vnc_session.VNCSessionPool) to borrow the connection from (optional).
+              Without a pool a new connection is opened and closed for this capture.
+        frame_info: Dictionary that receives the "sequence" number, "age_ms" and "frame" identifier
+                    of the returned frame, and "regions" for delta screenshots (optional)
+        image_format: "png", "jpeg" or "webp" (default: VNC_SCREENSHOT_FORMAT)
+        quality: JPEG/WebP quality 1-100 (default: VNC_SCREENSHOT_QUALITY)
+        compression: Encoder effort preset or PNG zlib level (default: VNC_SCREENSHOT_COMPRESSION)
+        since_frame: Frame identifier from an earlier capture. When only part of the screen changed
+                     since then, frame_info["regions"] receives a list of changed regions, each a
+                     dict with the scaled "x", "y", "width", "height" and encoded "data", and
+                     screen_data is None. An empty list means nothing changed. (optional, needs
+                     frame_info)
+        show_cursor: Draw the mouse pointer into the screenshot (see VNC_CURSOR). The pointer
+                     can move without the screen changing, so this always returns a full
+                     screenshot.
+        thumbnail_size: (width, height) to shrink the screenshot to fit in, keeping its aspect
+                        ratio; a None value leaves that side unbounded (optional, not applied to
+                        delta screenshots)
 
     Returns:
         Tuple containing:
         - success: True if the operation was successful
-        - screen_data: PNG image data if successful, None otherwise
+        - screen_data: Image data in the requested format if successful, None otherwise (or for a
+          delta screenshot)
         - error_message: Error message if unsuccessful, None otherwise
         - dimensions: Tuple of (width, height) if successful, None otherwise
     """
-    logger.debug(f"Connecting to remote MacOs machine at {host}:{port} with encryption: {encryption}")
+    # The blocking VNC client runs in a worker thread so the event loop stays responsive
+    return await asyncio.to_thread(_capture_vnc_screen_blocking, host, port, password, username, encryption, pool,
+                                   frame_info, image_format, quality, compression, since_frame, show_cursor,
+                                   thumbnail_size)
+
+
+def _capture_vnc_screen_blocking(host: str, port: int, password: str, username: Optional[str],
+                                 encryption: str, pool: Optional[Any], frame_info: Optional[Dict[str, Any]],
+                                 image_format: Optional[str], quality: Optional[int], compression: Optional[Any],
+                                 since_frame: Optional[str], show_cursor: bool,
+                                 thumbnail_size: Optional[Tuple[Optional[int], Optional[int]]] = None) -> Tuple[bool, Optional[bytes], Optional[str], Optional[Tuple[int, int]]]:
+    """Blocking implementation of capture_vnc_screen()."""
+    def capture(vnc: "VNCClient") -> Tuple[bool, Optional[bytes], Optional[str], Optional[Tuple[int, int]]]:
+        # Capture the framebuffer as an image; it is encoded only once, after scaling
+        img = vnc.capture_image(show_cursor=show_cursor)
+
+        if img is None:
+            return False, None, f"Failed to capture screenshot from remote MacOs machine at {host}:{port}", None
+
+        regions = None
+        if frame_info is not None:
+            age = vnc.frame_age()
+            frame_info["sequence"] = vnc.frame_sequence
+            frame_info["age_ms"] = int(age * 1000) if age is not None else None
+            frame_info["frame"] = vnc.frame_id()
+            if since_frame and not show_cursor:
+                regions = vnc.changes_since(since_frame)
+
+        # Save original dimensions for reference
+        original_dims = (vnc.width, vnc.height)
+
+        # Scale the image with the cached output geometry of this screen
+        geometry = screen_geometry(vnc.width, vnc.height)
+        dimensions = original_dims
+
+        if regions is not None:
+            # Delta screenshot: only the changed regions, scaled like the full screenshot would be
+            frame_info["regions"] = [_scaled_region(img, region, geometry, image_format, quality, compression)
+                                     for region in regions]
+            logger.info("Returning %d changed regions since frame %s", len(regions), since_frame)
+            return True, None, None, geometry.output_size
+
+        try:
+            # Resize the image to the output resolution
+            with metrics.timer("vnc_capture_stage_seconds", stage="resize"):
+                if thumbnail_size:
+                    img = geometry.scale_thumbnail(img, thumbnail_size)
+                else:
+                    img = geometry.scale_image(img)
+            dimensions = img.size
+            logger.debug("Scaled image from %dx%d to %dx%d", *original_dims, *dimensions)
+        except Exception as e:
+            # Return the original image if scaling fails
+            logger.warning(f"Failed to scale image: {str(e)}. Returning original image.")
+
+        with metrics.timer("vnc_capture_stage_seconds", stage="encode"):
+            screen_data = encode_image(img, image_format, quality, compression)
+        return True, screen_data, None, dimensions
+
+    return _with_vnc_client(host, port, password, username, encryption, pool, capture)
+
+
+async def capture_vnc_screen_region(host: str, port: int, password: str, region: Tuple[int, int, int, int],
+                                    source_size: Optional[Tuple[Optional[int], Optional[int]]] = None,
+                                    username: Optional[str] = None,
+                                    encryption: str = "prefer_on", pool: Optional[Any] = None,
+                                    output_size: Optional[Tuple[Optional[int], Optional[int]]] = None,
+                                    image_format: Optional[str] = None, quality: Optional[int] = None,
+                                    compression: Optional[Any] = None,
+                                    frame_info: Optional[Dict[str, Any]] = None,
+                                    show_cursor: bool = False) -> Tuple[bool, Optional[bytes], Optional[str], Optional[Tuple[int, int]]]:
+    """Capture one region of the remote screen.
+
+    Only the region is requested from the server and converted, so small regions are much
+    cheaper than a full screenshot, and they keep their native resolution.
+
+    Args:
+        host: remote MacOs machine hostname or IP address
+        port: remote MacOs machine port
+        password: remote MacOs machine password
+        region: (x, y, width, height) in source coordinates
+        source_size: (width, height) the region coordinates refer to; missing values default to
+                     the screenshot size (see ScreenGeometry)
+        username: remote MacOs machine username (optional)
+        encryption: Encryption preference (default: "prefer_on")
+        pool: Session pool to borrow the connection from (optional)
+        output_size: (width, height) to scale the region to; if one is None the aspect ratio is
+                     kept (default: native resolution)
+        image_format: "png", "jpeg" or "webp" (default: VNC_SCREENSHOT_FORMAT)
+        quality: JPEG/WebP quality 1-100 (default: VNC_SCREENSHOT_QUALITY)
+        compression: Encoder effort preset or PNG zlib level (default: VNC_SCREENSHOT_COMPRESSION)
+        frame_info: Dictionary that receives the captured "region" in screen pixels (optional)
+        show_cursor: Draw the mouse pointer into the image (see VNC_CURSOR)
+
+    Returns:
+        Tuple containing:
+        - success: True if the operation was successful
+        - screen_data: Image data in the requested format if successful, None otherwise
+        - error_message: Error message if unsuccessful, None otherwise
+        - dimensions: Tuple of (width, height) of the returned image if successful, None otherwise
+
+    Raises:
+        ValueError: If the region is outside the screen
+    """
+    return await asyncio.to_thread(_capture_vnc_screen_region_blocking, host, port, password, region, source_size,
+                                   username, encryption, pool, output_size, image_format, quality, compression,
+                                   frame_info, show_cursor)
+
+
+def _capture_vnc_screen_region_blocking(host: str, port: int, password: str, region: Tuple[int, int, int, int],
+                                        source_size: Optional[Tuple[Optional[int], Optional[int]]],
+                                        username: Optional[str], encryption: str,
+                                        pool: Optional[Any], output_size: Optional[Tuple[Optional[int], Optional[int]]],
+                                        image_format: Optional[str], quality: Optional[int], compression: Optional[Any],
+                                        frame_info: Optional[Dict[str, Any]],
+                                        show_cursor: bool) -> Tuple[bool, Optional[bytes], Optional[str], Optional[Tuple[int, int]]]:
+    """Blocking implementation of capture_vnc_screen_region()."""
+    def capture(vnc: "VNCClient") -> Tuple[bool, Optional[bytes], Optional[str], Optional[Tuple[int, int]]]:
+        geometry = screen_geometry(vnc.width, vnc.height)
+        screen_region = geometry.region_to_screen(region, source_size)
+        if screen_region is None:
+            source_width, source_height = geometry.resolve_source(source_size)
+            raise ValueError(f"Region {region} is outside the {source_width}x{source_height} screen")
+
+        img = vnc.capture_image(region=screen_region, show_cursor=show_cursor)
+        if img is None:
+            return False, None, f"Failed to capture screen region from remote MacOs machine at {host}:{port}", None
+        if frame_info is not None:
+            frame_info["region"] = screen_region
+
+        width, height = output_size or (None, None)
+        if width or height:
+            # Keep the aspect ratio when only one side is given
+            width = width or max(1, round(img.width * height / img.height))
+            height = height or max(1, round(img.height * width / img.width))
+            with metrics.timer("vnc_capture_stage_seconds", stage="resize"):
+                img = img.resize((width, height), RESAMPLE_FILTERS[geometry.resample])
+        logger.debug("Captured region %s as %dx%d", screen_region, img.width, img.height)
+        with metrics.timer("vnc_capture_stage_seconds", stage="encode"):
+            screen_data = encode_image(img, image_format, quality, compression)
+        return True, screen_data, None, img.size
+
+    return _with_vnc_client(host, port, password, username, encryption, pool, capture)
+
+
+async def wait_for_vnc_screen(host: str, port: int, password: str, username: Optional[str] = None,
+                              encryption: str = "prefer_on", pool: Optional[Any] = None, until: str = "change",
+                              region: Optional[Tuple[int, int, int, int]] = None,
+                              source_size: Optional[Tuple[Optional[int], Optional[int]]] = None, stable_ms: int = 500,
+                              timeout: float = 10.0) -> Tuple[bool, Optional[Dict[str, Any]], Optional[str], None]:
+    """Wait on the remote screen until it changes or becomes stable (see VNCClient.wait_for_screen()).
 
-    # Initialize VNC client
-    vnc = VNCClient(host=host, port=port, password=password, username=username, encryption=encryption)
+    Args:
+        host: remote MacOs machine hostname or IP address
+        port: remote MacOs machine port
+        password: remote MacOs machine password
+        username: remote MacOs machine username (optional)
+        encryption: Encryption preference (default: "prefer_on")
+        pool: Session pool to borrow the connection from (optional). A frame receiver started
+              for the wait is stopped again; only a pool with VNC_FRAME_RECEIVER keeps one running.
+        until: "change" or "stable"
+        region: (x, y, width, height) to watch, in source coordinates (default: the whole screen)
+        source_size: (width, height) the region coordinates refer to; missing values default to
+                     the screenshot size (see ScreenGeometry)
+        stable_ms: Quiet period in milliseconds for "stable"
+        timeout: Maximum seconds to wait
+
+    Returns:
+        Tuple containing:
+        - success: True if the wait completed, including on timeout
+        - result: The wait result from VNCClient.wait_for_screen() if successful, None otherwise
+        - error_message: Error message if unsuccessful, None otherwise
+        - None
+
+    Raises:
+        ValueError: If the region is outside the screen
+    """
+    return await asyncio.to_thread(_wait_for_vnc_screen_blocking, host, port, password, username, encryption, pool,
+                                   until, region, source_size, stable_ms, timeout)
+
+
+def _wait_for_vnc_screen_blocking(host: str, port: int, password: str, username: Optional[str], encryption: str,
+                                  pool: Optional[Any], until: str, region: Optional[Tuple[int, int, int, int]],
+                                  source_size: Optional[Tuple[Optional[int], Optional[int]]], stable_ms: int,
+                                  timeout: float) -> Tuple[bool, Optional[Dict[str, Any]], Optional[str], None]:
+    """Blocking implementation of wait_for_vnc_screen()."""
+    def wait(vnc: "VNCClient") -> Tuple[bool, Optional[Dict[str, Any]], Optional[str], None]:
+        screen_region = None
+        if region is not None:
+            geometry = screen_geometry(vnc.width, vnc.height)
+            screen_region = geometry.region_to_screen(region, source_size)
+            if screen_region is None:
+                source_width, source_height = geometry.resolve_source(source_size)
+                raise ValueError(f"Region {region} is outside the {source_width}x{source_height} screen")
+
+        result = vnc.wait_for_screen(until, screen_region, stable_ms, timeout)
+        if result is None:
+            return False, None, f"Lost the screen update stream from remote MacOs machine at {host}:{port}", None
+        logger.info("Waited for screen %s at %s:%s: %s after %dms", until, host, port, result['status'],
+                    result['elapsed_ms'])
+        return True, result, None, None
+
+    return _with_vnc_client(host, port, password, username, encryption, pool, wait)
+
+
+def _with_vnc_client(host: str, port: int, password: str, username: Optional[str], encryption: str,
+                     pool: Optional[Any], capture: Callable[["VNCClient"], Tuple]) -> Tuple:
+    """Run a capture on a connected client, borrowed from the pool or opened for this call.
+
+    Args:
+        capture: Function that uses the connected client and returns a result tuple whose first
+                 item is the success flag and whose third is the error message. A failed result
+                 discards a pooled connection, as its stream may be out of sync. Arguments that
+                 can only be checked once connected (e.g. against the screen size) are rejected
+                 by raising ValueError, which keeps the connection.
+
+    Returns:
+        Tuple: The capture result, or (False, None, error_message, None) if the connection failed
+
+    Raises:
+        ValueError: If capture rejected its arguments
+    """
+    logger.debug("Connecting to remote MacOs machine at %s:%s with encryption: %s", host, port, encryption)
+
+    if pool is not None:
+        # Borrow an already authenticated connection from the pool
+        vnc, error_message = pool.acquire(host, port, password, username, encryption)
+        success = vnc is not None
+    else:
+        # Initialize VNC client
+        vnc = VNCClient(host=host, port=port, password=password, username=username, encryption=encryption)
+    healthy = False
 
     try:
-        # Connect to remote MacOs machine
-        success, error_message = vnc.connect()
+        if pool is None:
+            # Connect to remote MacOs machine
+            success, error_message = vnc.connect()
         if not success:
             detailed_error = f"Failed to connect to remote MacOs machine at {host}:{port}. {error_message}\n"
             detailed_error += "This VNC client only supports Apple Authentication (protocol 30). "
@@ -49,45 +318,44 @@ async def capture_vnc_screen(host: str, port: int, password: str, username: Opti
             detailed_error += "For macOS, enable Screen Sharing in System Preferences > Sharing."
             return False, None, detailed_error, None
 
-        # Capture screen
-        screen_data = vnc.capture_screen()
-
-        if not screen_data:
-            return False, None, f"Failed to capture screenshot from remote MacOs machine at {host}:{port}", None
-
-        # Save original dimensions for reference
-        original_dims = (vnc.width, vnc.height)
-
-        # Scale the image to FWXGA resolution (1366x768)
-        target_width, target_height = 1366, 768
-
         try:
-            # Convert bytes to PIL Image
-            image_data = io.BytesIO(screen_data)
-            img = Image.open(image_data)
+            result = capture(vnc)
+        except ValueError:
+            # A bad argument, not a broken stream
+            healthy = True
+            raise
+        healthy = result[0]
+        return result
 
-            # Resize the image to the target resolution
-            scaled_img = img.resize((target_width, target_height), Image.Resampling.LANCZOS)
+    finally:
+        if pool is None:
+            # Close VNC connection
+            vnc.close()
+        elif vnc is not None:
+            # Keep the connection for the next call unless the stream may be out of sync
+            pool.release(vnc, discard=not healthy)
 
-            # Convert back to bytes
-            output_buffer = io.BytesIO()
-            scaled_img.save(output_buffer, format='PNG')
-            output_buffer.seek(0)
-            scaled_screen_data = output_buffer.getvalue()
 
-            logger.info(f"Scaled image from {original_dims[0]}x{original_dims[1]} to {target_width}x{target_height}")
+def _scaled_region(img: Image.Image, region: Tuple[int, int, int, int], geometry: ScreenGeometry,
+                   image_format: Optional[str], quality: Optional[int], compression: Optional[Any]) -> Dict[str, Any]:
+    """Cut a region out of a screen image, scale it and encode it.
 
-            # Return success with scaled screen data and target dimensions
-            return True, scaled_screen_data, None, (target_width, target_height)
+    The region is widened to whole pixels of the scaled screen, so that it can be placed
+    exactly over an earlier full screenshot.
+    """
+    (x, y, width, height), crop = geometry.scale_region(img, region)
+    return {"x": x, "y": y, "width": width, "height": height,
+            "data": encode_image(crop, image_format, quality, compression)}
 
-        except Exception as e:
-            logger.warning(f"Failed to scale image: {str(e)}. Returning original image.")
-            # Return the original image if scaling fails
-            return True, screen_data, None, original_dims
 
-    finally:
-        # Close VNC connection
-        vnc.close()
+def _overlaps(rect: Tuple[int, int, int, int], region: Optional[Tuple[int, int, int, int]]) -> bool:
+    """Return True if a rectangle overlaps a region (None meaning the whole screen)."""
+    if region is None:
+        return rect[2] > 0 and rect[3] > 0
+    x, y, width, height = rect
+    region_x, region_y, region_width, region_height = region
+    return (x < region_x + region_width and region_x < x + width
+            and y < region_y + region_height and region_y < y + height)
 
 
 def encrypt_MACOS_PASSWORD(password: str, challenge: bytes) -> bytes:
@@ -125,6 +393,123 @@ def encrypt_MACOS_PASSWORD(password: str, challenge: bytes) -> bytes:
 
     return bytes(result)
 
+def apple_auth_response(generator: int, key_length: int, prime_data: bytes, server_public_key: bytes,
+                        username: Optional[str], password: str) -> bytes:
+    """Build the client response for Apple Authentication (security type 30).
+
+    Args:
+        generator: Diffie-Hellman generator sent by the server
+        key_length: Length of the prime and public keys in bytes
+        prime_data: Diffie-Hellman prime modulus sent by the server
+        server_public_key: Server's Diffie-Hellman public key
+        username: remote MacOs machine username (optional)
+        password: remote MacOs machine password
+
+    Returns:
+        bytes: AES-encrypted credentials (128 bytes) followed by our public key
+
+    Raises:
+        ImportError: If the cryptography package is not installed
+        ValueError: If the server's public key is out of range
+    """
+    # Import required libraries for the AES encryption of the credentials
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+    # Convert parameters to integers for DH
+    p_int = int.from_bytes(prime_data, byteorder='big')
+    g_int = generator
+    server_public_int = int.from_bytes(server_public_key, byteorder='big')
+    if not 1 < server_public_int < p_int - 1:
+        raise ValueError("Invalid Diffie-Hellman public key from server")
+
+    # Take a pre-generated ephemeral key pair (the group's parameters are checked once per process)
+    private_int, public_int = dh_key_pool.take(p_int, g_int)
+    public_key_bytes = public_int.to_bytes(key_length, byteorder='big')
+
+    # Generate shared key. Computed directly: loading the server's key as a cryptography
+    # object would check the group's prime again on every connection
+    shared_key = pow(server_public_int, private_int, p_int).to_bytes(key_length, byteorder='big')
+
+    # Generate MD5 hash of shared key for AES
+    md5 = hashes.Hash(hashes.MD5())
+    md5.update(shared_key)
+    aes_key = md5.finalize()
+
+    # Create credentials array (128 bytes) filled with random data
+    creds = bytearray(os.urandom(128))
+
+    # Add username and password to credentials array
+    username_bytes = username.encode('utf-8') if username else b''
+    password_bytes = password.encode('utf-8')
+
+    # Username in first 64 bytes
+    username_len = min(len(username_bytes), 63)  # Leave room for null byte
+    creds[0:username_len] = username_bytes[0:username_len]
+    creds[username_len] = 0  # Null terminator
+
+    # Password in second 64 bytes
+    password_len = min(len(password_bytes), 63)  # Leave room for null byte
+    creds[64:64+password_len] = password_bytes[0:password_len]
+    creds[64+password_len] = 0  # Null terminator
+
+    # Encrypt credentials with AES-128-ECB
+    cipher = Cipher(algorithms.AES(aes_key), modes.ECB())
+    encryptor = cipher.encryptor()
+    encrypted_creds = encryptor.update(creds) + encryptor.finalize()
+
+    return encrypted_creds + public_key_bytes
+
+
+def _level_setting(value: Optional[int], default: str, name: str) -> Optional[int]:
+    """Resolve a 0-9 quality or compression level, falling back to the environment default."""
+    if value is None:
+        if not default.strip():
+            return None
+        value = int(default)
+    if not 0 <= value <= 9:
+        raise ValueError(f"{name} must be between 0 and 9, got {value}")
+    return value
+
+
+def _undo_gradient(diffs: np.ndarray, channel_max: np.ndarray) -> np.ndarray:
+    """Undo the Tight gradient filter on the colour channels of a rectangle.
+
+    Each pixel is predicted from its left, upper and upper-left neighbours, so the
+    pixels of one anti-diagonal (x + y constant) only depend on the two diagonals
+    before it. The image is sheared so that every diagonal is a contiguous row and
+    decoded one diagonal at a time, width + height steps instead of one per value.
+
+    Args:
+        diffs: Array of shape (height, width, 3) with the filtered channel values
+        channel_max: Maximum value of each channel
+
+    Returns:
+        np.ndarray: int32 array of shape (height, width, 3) with the channel values
+    """
+    height, width = diffs.shape[:2]
+    channel_max = np.asarray(channel_max, dtype=np.int32)
+    ys, xs = np.indices((height, width))
+    diagonals = ys + xs
+    skewed = np.zeros((width + height - 1, height, 3), dtype=np.int32)
+    skewed[diagonals, ys] = diffs
+
+    # Decoded pixel (y, x) is at [x + y + 2, y + 1]; the zeros around it stand in for
+    # the pixels above and left of the image
+    out = np.zeros((width + height + 1, height + 1, 3), dtype=np.int32)
+    for diagonal in range(width + height - 1):
+        first, end = max(0, diagonal - width + 1), min(diagonal, height - 1) + 1
+        above = out[diagonal + 1, first:end]
+        left = out[diagonal + 1, first + 1:end + 1]
+        above_left = out[diagonal, first:end]
+        prediction = above + left - above_left
+        np.clip(prediction, 0, channel_max, out=prediction)
+        prediction += skewed[diagonal, first:end]
+        prediction &= channel_max
+        out[diagonal + 2, first + 1:end + 1] = prediction
+    return out[diagonals + 2, ys + 1]
+
+
 class PixelFormat:
     """VNC pixel format specification."""
 
@@ -164,12 +549,94 @@ class Encoding:
     ZRLE = 16
     CURSOR = -239
     DESKTOP_SIZE = -223
+    EXTENDED_CLIPBOARD = EXTENDED_CLIPBOARD
+    # Pseudo-encodings selecting a level 0-9, sent as base + level
+    QUALITY_LEVEL_0 = -32
+    COMPRESS_LEVEL_0 = -256
+
+class ServerMessage:
+    """Server-to-client message types."""
+    FRAMEBUFFER_UPDATE = 0
+    SET_COLOUR_MAP_ENTRIES = 1
+    BELL = 2
+    SERVER_CUT_TEXT = 3
+
+# Encodings we can decode, in order of preference
+SUPPORTED_ENCODINGS = [Encoding.TIGHT, Encoding.ZRLE, Encoding.HEXTILE, Encoding.RRE, Encoding.RAW, Encoding.COPY_RECT,
+                       Encoding.DESKTOP_SIZE, Encoding.CURSOR, Encoding.EXTENDED_CLIPBOARD]
+
+# Pixel formats that can be requested with VNC_COLOR_DEPTH. Each is the 16-byte
+# PIXEL_FORMAT: bits-per-pixel, depth, big-endian, true-colour, red/green/blue max
+# (2 bytes each), red/green/blue shift and 3 bytes of padding.
+PIXEL_FORMATS = {
+    # 32-bit 0x00RRGGBB
+    "24": bytes([32, 24, 1, 1, 0, 255, 0, 255, 0, 255, 16, 8, 0, 0, 0, 0]),
+    # 16-bit RGB565
+    "16": bytes([16, 16, 1, 1, 0, 31, 0, 63, 0, 31, 11, 5, 0, 0, 0, 0]),
+    # 8-bit BGR233
+    "8": bytes([8, 8, 0, 1, 0, 7, 0, 7, 0, 3, 0, 3, 6, 0, 0, 0]),
+}
+
+# Colour depth requested from the server: one of PIXEL_FORMATS, or "server" to keep
+# the server's native pixel format (which may use a colour map)
+VNC_COLOR_DEPTH = os.environ.get('VNC_COLOR_DEPTH', '24')
+
+# Tight JPEG quality (0-9) and zlib compression level (0-9) requested from the server.
+# Lower quality trades image fidelity for bandwidth; leave empty to use the server default.
+VNC_QUALITY_LEVEL = os.environ.get('VNC_QUALITY_LEVEL', '8')
+VNC_COMPRESS_LEVEL = os.environ.get('VNC_COMPRESS_LEVEL', '')
+
+# Bytes requested from the socket per receive call. Larger payloads are received
+# straight into their destination, so this mainly bounds read-ahead of small messages.
+VNC_RECV_BUFFER_SIZE = int(os.environ.get('VNC_RECV_BUFFER_SIZE', '262144'))
+
+# Number of recent frames whose changed rectangles are remembered for delta screenshots
+FRAME_HISTORY_SIZE = 64
+# Changes covering more than this share of the screen are sent as a full screenshot
+DELTA_MAX_AREA = 0.5
+# At most this many changed regions are returned before falling back to their bounding box
+DELTA_MAX_REGIONS = 8
+# Seconds the idle frame receiver waits for data before checking whether it should stop
+RECEIVER_POLL_INTERVAL = 0.1
+# Seconds a stopped frame receiver's replies still in flight are waited for
+RECEIVER_DRAIN_TIMEOUT = 0.1
+
+# Payloads that are skipped unread are received in pieces of this size
+SKIP_CHUNK_SIZE = 65536
+
+# Type 3, incremental flag, x, y, width, height
+FRAMEBUFFER_UPDATE_REQUEST = struct.Struct('>BBHHHH')
+
+# ZRLE rectangles are split into tiles of this size
+ZRLE_TILE_SIZE = 64
+
+# Hextile tiles and tile subencoding flags
+HEXTILE_TILE_SIZE = 16
+HEXTILE_RAW = 1
+HEXTILE_BACKGROUND_SPECIFIED = 2
+HEXTILE_FOREGROUND_SPECIFIED = 4
+HEXTILE_ANY_SUBRECTS = 8
+HEXTILE_SUBRECTS_COLOURED = 16
+
+# Tight compression types (high nibble of the compression control byte) and filters
+TIGHT_FILL = 0x8
+TIGHT_JPEG = 0x9
+TIGHT_FILTER_COPY = 0
+TIGHT_FILTER_PALETTE = 1
+TIGHT_FILTER_GRADIENT = 2
+# Tight data shorter than this is sent without zlib compression
+TIGHT_MIN_TO_COMPRESS = 12
+
 
 class VNCClient:
     """VNC client implementation to connect to remote MacOs machines and capture screenshots."""
 
+    # Encodings advertised to the server, in order of preference
+    supported_encodings = SUPPORTED_ENCODINGS
+
     def __init__(self, host: str, port: int = 5900, password: Optional[str] = None, username: Optional[str] = None,
-                 encryption: str = "prefer_on"):
+                 encryption: str = "prefer_on", quality_level: Optional[int] = None,
+                 compress_level: Optional[int] = None, color_depth: Optional[str] = None):
         """Initialize VNC client with connection parameters.
 
         Args:
@@ -178,24 +645,566 @@ class VNCClient:
             password: remote MacOs machine password (optional)
             username: remote MacOs machine username (optional, only used with certain authentication methods)
             encryption: Encryption preference, one of "prefer_on", "prefer_off", "server" (default: "prefer_on")
+            quality_level: JPEG quality level 0-9 requested for Tight encoding (default: VNC_QUALITY_LEVEL)
+            compress_level: zlib compression level 0-9 requested from the server (default: VNC_COMPRESS_LEVEL)
+            color_depth: Pixel format to request, "24", "16", "8" or "server" (default: VNC_COLOR_DEPTH)
         """
         self.host = host
         self.port = port
         self.password = password
         self.username = username
         self.encryption = encryption
-        self.socket = None
         self.width = 0
         self.height = 0
         self.pixel_format = None
         self.name = ""
         self.protocol_version = ""
-        self._last_frame = None  # Store last frame for incremental updates
-        self._socket_buffer_size = 8192  # Increased buffer size for better performance
+        self.framebuffer: Optional[Framebuffer] = None  # Kept across captures for incremental updates
+        self.frame_sequence = 0  # Number of framebuffer updates applied to the framebuffer
+        self.frame_timestamp = None  # time.monotonic() of the latest update
+        self.image_sequence = 0  # frame_sequence of the latest image returned by capture_image()
+        # Distinguishes frame numbers of this connection from those of other pooled connections
+        self.session_id = os.urandom(4).hex()
+        self._frame_changes = deque(maxlen=FRAME_HISTORY_SIZE)  # (sequence, changed rectangles)
+        # Set by the first changes_since() call; until then full updates are not diffed
+        self._track_changes = False
+        self._zrle_stream = zlib.decompressobj()  # ZRLE uses one zlib stream per connection
+        self.color_depth = color_depth or VNC_COLOR_DEPTH
+        if self.color_depth not in PIXEL_FORMATS and self.color_depth != "server":
+            raise ValueError(f"color_depth must be one of {', '.join(PIXEL_FORMATS)} or server, "
+                             f"got {self.color_depth}")
+        self.colour_map: Optional[np.ndarray] = None  # From SetColourMapEntries
+        self.clipboard = Clipboard()  # Clipboard text exchanged with the server
+        if VNC_CURSOR not in CURSOR_MODES:
+            raise ValueError(f"VNC_CURSOR must be one of {', '.join(CURSOR_MODES)}, got {VNC_CURSOR}")
+        self.cursor: Optional[Cursor] = None  # Pointer shape, when the server leaves drawing it to us
+        self.pointer_position: Optional[Tuple[int, int]] = None  # Position of our latest pointer event
+        self.bell_count = 0  # Number of Bell messages received
+        self.handshake_timings: Dict[str, float] = {}  # Milliseconds per phase of the latest handshake
+        self._phase_started = 0.0
+        # Readers of server messages other than FramebufferUpdate, by message type
+        self._message_readers: Dict[int, Callable[[], Any]] = {}
+        self.quality_level = _level_setting(quality_level, VNC_QUALITY_LEVEL, "quality_level")
+        self.compress_level = _level_setting(compress_level, VNC_COMPRESS_LEVEL, "compress_level")
+        self._tight_streams = [zlib.decompressobj() for _ in range(4)]
+        # Rectangle readers by encoding type
+        self._rect_readers = {
+            Encoding.RAW: self._read_raw_rect,
+            Encoding.COPY_RECT: self._read_copy_rect,
+            Encoding.RRE: self._read_rre_rect,
+            Encoding.HEXTILE: self._read_hextile_rect,
+            Encoding.ZRLE: self._read_zrle_rect,
+            Encoding.TIGHT: self._read_tight_rect,
+            Encoding.DESKTOP_SIZE: self._read_desktop_size,
+        }
+        self.register_message_handler(ServerMessage.SET_COLOUR_MAP_ENTRIES, self._read_colour_map_entries)
+        self.register_message_handler(ServerMessage.BELL, self._bell)
+        self.register_message_handler(ServerMessage.SERVER_CUT_TEXT, self._read_server_cut_text)
+        self._socket_buffer_size = VNC_RECV_BUFFER_SIZE
+        self.socket = None
+        self._send_lock = threading.Lock()
+        # Background frame receiver state
+        self._receiver: Optional[threading.Thread] = None
+        self._receiver_stop = threading.Event()
+        self._frame_ready = threading.Condition()
+        # A stopped receiver leaves its last update request outstanding; the reply may still come
+        self._update_pending = False
+        # Replies to round_trip() requests that timed out; they are read before the next reply
+        self._acks_pending = 0
         logger.debug(f"Initialized VNC client for {host}:{port} with encryption={encryption}")
         if username:
             logger.debug(f"Username authentication enabled for: {username}")
 
+    def _reset_stream_state(self) -> None:
+        """Reset per-connection decoder state before a new handshake."""
+        self._zrle_stream = zlib.decompressobj()
+        self._tight_streams = [zlib.decompressobj() for _ in range(4)]
+        self._update_pending = False
+        self._acks_pending = 0
+        self.framebuffer = None
+        self.colour_map = None
+        self.clipboard = Clipboard()
+        self.cursor = None
+        self.pointer_position = None
+        self._frame_changes.clear()
+        self.handshake_timings = {}
+        self._phase_started = time.perf_counter()
+
+    def _handshake_phase(self, name: str) -> None:
+        """Record how long a handshake phase took, counted from the end of the previous one."""
+        now = time.perf_counter()
+        self.handshake_timings[name] = round((now - self._phase_started) * 1000, 3)
+        self._phase_started = now
+
+    def _record_handshake(self) -> None:
+        """Log the duration of each handshake phase and add them to the metrics."""
+        for name, ms in self.handshake_timings.items():
+            metrics.observe("vnc_handshake_phase_seconds", ms / 1000, phase=name)
+        total = sum(self.handshake_timings.values())
+        metrics.observe("vnc_handshake_seconds", total / 1000)
+        phases = ", ".join(f"{name} {ms:.1f}ms" for name, ms in self.handshake_timings.items())
+        logger.info(f"Handshake with {self.host}:{self.port} took {total:.1f}ms ({phases})")
+
+    def _pixel_format_message(self) -> Optional[bytes]:
+        """Build a SetPixelFormat message for the configured colour depth.
+
+        Returns:
+            Optional[bytes]: The message, or None to keep the server's native pixel format
+        """
+        pixel_format = PIXEL_FORMATS.get(self.color_depth)
+        if pixel_format is None:
+            return None
+        message = bytearray([0])  # message type 0 = SetPixelFormat
+        message.extend([0, 0, 0])  # padding
+        message.extend(pixel_format)  # Pixel format (16 bytes)
+        return bytes(message)
+
+    def register_message_handler(self, message_type: int, handler: Callable[[], Any]) -> None:
+        """Register the reader of a server-to-client message type.
+
+        The handler is called once the message type byte has been read, must read the
+        rest of the message, and returns True if it could. Messages without a handler
+        cannot be skipped, so they close the connection.
+
+        Args:
+            message_type: The message type, e.g. one of ServerMessage
+            handler: Reads the message body
+
+        Raises:
+            ValueError: For FramebufferUpdate, which the client always reads itself
+        """
+        if message_type == ServerMessage.FRAMEBUFFER_UPDATE:
+            raise ValueError("FramebufferUpdate messages are read by the client")
+        self._message_readers[message_type] = handler
+
+    def _bell(self) -> bool:
+        """Handle a Bell message, which has no body."""
+        self.bell_count += 1
+        logger.debug("Bell")
+        return True
+
+    def _apply_colour_map(self, first_colour: int, data: bytes) -> None:
+        """Store SetColourMapEntries colours.
+
+        Args:
+            first_colour: Index of the first colour in data
+            data: 16-bit red, green and blue values for each colour
+        """
+        colours = (np.frombuffer(data, dtype='>u2').reshape(-1, 3) >> 8).astype(np.uint8)
+        size = max(256, first_colour + len(colours))
+        if self.colour_map is None or len(self.colour_map) < size:
+            colour_map = np.zeros((size, 3), dtype=np.uint8)
+            if self.colour_map is not None:
+                colour_map[:len(self.colour_map)] = self.colour_map
+            self.colour_map = colour_map
+        self.colour_map[first_colour:first_colour + len(colours)] = colours
+        logger.debug("Colour map updated: %d colours from index %d", len(colours), first_colour)
+
+    def _framebuffer_image(self, region: Optional[Rect] = None, show_cursor: bool = False) -> Image.Image:
+        """Convert the framebuffer, or a region of it, to a new RGB image.
+
+        Args:
+            region: (x, y, width, height) to convert (default: the whole framebuffer)
+            show_cursor: Draw the pointer at the position of our latest pointer event, if the
+                         server sent its shape
+        """
+        self.image_sequence = self.frame_sequence
+        img = self.framebuffer.to_image(self.colour_map, region)
+        if show_cursor and self.cursor is not None and self.pointer_position is not None:
+            left, top = region[:2] if region is not None else (0, 0)
+            self.cursor.draw(img, self.pointer_position[0] - left, self.pointer_position[1] - top)
+        return img
+
+    def _set_cursor(self, x: int, y: int, width: int, height: int, data: bytes) -> None:
+        """Store the pointer shape from a Cursor pseudo-rectangle, whose x and y are the hotspot."""
+        self.cursor = Cursor.decode(x, y, width, height, data, self.pixel_format, self.colour_map)
+        logger.debug("Cursor shape changed to %dx%d, hotspot (%d, %d)", width, height, x, y)
+
+    def _frame_applied(self, fb: Framebuffer, previous: Optional[np.ndarray] = None) -> None:
+        """Number a completed framebuffer update and remember which rectangles it changed.
+
+        Args:
+            fb: Framebuffer the update was applied to
+            previous: Pixels before a full (non-incremental) update; the server resends the
+                      whole screen then, so the actual changes are found by comparison
+        """
+        changed = fb.take_dirty()
+        if previous is not None and previous.shape == fb.pixels.shape:
+            changed = fb.changed_regions(previous)
+        self.frame_sequence += 1
+        self.frame_timestamp = time.monotonic()
+        self._frame_changes.append((self.frame_sequence, changed))
+
+    def frame_id(self) -> str:
+        """Return an identifier for the latest captured image, for use with changes_since()."""
+        return f"{self.session_id}:{self.image_sequence}"
+
+    def changes_since(self, frame: str) -> Optional[List[Rect]]:
+        """Return the screen areas that changed between an earlier frame and the latest captured image.
+
+        Args:
+            frame: Identifier previously returned by frame_id()
+
+        Returns:
+            Optional[List[Rect]]: Changed (x, y, width, height) regions, an empty list if nothing
+                                  changed, or None if a full screenshot is needed (unknown or too
+                                  old frame, or too much of the screen changed). Safe to
+                                  call while the frame receiver runs.
+        """
+        with self._frame_ready:
+            self._track_changes = True
+            session_id, _, sequence = frame.partition(":")
+            if session_id != self.session_id or not sequence.isdigit():
+                return None
+            since = int(sequence)
+            if since > self.image_sequence:
+                return None
+            if since == self.image_sequence:
+                return []
+            if not self._frame_changes or self._frame_changes[0][0] > since + 1:
+                # Part of the history has been forgotten
+                return None
+
+            rects = [rect for sequence, changed in self._frame_changes
+                     if since < sequence <= self.image_sequence for rect in changed]
+            regions = merge_regions(rects, self.width, self.height)
+            if len(regions) > DELTA_MAX_REGIONS:
+                left = min(x for x, _, _, _ in regions)
+                top = min(y for _, y, _, _ in regions)
+                right = max(x + w for x, _, w, _ in regions)
+                bottom = max(y + h for _, y, _, h in regions)
+                regions = [(left, top, right - left, bottom - top)]
+            if sum(w * h for _, _, w, h in regions) > DELTA_MAX_AREA * self.width * self.height:
+                return None
+            return regions
+
+    def _client_encodings(self) -> List[int]:
+        """Return the encodings to advertise, including the quality and compression pseudo-encodings."""
+        encodings = list(self.supported_encodings)
+        if VNC_CURSOR == "server":
+            # Without the Cursor pseudo-encoding the server draws the pointer itself
+            encodings.remove(Encoding.CURSOR)
+        if self.quality_level is not None:
+            encodings.append(Encoding.QUALITY_LEVEL_0 + self.quality_level)
+        if self.compress_level is not None:
+            encodings.append(Encoding.COMPRESS_LEVEL_0 + self.compress_level)
+        return encodings
+
+    def _encodings_message(self, encodings: List[int]) -> bytes:
+        """Build a SetEncodings message.
+
+        Args:
+            encodings: List of encoding types
+        """
+        message = bytearray([2])  # message type 2 = SetEncodings
+        message.extend([0])  # padding
+
+        # Number of encodings
+        message.extend(len(encodings).to_bytes(2, byteorder='big'))
+
+        # Encodings
+        for encoding in encodings:
+            message.extend(encoding.to_bytes(4, byteorder='big', signed=True))
+        return bytes(message)
+
+    def _framebuffer_update_request(self, incremental: bool, region: Optional[Rect] = None) -> bytes:
+        """Build a FramebufferUpdateRequest message.
+
+        Args:
+            incremental: Only ask for regions changed since the last update
+            region: (x, y, width, height) of the area to update (default: the whole screen)
+        """
+        x, y, width, height = region or (0, 0, self.width, self.height)
+        return FRAMEBUFFER_UPDATE_REQUEST.pack(3, 1 if incremental else 0, int(x), int(y), int(width), int(height))
+
+    def _key_event_message(self, key: int, down: bool) -> bytes:
+        """Build a KeyEvent message.
+
+        Args:
+            key: X11 keysym value representing the key
+            down: True for key press, False for key release
+        """
+        return key_event(key, down)
+
+    def _pointer_event_message(self, x: int, y: int, button_mask: int) -> bytes:
+        """Build a PointerEvent message, clamping the position to the framebuffer.
+
+        Args:
+            x: X position
+            y: Y position
+            button_mask: Bit mask of pressed buttons
+        """
+        x = max(0, min(x, self.width - 1))
+        y = max(0, min(y, self.height - 1))
+        self.pointer_position = (x, y)
+        return pointer_event(x, y, button_mask)
+
+    def _event_writer(self) -> EventWriter:
+        """Create a buffer for the input events of one logical action."""
+        return EventWriter(self.width, self.height)
+
+    def _char_to_keysym(self, char: str) -> Tuple[int, bool]:
+        """Map a character to an X11 keysym.
+
+        Args:
+            char: Character to type
+
+        Returns:
+            Tuple[int, bool]: (keysym, need_shift)
+        """
+        # Special key mapping for common non-printable characters
+        if char == '\n' or char == '\r':  # Return/Enter
+            key = 0xff0d
+        elif char == '\t':  # Tab
+            key = 0xff09
+        elif char == '\b':  # Backspace
+            key = 0xff08
+        elif char == ' ':  # Space
+            key = 0x20
+        else:
+            # For printable ASCII and Unicode characters
+            key = ord(char)
+
+        # If it's an uppercase letter, we need to simulate a shift press
+        need_shift = char.isupper() or char in '~!@#$%^&*()_+{}|:"<>?'
+        return key, need_shift
+
+    def _new_framebuffer(self) -> Framebuffer:
+        """Allocate a framebuffer for the current desktop size and pixel format."""
+        return Framebuffer(self.width, self.height, self.pixel_format)
+
+    def _resize_framebuffer(self, width: int, height: int, fb: Framebuffer) -> None:
+        """Apply a desktop size change, keeping the existing framebuffer contents."""
+        logger.debug("Desktop size changed to %dx%d", width, height)
+        self.width = width
+        self.height = height
+        fb.resize(width, height)
+
+    def _cpixel_size(self) -> int:
+        """Bytes per compact pixel (CPIXEL) as used by ZRLE."""
+        fmt = self.pixel_format
+        if fmt.true_color and fmt.bits_per_pixel == 32 and fmt.depth <= 24:
+            mask = channel_mask(fmt)
+            if mask <= 0xFFFFFF or not mask & 0xFF:
+                return 3
+        return fmt.bits_per_pixel // 8
+
+    def _cpixels_to_pixels(self, data: bytes, count: int) -> np.ndarray:
+        """Expand compact pixels to full pixels.
+
+        Returns:
+            np.ndarray: uint8 array of shape (count, bytes per pixel)
+        """
+        pixel_size = self.pixel_format.bits_per_pixel // 8
+        cpixel = self._cpixel_size()
+        cpixels = np.frombuffer(data, dtype=np.uint8, count=count * cpixel).reshape(count, cpixel)
+        if cpixel == pixel_size:
+            return cpixels
+        # 3-byte CPIXELs hold either the least or the most significant bytes of the pixel value
+        least_significant = channel_mask(self.pixel_format) <= 0xFFFFFF
+        offset = 1 if self.pixel_format.big_endian == least_significant else 0
+        pixels = np.zeros((count, pixel_size), dtype=np.uint8)
+        pixels[:, offset:offset + cpixel] = cpixels
+        return pixels
+
+    def _decode_raw_rect(self, rect_data: bytes, x: int, y: int, width: int, height: int,
+                        fb: Framebuffer) -> None:
+        """Decode a RAW-encoded rectangle and draw it to the framebuffer.
+
+        Args:
+            rect_data: Raw pixel data
+            x: X position of rectangle
+            y: Y position of rectangle
+            width: Width of rectangle
+            height: Height of rectangle
+            fb: Framebuffer to draw to
+        """
+        try:
+            # RAW pixels are already in the framebuffer's pixel format
+            fb.write(x, y, width, height, rect_data)
+
+        except Exception as e:
+            logger.error(f"Error decoding RAW rectangle: {str(e)}")
+            # Fill with error color on failure
+            fb.fill_rgb(x, y, width, height, (255, 0, 0))
+
+    def _decode_rre_rect(self, rect_data: bytes, x: int, y: int, width: int, height: int,
+                         fb: Framebuffer) -> None:
+        """Decode an RRE-encoded rectangle and draw it to the framebuffer.
+
+        Args:
+            rect_data: Subrectangle count, background pixel and subrectangles
+            x: X position of rectangle
+            y: Y position of rectangle
+            width: Width of rectangle
+            height: Height of rectangle
+            fb: Framebuffer to draw to
+        """
+        pixel_size = self.pixel_format.bits_per_pixel // 8
+        fb.fill(x, y, width, height, rect_data[4:4 + pixel_size])
+
+        for pos in range(4 + pixel_size, len(rect_data), pixel_size + 8):
+            sub = pos + pixel_size
+            sub_x = x + int.from_bytes(rect_data[sub:sub + 2], byteorder='big')
+            sub_y = y + int.from_bytes(rect_data[sub + 2:sub + 4], byteorder='big')
+            sub_w = int.from_bytes(rect_data[sub + 4:sub + 6], byteorder='big')
+            sub_h = int.from_bytes(rect_data[sub + 6:sub + 8], byteorder='big')
+            fb.fill(sub_x, sub_y, sub_w, sub_h, rect_data[pos:sub])
+
+    def _decode_zrle_rect(self, rect_data: bytes, x: int, y: int, width: int, height: int,
+                          fb: Framebuffer) -> bool:
+        """Decode a ZRLE-encoded rectangle and draw it to the framebuffer.
+
+        The zlib stream is shared by all ZRLE rectangles of a connection, so a
+        failure here leaves the connection unusable.
+
+        Args:
+            rect_data: Compressed ZRLE data (without the length prefix)
+            x: X position of rectangle
+            y: Y position of rectangle
+            width: Width of rectangle
+            height: Height of rectangle
+            fb: Framebuffer to draw to
+
+        Returns:
+            bool: True if the rectangle was decoded
+        """
+        try:
+            data = self._zrle_stream.decompress(rect_data)
+            cpixel = self._cpixel_size()
+            pos = 0
+
+            for tile_y in range(y, y + height, ZRLE_TILE_SIZE):
+                tile_h = min(ZRLE_TILE_SIZE, y + height - tile_y)
+                for tile_x in range(x, x + width, ZRLE_TILE_SIZE):
+                    tile_w = min(ZRLE_TILE_SIZE, x + width - tile_x)
+                    num_pixels = tile_w * tile_h
+                    subencoding = data[pos]
+                    pos += 1
+
+                    if subencoding == 0:
+                        # Raw CPIXELs
+                        pixels = self._cpixels_to_pixels(data[pos:pos + num_pixels * cpixel], num_pixels)
+                        pos += num_pixels * cpixel
+                        fb.put(tile_x, tile_y, pixels.reshape(tile_h, tile_w, -1))
+                    elif subencoding == 1:
+                        # Solid colour
+                        pixel = self._cpixels_to_pixels(data[pos:pos + cpixel], 1)
+                        pos += cpixel
+                        fb.fill(tile_x, tile_y, tile_w, tile_h, pixel.tobytes())
+                    elif subencoding <= 16:
+                        # Packed palette, rows padded to a byte boundary
+                        palette_size = subencoding
+                        palette = self._cpixels_to_pixels(data[pos:pos + palette_size * cpixel], palette_size)
+                        pos += palette_size * cpixel
+                        bits = 1 if palette_size == 2 else 2 if palette_size <= 4 else 4
+                        size = (tile_w * bits + 7) // 8 * tile_h
+                        indices = np.asarray(Image.frombytes('P', (tile_w, tile_h), bytes(data[pos:pos + size]),
+                                                             'raw', f'P;{bits}'))
+                        pos += size
+                        fb.put(tile_x, tile_y, palette[indices])
+                    elif subencoding == 128:
+                        # Plain RLE: (CPIXEL, run length) pairs; only the runs are parsed one by
+                        # one, the pixels are expanded with a single np.repeat
+                        values = bytearray()
+                        runs = []
+                        covered = 0
+                        while covered < num_pixels:
+                            values += data[pos:pos + cpixel]
+                            run, pos = self._read_zrle_run(data, pos + cpixel)
+                            runs.append(run)
+                            covered += run
+                        pixels = np.repeat(self._cpixels_to_pixels(bytes(values), len(runs)), runs, axis=0)
+                        fb.put(tile_x, tile_y, pixels[:num_pixels].reshape(tile_h, tile_w, -1))
+                    elif subencoding >= 130:
+                        # Palette RLE: palette indices, with a run length when the top bit is set
+                        palette_size = subencoding - 128
+                        palette = self._cpixels_to_pixels(data[pos:pos + palette_size * cpixel], palette_size)
+                        pos += palette_size * cpixel
+                        indices = []
+                        runs = []
+                        covered = 0
+                        while covered < num_pixels:
+                            index = data[pos]
+                            pos += 1
+                            run = 1
+                            if index & 0x80:
+                                run, pos = self._read_zrle_run(data, pos)
+                            indices.append(index & 0x7F)
+                            runs.append(run)
+                            covered += run
+                        indices = np.repeat(np.array(indices, dtype=np.uint8), runs)[:num_pixels]
+                        fb.put(tile_x, tile_y, palette[indices.reshape(tile_h, tile_w)])
+                    else:
+                        raise ValueError(f"invalid ZRLE subencoding {subencoding}")
+
+            return True
+
+        except Exception as e:
+            logger.error(f"Error decoding ZRLE rectangle: {str(e)}")
+            return False
+
+    @staticmethod
+    def _read_zrle_run(data: bytes, pos: int) -> Tuple[int, int]:
+        """Read a ZRLE run length.
+
+        Returns:
+            Tuple[int, int]: (run length, position after the run length)
+        """
+        run = 1
+        while True:
+            value = data[pos]
+            pos += 1
+            run += value
+            if value != 255:
+                return run, pos
+
+    def _decode_copy_rect(self, rect_data: bytes, x: int, y: int, width: int, height: int,
+                         fb: Framebuffer) -> None:
+        """Decode a COPY_RECT-encoded rectangle and draw it to the framebuffer.
+
+        Args:
+            rect_data: CopyRect data (src_x, src_y)
+            x: X position of destination rectangle
+            y: Y position of destination rectangle
+            width: Width of rectangle
+            height: Height of rectangle
+            fb: Framebuffer to draw to
+        """
+        try:
+            src_x = int.from_bytes(rect_data[0:2], byteorder='big')
+            src_y = int.from_bytes(rect_data[2:4], byteorder='big')
+
+            # Copy the region from the framebuffer itself
+            fb.copy_rect(src_x, src_y, x, y, width, height)
+
+        except Exception as e:
+            logger.error(f"Error decoding COPY_RECT rectangle: {str(e)}")
+            # Fill with error color on failure
+            fb.fill_rgb(x, y, width, height, (0, 0, 255))
+
+    def _frame_to_png(self, img: Image.Image) -> bytes:
+        """Encode a framebuffer image as PNG.
+
+        Args:
+            img: Framebuffer image
+
+        Returns:
+            bytes: PNG image data
+        """
+        return encode_image(img, "png")
+
+    @property
+    def socket(self) -> Optional[socket.socket]:
+        """The connected socket, or None."""
+        return self._socket
+
+    @socket.setter
+    def socket(self, sock) -> None:
+        # Every socket gets its own receive buffer, so no stale bytes carry over
+        self._socket = sock
+        self._reader = SocketReader(sock, self._socket_buffer_size) if sock is not None else None
+
     def connect(self) -> Tuple[bool, Optional[str]]:
         """Connect to the remote MacOs machine and perform the RFB handshake.
 
@@ -207,15 +1216,20 @@ class VNCClient:
         try:
             logger.info(f"Attempting connection to remote MacOs machine at {self.host}:{self.port}")
             logger.debug(f"Connection parameters: encryption={self.encryption}, username={'set' if self.username else 'not set'}, password={'set' if self.password else 'not set'}")
+            self._reset_stream_state()
 
-            # Create socket and connect
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            # Create socket and connect; a literal IPv6 address needs an IPv6 socket
+            family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+            self.socket = socket.socket(family, socket.SOCK_STREAM)
             self.socket.settimeout(10)  # 10 second timeout
+            # Input events are small and latency-sensitive; don't let Nagle hold them back
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             logger.debug(f"Created socket with 10 second timeout")
 
             try:
                 self.socket.connect((self.host, self.port))
                 logger.info(f"Successfully established TCP connection to {self.host}:{self.port}")
+                self._handshake_phase("tcp_connect")
             except ConnectionRefusedError:
                 error_msg = f"Connection refused by {self.host}:{self.port}. Ensure remote MacOs machine is running and port is correct."
                 logger.error(error_msg)
@@ -255,6 +1269,7 @@ class VNCClient:
             our_version = b"RFB 003.008\n"
             logger.debug(f"Sending our protocol version: {our_version.decode('ascii').strip()}")
             self.socket.sendall(our_version)
+            self._handshake_phase("version")
 
             # In RFB 3.8+, server sends number of security types followed by list of types
             try:
@@ -314,6 +1329,7 @@ class VNCClient:
             # Send chosen security type
             logger.info(f"Selecting security type: {chosen_type}")
             self.socket.sendall(bytes([chosen_type]))
+            self._handshake_phase("security")
 
             # Handle authentication based on chosen type
             if chosen_type == 30:
@@ -360,69 +1376,15 @@ class VNCClient:
                         return False, error_msg
                     logger.debug(f"Server public key received ({len(server_public_key)} bytes)")
 
-                    # Import required libraries for Diffie-Hellman key exchange
+                    # Perform the Diffie-Hellman key exchange
                     try:
-                        from cryptography.hazmat.primitives.asymmetric import dh
-                        from cryptography.hazmat.primitives import hashes
-                        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-                        import os
-
-                        # Convert parameters to integers for DH
-                        p_int = int.from_bytes(prime_data, byteorder='big')
-                        g_int = generator
-
-                        # Create parameter numbers
-                        parameter_numbers = dh.DHParameterNumbers(p_int, g_int)
-                        parameters = parameter_numbers.parameters()
-
-                        # Generate our private key
-                        private_key = parameters.generate_private_key()
-
-                        # Get our public key in bytes
-                        public_key_bytes = private_key.public_key().public_numbers().y.to_bytes(key_length, byteorder='big')
-
-                        # Convert server's public key to integer
-                        server_public_int = int.from_bytes(server_public_key, byteorder='big')
-                        server_public_numbers = dh.DHPublicNumbers(server_public_int, parameter_numbers)
-                        server_public_key_obj = server_public_numbers.public_key()
-
-                        # Generate shared key
-                        shared_key = private_key.exchange(server_public_key_obj)
-
-                        # Generate MD5 hash of shared key for AES
-                        md5 = hashes.Hash(hashes.MD5())
-                        md5.update(shared_key)
-                        aes_key = md5.finalize()
-
-                        # Create credentials array (128 bytes)
-                        creds = bytearray(128)
-
-                        # Fill with random data
-                        for i in range(128):
-                            creds[i] = ord(os.urandom(1))
-
-                        # Add username and password to credentials array
-                        username_bytes = self.username.encode('utf-8') if self.username else b''
-                        password_bytes = self.password.encode('utf-8')
-
-                        # Username in first 64 bytes
-                        username_len = min(len(username_bytes), 63)  # Leave room for null byte
-                        creds[0:username_len] = username_bytes[0:username_len]
-                        creds[username_len] = 0  # Null terminator
-
-                        # Password in second 64 bytes
-                        password_len = min(len(password_bytes), 63)  # Leave room for null byte
-                        creds[64:64+password_len] = password_bytes[0:password_len]
-                        creds[64+password_len] = 0  # Null terminator
-
-                        # Encrypt credentials with AES-128-ECB
-                        cipher = Cipher(algorithms.AES(aes_key), modes.ECB())
-                        encryptor = cipher.encryptor()
-                        encrypted_creds = encryptor.update(creds) + encryptor.finalize()
+                        response = apple_auth_response(generator, key_length, prime_data, server_public_key,
+                                                       self.username, self.password)
 
                         # Send encrypted credentials followed by our public key
                         logger.debug("Sending encrypted credentials and public key")
-                        self.socket.sendall(encrypted_creds + public_key_bytes)
+                        self.socket.sendall(response)
+                        self._handshake_phase("dh")
 
                     except ImportError as e:
                         error_msg = f"Missing required libraries for DH key exchange: {str(e)}"
@@ -468,6 +1430,7 @@ class VNCClient:
                         return False, error_msg
 
                     logger.info("Apple authentication successful")
+                    self._handshake_phase("auth")
                 except Exception as e:
                     error_msg = f"Error reading authentication result: {str(e)}"
                     logger.error(error_msg)
@@ -507,15 +1470,17 @@ class VNCClient:
             logger.debug(f"Screen dimensions: {self.width}x{self.height}")
             logger.debug(f"Initial pixel format: {self.pixel_format}")
 
-            # Set preferred pixel format (32-bit true color)
+            # Set preferred pixel format
             logger.debug("Setting preferred pixel format")
             self._set_pixel_format()
 
             # Set encodings (prioritize the ones we can actually handle)
             logger.debug("Setting supported encodings")
-            self._set_encodings([Encoding.RAW, Encoding.COPY_RECT, Encoding.DESKTOP_SIZE])
+            self._set_encodings(self._client_encodings())
+            self._handshake_phase("server_init")
 
             logger.info("VNC connection fully established and configured")
+            self._record_handshake()
             return True, None
 
         except Exception as e:
@@ -530,28 +1495,17 @@ class VNCClient:
             return False, error_msg
 
     def _set_pixel_format(self):
-        """Set the pixel format to be used for the connection (32-bit true color)."""
+        """Set the pixel format to be used for the connection (see color_depth)."""
         try:
-            message = bytearray([0])  # message type 0 = SetPixelFormat
-            message.extend([0, 0, 0])  # padding
-
-            # Pixel format (16 bytes)
-            message.extend([
-                32,  # bits-per-pixel
-                24,  # depth
-                1,   # big-endian flag (1 = true)
-                1,   # true-color flag (1 = true)
-                0, 255,  # red-max (255)
-                0, 255,  # green-max (255)
-                0, 255,  # blue-max (255)
-                16,  # red-shift
-                8,   # green-shift
-                0,   # blue-shift
-                0, 0, 0  # padding
-            ])
-
-            self.socket.sendall(message)
-            logger.debug("Set pixel format to 32-bit true color")
+            message = self._pixel_format_message()
+            if message is None:
+                logger.debug("Keeping the server's native pixel format")
+                return
+            self._send(message)
+            # The server encodes all further updates in the requested format
+            self.pixel_format = PixelFormat(message[4:20])
+            self.framebuffer = None
+            logger.debug(f"Set pixel format to {self.pixel_format}")
         except Exception as e:
             logger.error(f"Error setting pixel format: {str(e)}")
 
@@ -562,216 +1516,859 @@ class VNCClient:
             encodings: List of encoding types
         """
         try:
-            message = bytearray([2])  # message type 2 = SetEncodings
-            message.extend([0])  # padding
-
-            # Number of encodings
-            message.extend(len(encodings).to_bytes(2, byteorder='big'))
-
-            # Encodings
-            for encoding in encodings:
-                message.extend(encoding.to_bytes(4, byteorder='big', signed=True))
-
-            self.socket.sendall(message)
+            self._send(self._encodings_message(encodings))
             logger.debug(f"Set encodings: {encodings}")
         except Exception as e:
             logger.error(f"Error setting encodings: {str(e)}")
 
-    def _decode_raw_rect(self, rect_data: bytes, x: int, y: int, width: int, height: int,
-                        img: Image.Image) -> None:
-        """Decode a RAW-encoded rectangle and draw it to the image.
+    def capture_screen(self, incremental: bool = False) -> Optional[bytes]:
+        """Capture a screenshot from the remote MacOs machine as PNG.
 
         Args:
-            rect_data: Raw pixel data
-            x: X position of rectangle
-            y: Y position of rectangle
-            width: Width of rectangle
-            height: Height of rectangle
-            img: PIL Image to draw to
+            incremental: Only request changes since the previous capture on this connection
+                         (see capture_image)
         """
-        try:
-            # Create a new image from the raw data
-            if self.pixel_format.bits_per_pixel == 32:
-                # 32-bit color (RGBA)
-                raw_img = Image.frombytes('RGBA', (width, height), rect_data)
-                # Convert to RGB if needed
-                if raw_img.mode != 'RGB':
-                    raw_img = raw_img.convert('RGB')
-            elif self.pixel_format.bits_per_pixel == 16:
-                # 16-bit color needs special handling
-                raw_img = Image.new('RGB', (width, height))
-                pixels = raw_img.load()
-
-                for i in range(height):
-                    for j in range(width):
-                        idx = (i * width + j) * 2
-                        pixel = int.from_bytes(rect_data[idx:idx+2],
-                                            byteorder='big' if self.pixel_format.big_endian else 'little')
-
-                        r = ((pixel >> self.pixel_format.red_shift) & self.pixel_format.red_max)
-                        g = ((pixel >> self.pixel_format.green_shift) & self.pixel_format.green_max)
-                        b = ((pixel >> self.pixel_format.blue_shift) & self.pixel_format.blue_max)
-
-                        # Scale values to 0-255 range
-                        r = int(r * 255 / self.pixel_format.red_max)
-                        g = int(g * 255 / self.pixel_format.green_max)
-                        b = int(b * 255 / self.pixel_format.blue_max)
-
-                        pixels[j, i] = (r, g, b)
-            else:
-                # Fallback for other bit depths (basic conversion)
-                raw_img = Image.new('RGB', (width, height), color='black')
-                logger.warning(f"Unsupported pixel format: {self.pixel_format.bits_per_pixel}-bit")
+        img = self.capture_image(incremental)
+        return self._frame_to_png(img) if img is not None else None
 
-            # Paste the decoded image onto the target image
-            img.paste(raw_img, (x, y))
-
-        except Exception as e:
-            logger.error(f"Error decoding RAW rectangle: {str(e)}")
-            # Fill with error color on failure
-            raw_img = Image.new('RGB', (width, height), color='red')
-            img.paste(raw_img, (x, y))
+    def capture_image(self, incremental: bool = False, region: Optional[Rect] = None,
+                      show_cursor: bool = False) -> Optional[Image.Image]:
+        """Capture the remote screen as an RGB image, without encoding it.
 
-    def _decode_copy_rect(self, rect_data: bytes, x: int, y: int, width: int, height: int,
-                         img: Image.Image) -> None:
-        """Decode a COPY_RECT-encoded rectangle and draw it to the image.
+        When the background frame receiver is running, the latest complete frame is
+        returned immediately instead of requesting a new one.
 
         Args:
-            rect_data: CopyRect data (src_x, src_y)
-            x: X position of destination rectangle
-            y: Y position of destination rectangle
-            width: Width of rectangle
-            height: Height of rectangle
-            img: PIL Image to draw to
+            incremental: Only request changes since the previous capture on this connection.
+                         Servers may hold back an incremental reply until something changes,
+                         so this is off by default.
+            region: (x, y, width, height) to capture, in screen pixels. Only this area is
+                    requested from the server and converted (default: the whole screen).
+            show_cursor: Draw the mouse pointer, when the server leaves drawing it to us
         """
         try:
-            src_x = int.from_bytes(rect_data[0:2], byteorder='big')
-            src_y = int.from_bytes(rect_data[2:4], byteorder='big')
+            if not self.socket:
+                logger.error("Not connected to remote MacOs machine")
+                return None
+
+            if self.frame_receiver_running():
+                img = self.get_latest_frame(region=region, show_cursor=show_cursor)
+                if img is None:
+                    logger.error("Frame receiver did not deliver a frame in time")
+                return img
 
-            # Copy the region from the image itself
-            region = img.crop((src_x, src_y, src_x + width, src_y + height))
-            img.paste(region, (x, y))
+            if not self._update_framebuffer(incremental, region):
+                return None
+
+            # Only now convert the framebuffer to an image
+            with metrics.timer("vnc_capture_stage_seconds", stage="decode"):
+                return self._framebuffer_image(region, show_cursor)
 
         except Exception as e:
-            logger.error(f"Error decoding COPY_RECT rectangle: {str(e)}")
-            # Fill with error color on failure
-            raw_img = Image.new('RGB', (width, height), color='blue')
-            img.paste(raw_img, (x, y))
+            logger.error(f"Error capturing screen: {str(e)}")
+            return None
 
-    def capture_screen(self) -> Optional[bytes]:
-        """Capture a screenshot from the remote MacOs machine with optimizations."""
-        try:
-            if not self.socket:
-                logger.error("Not connected to remote MacOs machine")
+    def _update_framebuffer(self, incremental: bool, region: Optional[Rect] = None) -> bool:
+        """Request a framebuffer update and apply the reply to the framebuffer.
+
+        Args:
+            incremental: Only request changes since the previous update (ignored without one)
+            region: (x, y, width, height) to update, in screen pixels (default: the whole screen)
+
+        Returns:
+            bool: True if the update was applied; on a broken stream the connection is closed
+        """
+        # Use incremental updates if we have a previous frame
+        is_incremental = incremental and self.framebuffer is not None
+
+        # Replies to earlier round trips that timed out come first
+        while self._acks_pending:
+            if not self._read_ack():
+                logger.error("Failed to read a late acknowledgement, closing connection")
+                self.close()
+                return False
+
+        # Reuse the preallocated framebuffer; a full update repaints all of it
+        if self.framebuffer is None:
+            self.framebuffer = self._new_framebuffer()
+        # Diffing a full update costs a copy of the framebuffer, so it is only done once
+        # delta screenshots are in use; otherwise the whole screen counts as changed
+        full_repaint = self._track_changes and not is_incremental and region is None and self.frame_sequence
+        previous = self.framebuffer.pixels.copy() if full_repaint else None
+
+        # Send FramebufferUpdateRequest message; until the reply starts is the server's latency
+        with metrics.timer("vnc_capture_stage_seconds", stage="request"):
+            self._send(self._framebuffer_update_request(is_incremental, region))
+
+            # Bells, colour map and clipboard changes may arrive ahead of the update
+            updated = self._next_framebuffer_update()
+        if not updated:
+            logger.error("No framebuffer update in response, closing connection")
+            self.close()
+            return False
+
+        with metrics.timer("vnc_capture_stage_seconds", stage="receive"):
+            received = self._read_framebuffer_update(self.framebuffer)
+        if not received:
+            # The rest of the update is still in flight, so the stream is out of sync
+            logger.error("Failed to read framebuffer update, closing connection")
+            self.close()
+            return False
+
+        # The server may answer an outstanding request of a stopped receiver together with ours
+        self._update_pending = False
+        self._frame_applied(self.framebuffer, previous)
+        return True
+
+    def _next_framebuffer_update(self) -> bool:
+        """Dispatch server messages until the type of a FramebufferUpdate has been read.
+
+        Returns:
+            bool: False if a message could not be read, leaving the stream out of sync
+        """
+        while True:
+            message_type = self._recv_exact(1)
+            if not message_type:
+                return False
+            if message_type[0] == ServerMessage.FRAMEBUFFER_UPDATE:
+                return True
+            if not self._dispatch_message(message_type[0]):
+                return False
+
+    def _read_ack(self) -> bool:
+        """Read and apply the reply to the oldest round_trip() request still in flight.
+
+        Returns:
+            bool: False if it could not be read, leaving the stream out of sync
+        """
+        if not self._next_framebuffer_update() or not self._apply_update():
+            return False
+        self._acks_pending -= 1
+        return True
+
+    def _apply_update(self) -> bool:
+        """Read the body of a FramebufferUpdate whose type has been read, and apply it."""
+        if self.framebuffer is None:
+            self.framebuffer = self._new_framebuffer()
+        if not self._read_framebuffer_update(self.framebuffer):
+            return False
+        self._frame_applied(self.framebuffer)
+        return True
+
+    def _dispatch_message(self, message_type: int) -> bool:
+        """Read a server message other than FramebufferUpdate with its registered handler.
+
+        Returns:
+            bool: False if there is no handler or it failed
+        """
+        reader = self._message_readers.get(message_type)
+        if reader is None:
+            # The length of an unknown message is unknown too
+            logger.error(f"Unsupported server message type: {message_type}")
+            return False
+        return reader()
+
+    def _read_framebuffer_update(self, fb: Framebuffer) -> bool:
+        """Read the body of a FramebufferUpdate message and apply its rectangles.
+
+        Args:
+            fb: Framebuffer to draw into
+
+        Returns:
+            bool: True if the update was applied, False if it could not be read
+        """
+        # Padding (1 byte) and number of rectangles (2 bytes)
+        header = self._recv_exact(3)
+        if not header:
+            logger.error("Failed to read FramebufferUpdate header")
+            return False
+        num_rects = int.from_bytes(header[1:3], byteorder='big')
+        logger.debug("Received %d rectangles", num_rects)
+
+        # Process each rectangle
+        for rect_idx in range(num_rects):
+            # Read rectangle header efficiently
+            rect_header = self._recv_exact(12)
+            if not rect_header:
+                logger.error("Failed to read rectangle header")
+                return False
+
+            x = int.from_bytes(rect_header[0:2], byteorder='big')
+            y = int.from_bytes(rect_header[2:4], byteorder='big')
+            width = int.from_bytes(rect_header[4:6], byteorder='big')
+            height = int.from_bytes(rect_header[6:8], byteorder='big')
+            encoding_type = int.from_bytes(rect_header[8:12], byteorder='big', signed=True)
+
+            if encoding_type == Encoding.CURSOR:
+                # The pointer shape; it is not part of the framebuffer
+                data = self._recv_exact(cursor_data_size(width, height, self.pixel_format))
+                if data is None:
+                    return False
+                self._set_cursor(x, y, width, height, data)
+                continue
+
+            reader = self._rect_readers.get(encoding_type)
+            if reader is None:
+                # The payload length is unknown, so the stream cannot be resynchronized
+                logger.error(f"Unsupported encoding type: {encoding_type}, dropping update")
+                return False
+
+            if not reader(x, y, width, height, fb):
+                return False
+            fb.mark_dirty(x, y, width, height)
+
+        return True
+
+    def _read_colour_map_entries(self) -> bool:
+        """Read the body of a SetColourMapEntries message and update the colour map."""
+        # Padding (1 byte), first colour (2 bytes) and number of colours (2 bytes)
+        header = self._recv_exact(5)
+        if not header:
+            logger.error("Failed to read SetColourMapEntries header")
+            return False
+        first_colour = int.from_bytes(header[1:3], byteorder='big')
+        colours = self._recv_view(6 * int.from_bytes(header[3:5], byteorder='big'))
+        if colours is None:
+            logger.error("Failed to read colour map entries")
+            return False
+        self._apply_colour_map(first_colour, colours)
+        return True
+
+    def _read_server_cut_text(self) -> bool:
+        """Read the body of a ServerCutText message and answer extended clipboard messages."""
+        # Padding (3 bytes) and length, negative for extended clipboard messages
+        header = self._recv_exact(CUT_TEXT.size - 1)
+        if not header:
+            logger.error("Failed to read ServerCutText header")
+            return False
+        length = CUT_TEXT.unpack(b'\x03' + header)[1]
+        if not self.clipboard.accepts(length):
+            # Skip the payload without holding it in memory
+            logger.warning("Ignoring %d byte clipboard message (VNC_CLIPBOARD_MAX_SIZE is %d)",
+                           abs(length), self.clipboard.max_size)
+            if not self._skip(abs(length)):
+                logger.error("Failed to skip clipboard text")
+                return False
+            return True
+        data = self._recv_exact(abs(length))
+        if data is None:
+            logger.error("Failed to read clipboard text")
+            return False
+        for reply in self.clipboard.received(length, data):
+            self._send(reply)
+        return True
+
+    def _read_raw_rect(self, x: int, y: int, width: int, height: int, fb: Framebuffer) -> bool:
+        """Read a RAW rectangle from the socket straight into the framebuffer."""
+        if x + width > fb.width or y + height > fb.height:
+            logger.error(f"RAW rectangle {width}x{height}+{x}+{y} exceeds the framebuffer")
+            return False
+        for view in fb.row_views(x, y, width, height):
+            if not self._recv_into(view):
+                logger.error("Failed to read RAW rectangle data")
+                return False
+        return True
+
+    def _read_copy_rect(self, x: int, y: int, width: int, height: int, fb: Framebuffer) -> bool:
+        """Read a COPY_RECT rectangle from the socket and apply it to the framebuffer."""
+        rect_data = self._recv_exact(4)
+        if not rect_data:
+            logger.error("Failed to read COPY_RECT data")
+            return False
+        self._decode_copy_rect(rect_data, x, y, width, height, fb)
+        return True
+
+    def _read_rre_rect(self, x: int, y: int, width: int, height: int, fb: Framebuffer) -> bool:
+        """Read an RRE rectangle from the socket and draw it to the framebuffer."""
+        pixel_size = self.pixel_format.bits_per_pixel // 8
+        header = self._recv_exact(4 + pixel_size)
+        if not header:
+            logger.error("Failed to read RRE header")
+            return False
+        num_subrects = int.from_bytes(header[0:4], byteorder='big')
+        subrects = self._recv_exact(num_subrects * (pixel_size + 8))
+        if subrects is None:
+            logger.error("Failed to read RRE subrectangles")
+            return False
+        self._decode_rre_rect(header + subrects, x, y, width, height, fb)
+        return True
+
+    def _read_hextile_rect(self, x: int, y: int, width: int, height: int, fb: Framebuffer) -> bool:
+        """Read a Hextile rectangle from the socket and draw it to the framebuffer.
+
+        Hextile tiles are not length-prefixed, so each tile is parsed as it is read.
+        """
+        pixel_size = self.pixel_format.bits_per_pixel // 8
+        # Background and foreground pixels carry over from one tile to the next
+        background = foreground = bytes(pixel_size)
+
+        for tile_y in range(y, y + height, HEXTILE_TILE_SIZE):
+            tile_h = min(HEXTILE_TILE_SIZE, y + height - tile_y)
+            for tile_x in range(x, x + width, HEXTILE_TILE_SIZE):
+                tile_w = min(HEXTILE_TILE_SIZE, x + width - tile_x)
+                subencoding_data = self._recv_exact(1)
+                if not subencoding_data:
+                    logger.error("Failed to read Hextile tile")
+                    return False
+                subencoding = subencoding_data[0]
+
+                if subencoding & HEXTILE_RAW:
+                    tile_data = self._recv_view(tile_w * tile_h * pixel_size)
+                    if tile_data is None:
+                        logger.error("Failed to read Hextile raw tile")
+                        return False
+                    fb.write(tile_x, tile_y, tile_w, tile_h, tile_data)
+                    continue
+
+                colors_size = pixel_size * (bool(subencoding & HEXTILE_BACKGROUND_SPECIFIED)
+                                            + bool(subencoding & HEXTILE_FOREGROUND_SPECIFIED))
+                count_size = 1 if subencoding & HEXTILE_ANY_SUBRECTS else 0
+                tile_header = self._recv_exact(colors_size + count_size)
+                if tile_header is None:
+                    logger.error("Failed to read Hextile tile header")
+                    return False
+                pos = 0
+                if subencoding & HEXTILE_BACKGROUND_SPECIFIED:
+                    background = tile_header[pos:pos + pixel_size]
+                    pos += pixel_size
+                if subencoding & HEXTILE_FOREGROUND_SPECIFIED:
+                    foreground = tile_header[pos:pos + pixel_size]
+                fb.fill(tile_x, tile_y, tile_w, tile_h, background)
+                if not count_size:
+                    continue
+
+                colored = subencoding & HEXTILE_SUBRECTS_COLOURED
+                subrect_size = 2 + (pixel_size if colored else 0)
+                subrects = self._recv_exact(tile_header[-1] * subrect_size)
+                if subrects is None:
+                    logger.error("Failed to read Hextile subrectangles")
+                    return False
+                pixel = foreground
+                for pos in range(0, len(subrects), subrect_size):
+                    if colored:
+                        pixel = subrects[pos:pos + pixel_size]
+                    xy, wh = subrects[pos + subrect_size - 2], subrects[pos + subrect_size - 1]
+                    fb.fill(tile_x + (xy >> 4), tile_y + (xy & 0x0F), (wh >> 4) + 1, (wh & 0x0F) + 1, pixel)
+
+        return True
+
+    def _read_zrle_rect(self, x: int, y: int, width: int, height: int, fb: Framebuffer) -> bool:
+        """Read a ZRLE rectangle from the socket and draw it to the framebuffer."""
+        # 4-byte length followed by zlib-compressed tiles
+        length_data = self._recv_exact(4)
+        rect_data = self._recv_view(int.from_bytes(length_data, byteorder='big')) if length_data else None
+        if rect_data is None:
+            logger.error("Failed to read ZRLE rectangle data")
+            return False
+        return self._decode_zrle_rect(rect_data, x, y, width, height, fb)
+
+    def _read_desktop_size(self, x: int, y: int, width: int, height: int, fb: Framebuffer) -> bool:
+        """Handle a DesktopSize pseudo-rectangle, which carries no payload."""
+        self._resize_framebuffer(width, height, fb)
+        return True
+
+    def _read_tight_rect(self, x: int, y: int, width: int, height: int, fb: Framebuffer) -> bool:
+        """Read a Tight-encoded rectangle from the socket and draw it to the framebuffer.
+
+        Args:
+            x: X position of rectangle
+            y: Y position of rectangle
+            width: Width of rectangle
+            height: Height of rectangle
+            fb: Framebuffer to draw to
+
+        Returns:
+            bool: True if the rectangle was read; False means the stream is out of sync
+        """
+        control_data = self._recv_exact(1)
+        if not control_data:
+            logger.error("Failed to read Tight compression control")
+            return False
+        control = control_data[0]
+
+        # The low bits ask us to reset the corresponding zlib streams
+        for stream_id in range(4):
+            if control & (1 << stream_id):
+                self._tight_streams[stream_id] = zlib.decompressobj()
+        compression = control >> 4
+        tpixel = self._tight_pixel_size()
+
+        if compression == TIGHT_FILL:
+            color_data = self._recv_exact(tpixel)
+            if not color_data:
+                logger.error("Failed to read Tight fill colour")
+                return False
+            fb.fill(x, y, width, height, self._tight_pixels(color_data, 1).tobytes())
+            return True
+
+        if compression == TIGHT_JPEG:
+            length = self._read_tight_length()
+            jpeg_data = self._recv_view(length) if length is not None else None
+            if jpeg_data is None:
+                logger.error("Failed to read Tight JPEG data")
+                return False
+            try:
+                fb.put_rgb(x, y, np.asarray(Image.open(io.BytesIO(jpeg_data)).convert('RGB')))
+            except Exception as e:
+                logger.error(f"Error decoding Tight JPEG rectangle: {str(e)}")
+                fb.fill_rgb(x, y, width, height, (255, 0, 0))
+            return True
+
+        if compression & 0x8:
+            logger.error(f"Invalid Tight compression control: {control:#04x}")
+            return False
+
+        # Basic compression: optional filter, then zlib data from one of the four streams
+        filter_id = TIGHT_FILTER_COPY
+        if compression & 0x4:
+            filter_data = self._recv_exact(1)
+            if not filter_data:
+                return False
+            filter_id = filter_data[0]
+
+        palette = None
+        if filter_id == TIGHT_FILTER_PALETTE:
+            count_data = self._recv_exact(1)
+            palette_size = count_data[0] + 1 if count_data else 0
+            palette_data = self._recv_exact(palette_size * tpixel) if count_data else None
+            if not palette_data:
+                logger.error("Failed to read Tight palette")
+                return False
+            palette = self._tight_pixels(palette_data, palette_size)
+            row_size = (width + 7) // 8 if palette_size == 2 else width
+        elif filter_id in (TIGHT_FILTER_COPY, TIGHT_FILTER_GRADIENT):
+            row_size = width * tpixel
+        else:
+            logger.error(f"Invalid Tight filter: {filter_id}")
+            return False
+
+        data_size = row_size * height
+        if data_size < TIGHT_MIN_TO_COMPRESS:
+            data = self._recv_exact(data_size)
+        else:
+            length = self._read_tight_length()
+            compressed = self._recv_view(length) if length is not None else None
+            try:
+                data = self._tight_streams[compression & 0x3].decompress(compressed) if compressed else None
+            except zlib.error as e:
+                logger.error(f"Error inflating Tight rectangle: {str(e)}")
+                return False
+        if data is None or len(data) != data_size:
+            logger.error("Failed to read Tight rectangle data")
+            return False
+
+        if palette is not None:
+            if len(palette) == 2:
+                indices = np.asarray(Image.frombytes('P', (width, height), data, 'raw', 'P;1'))
+            else:
+                indices = np.frombuffer(data, dtype=np.uint8).reshape(height, width)
+            if indices.max(initial=0) >= len(palette):
+                logger.error("Tight palette index out of range")
+                return False
+            fb.put(x, y, palette[indices])
+        elif filter_id == TIGHT_FILTER_GRADIENT:
+            if tpixel == 3:
+                rgb = np.frombuffer(self._tight_gradient(data, width, height), dtype=np.uint8)
+                fb.put_rgb(x, y, rgb.reshape(height, width, 3))
+            elif self.pixel_format.true_color and tpixel in (2, 4):
+                fb.put(x, y, self._tight_gradient_pixels(data, width, height))
+            else:
+                # The filter is only defined for 16 and 32 bits per pixel true colour
+                logger.error(f"Tight gradient filter used with {self.pixel_format}")
+                return False
+        else:
+            fb.put(x, y, self._tight_pixels(data, width * height).reshape(height, width, -1))
+        return True
+
+    def _read_tight_length(self) -> Optional[int]:
+        """Read a Tight compact length (1-3 bytes, 7 bits per byte, least significant first)."""
+        length = 0
+        for shift in (0, 7, 14):
+            data = self._recv_exact(1)
+            if not data:
                 return None
+            if shift == 14:
+                return length | (data[0] << 14)
+            length |= (data[0] & 0x7F) << shift
+            if not data[0] & 0x80:
+                break
+        return length
+
+    def _tight_pixel_size(self) -> int:
+        """Bytes per Tight pixel (TPIXEL): packed RGB for 24-bit depth, a full pixel otherwise."""
+        fmt = self.pixel_format
+        if (fmt.true_color and fmt.bits_per_pixel == 32 and fmt.depth == 24
+                and (fmt.red_max, fmt.green_max, fmt.blue_max) == (255, 255, 255)):
+            return 3
+        return fmt.bits_per_pixel // 8
+
+    def _tight_pixels(self, data: bytes, count: int) -> np.ndarray:
+        """Convert Tight pixels to full pixels.
+
+        Returns:
+            np.ndarray: uint8 array of shape (count, bytes per pixel)
+        """
+        if self._tight_pixel_size() == 3:
+            # 3-byte TPIXELs are always in red, green, blue order
+            rgb = np.frombuffer(data, dtype=np.uint8, count=count * 3).reshape(count, 3)
+            return rgb_to_pixels(rgb, self.pixel_format)
+        pixel_size = self.pixel_format.bits_per_pixel // 8
+        return np.frombuffer(data, dtype=np.uint8, count=count * pixel_size).reshape(count, pixel_size)
+
+    @staticmethod
+    def _tight_gradient(data: bytes, width: int, height: int) -> bytes:
+        """Undo the Tight gradient filter on 24-bit RGB data."""
+        diffs = np.frombuffer(data, dtype=np.uint8, count=width * height * 3).reshape(height, width, 3)
+        return _undo_gradient(diffs, np.array([255, 255, 255])).astype(np.uint8).tobytes()
+
+    def _tight_gradient_pixels(self, data: bytes, width: int, height: int) -> np.ndarray:
+        """Undo the Tight gradient filter on 16 or 32-bit pixels, channel by channel.
+
+        Returns:
+            np.ndarray: uint8 array of shape (height, width, bytes per pixel)
+        """
+        fmt = self.pixel_format
+        values = pixel_values(self._tight_pixels(data, width * height).reshape(height, width, -1), fmt)
+        shifts = np.array([fmt.red_shift, fmt.green_shift, fmt.blue_shift], dtype=np.uint32)
+        maxes = np.array([fmt.red_max, fmt.green_max, fmt.blue_max], dtype=np.uint32)
+        channels = _undo_gradient((values[..., None] >> shifts) & maxes, maxes)
+        return packed_pixels(np.bitwise_or.reduce(channels.astype(np.uint32) << shifts, axis=-1), fmt)
+
+    def start_frame_receiver(self) -> bool:
+        """Start a background thread that keeps the framebuffer up to date.
+
+        The thread keeps an incremental FramebufferUpdateRequest outstanding and applies
+        updates as they arrive, so capture_screen() can return the latest frame without
+        a round trip. While it runs, the thread owns all reads from the socket.
+
+        Returns:
+            bool: True if the receiver is running
+        """
+        if self.frame_receiver_running():
+            return True
+        if not self.socket:
+            logger.error("Not connected to remote MacOs machine")
+            return False
+
+        self._receiver_stop.clear()
+        # The receiver reads every update, including replies still in flight
+        self._update_pending = False
+        self._acks_pending = 0
+        self._receiver = threading.Thread(target=self._receive_frames, name=f"vnc-receiver-{self.host}",
+                                          daemon=True)
+        self._receiver.start()
+        logger.info(f"Started background frame receiver for {self.host}:{self.port}")
+        return True
 
-            # Use incremental updates if we have a previous frame
-            is_incremental = self._last_frame is not None
+    def stop_frame_receiver(self, timeout: float = 2.0, drain: bool = True) -> None:
+        """Stop the background frame receiver thread.
 
-            # Create or reuse image
-            if is_incremental:
-                img = self._last_frame
+        If the thread does not finish in time, it may still be reading from the socket, so the
+        connection is closed and the pool replaces it.
+
+        Args:
+            timeout: Seconds to wait for the thread to finish
+            drain: Read the replies to its requests that are already on their way (see
+                   _drain_updates())
+        """
+        receiver = self._receiver
+        if receiver is None:
+            return
+        self._receiver_stop.set()
+        if receiver is threading.current_thread():
+            # Called from a message handler; the loop ends after this message
+            self._receiver = None
+            self._update_pending = self.socket is not None
+            return
+        receiver.join(timeout)
+        self._receiver = None
+        if receiver.is_alive():
+            logger.warning("Frame receiver for %s:%s did not stop, closing connection", self.host, self.port)
+            self.close()
+            return
+        self._update_pending = self.socket is not None
+        if drain and self.socket:
+            self._drain_updates(RECEIVER_DRAIN_TIMEOUT)
+
+    def _drain_updates(self, timeout: float) -> None:
+        """Apply the replies to requests of a stopped frame receiver that arrive within the timeout.
+
+        Otherwise a reply already in flight would be read as the reply to the next request.
+        On a broken stream the connection is closed.
+
+        Args:
+            timeout: Seconds to wait for the replies
+        """
+        deadline = time.monotonic() + timeout
+        try:
+            while self._update_pending or self._acks_pending:
+                if not self._reader.buffered:
+                    readable, _, _ = select.select([self.socket], [], [], max(deadline - time.monotonic(), 0))
+                    if not readable:
+                        return
+                if not self._read_unsolicited():
+                    break
             else:
-                img = Image.new('RGB', (self.width, self.height), color='black')
-
-            # Send FramebufferUpdateRequest message
-            msg = bytearray([3])  # message type 3 = FramebufferUpdateRequest
-            msg.extend([1 if is_incremental else 0])  # Use incremental updates when possible
-            msg.extend(int(0).to_bytes(2, byteorder='big'))  # x-position
-            msg.extend(int(0).to_bytes(2, byteorder='big'))  # y-position
-            msg.extend(int(self.width).to_bytes(2, byteorder='big'))  # width
-            msg.extend(int(self.height).to_bytes(2, byteorder='big'))  # height
-
-            self.socket.sendall(msg)
-
-            # Receive FramebufferUpdate message header with larger buffer
-            header = self._recv_exact(4)
-            if not header or header[0] != 0:  # 0 = FramebufferUpdate
-                logger.error(f"Unexpected message type in response: {header[0] if header else 'None'}")
+                return
+        except Exception as e:
+            logger.debug("Draining the frame receiver's updates failed: %s", e)
+        logger.error("Failed to read the frame receiver's last update, closing connection")
+        self.close()
+
+    def frame_receiver_running(self) -> bool:
+        """Return True if the background frame receiver thread is alive."""
+        return self._receiver is not None and self._receiver.is_alive()
+
+    def get_latest_frame(self, timeout: float = 10.0, region: Optional[Rect] = None,
+                         show_cursor: bool = False) -> Optional[Image.Image]:
+        """Return a copy of the latest complete frame from the background receiver.
+
+        Args:
+            timeout: Seconds to wait for the first frame after the receiver started
+            region: (x, y, width, height) to return (default: the whole screen)
+            show_cursor: Draw the mouse pointer, when the server leaves drawing it to us
+
+        Returns:
+            Optional[Image.Image]: Copy of the framebuffer, or None if no frame arrived in time
+        """
+        with self._frame_ready:
+            self._frame_ready.wait_for(
+                lambda: self.frame_sequence > 0 or not self.frame_receiver_running(), timeout)
+            if self.framebuffer is None:
                 return None
+            return self._framebuffer_image(region, show_cursor)
+
+    def wait_for_screen(self, until: str = "change", region: Optional[Rect] = None, stable_ms: int = 500,
+                        timeout: float = 10.0) -> Optional[Dict[str, Any]]:
+        """Wait until the screen changes, or until it has stopped changing.
 
-            # Read number of rectangles
-            num_rects = int.from_bytes(header[2:4], byteorder='big')
-            logger.debug(f"Received {num_rects} rectangles")
+        Starts the background frame receiver if needed and watches the incremental updates
+        it applies, so no screenshots are taken while waiting. A receiver started here is
+        stopped again before returning. Updates that repaint a region with identical pixels
+        do not count as changes.
+
+        Args:
+            until: "change" to return on the first change, or "stable" to return once nothing
+                   has changed for stable_ms
+            region: (x, y, width, height) to watch, in screen pixels (default: the whole screen)
+            stable_ms: Quiet period in milliseconds for "stable"
+            timeout: Maximum seconds to wait
 
-            # Process each rectangle
-            for rect_idx in range(num_rects):
-                # Read rectangle header efficiently
-                rect_header = self._recv_exact(12)
-                if not rect_header:
-                    logger.error("Failed to read rectangle header")
+        Returns:
+            Optional[Dict[str, Any]]: "status" ("changed", "stable" or "timeout"), "elapsed_ms",
+                                      "changes" (number of changing updates seen) and "frame"
+                                      (identifier of the latest frame), or None if the
+                                      connection failed
+        """
+        if until not in ("change", "stable"):
+            raise ValueError(f"until must be 'change' or 'stable', got {until}")
+        started_receiver = not self.frame_receiver_running()
+        if not self.start_frame_receiver():
+            return None
+        try:
+            return self._wait_for_frames(until, region, stable_ms, timeout)
+        finally:
+            if started_receiver:
+                self.stop_frame_receiver()
+
+    def _wait_for_frames(self, until: str, region: Optional[Rect], stable_ms: int,
+                         timeout: float) -> Optional[Dict[str, Any]]:
+        """Watch the updates of the running frame receiver; see wait_for_screen()."""
+        start = time.monotonic()
+        deadline = start + timeout
+        with self._frame_ready:
+            self._frame_ready.wait_for(
+                lambda: self.frame_sequence > 0 or not self.frame_receiver_running(), timeout)
+            if self.framebuffer is None:
+                return None
+
+            def watched_pixels() -> np.ndarray:
+                x, y, width, height = region or (0, 0, self.framebuffer.width, self.framebuffer.height)
+                return self.framebuffer.pixels[y:y + height, x:x + width].copy()
+
+            seen = self.frame_sequence
+            reference = watched_pixels()
+            last_change = start
+            changes = 0
+            status = "timeout"
+            while True:
+                now = time.monotonic()
+                if until == "stable" and now - last_change >= stable_ms / 1000:
+                    status = "stable"
+                    break
+                if now >= deadline:
+                    break
+                wake = deadline if until == "change" else min(deadline, last_change + stable_ms / 1000)
+                self._frame_ready.wait(wake - now)
+                if not self.frame_receiver_running():
                     return None
+                # Only compare pixels when an update touched the watched region
+                touched = (self._frame_changes[0][0] > seen + 1  # history overflowed, check anyway
+                           or any(_overlaps(rect, region) for sequence, changed in self._frame_changes
+                                  if sequence > seen for rect in changed))
+                seen = self.frame_sequence
+                if not touched:
+                    continue
+                current = watched_pixels()
+                if current.shape == reference.shape and np.array_equal(current, reference):
+                    continue
+                reference = current
+                changes += 1
+                last_change = time.monotonic()
+                if until == "change":
+                    status = "changed"
+                    break
 
-                x = int.from_bytes(rect_header[0:2], byteorder='big')
-                y = int.from_bytes(rect_header[2:4], byteorder='big')
-                width = int.from_bytes(rect_header[4:6], byteorder='big')
-                height = int.from_bytes(rect_header[6:8], byteorder='big')
-                encoding_type = int.from_bytes(rect_header[8:12], byteorder='big', signed=True)
-
-                if encoding_type == Encoding.RAW:
-                    # Optimize RAW encoding processing
-                    pixel_size = self.pixel_format.bits_per_pixel // 8
-                    data_size = width * height * pixel_size
-
-                    # Read pixel data in chunks
-                    rect_data = self._recv_exact(data_size)
-                    if not rect_data or len(rect_data) != data_size:
-                        logger.error(f"Failed to read RAW rectangle data")
-                        return None
+            return {"status": status, "elapsed_ms": int((time.monotonic() - start) * 1000), "changes": changes,
+                    "frame": f"{self.session_id}:{self.frame_sequence}"}
 
-                    # Decode and draw
-                    self._decode_raw_rect(rect_data, x, y, width, height, img)
+    def frame_age(self) -> Optional[float]:
+        """Return the age of the latest frame in seconds, or None if there is no frame."""
+        if self.frame_timestamp is None:
+            return None
+        return time.monotonic() - self.frame_timestamp
 
-                elif encoding_type == Encoding.COPY_RECT:
-                    # Optimize COPY_RECT processing
-                    rect_data = self._recv_exact(4)
-                    if not rect_data:
-                        logger.error("Failed to read COPY_RECT data")
-                        return None
-                    self._decode_copy_rect(rect_data, x, y, width, height, img)
-
-                elif encoding_type == Encoding.DESKTOP_SIZE:
-                    # Handle desktop size changes
-                    logger.debug(f"Desktop size changed to {width}x{height}")
-                    self.width = width
-                    self.height = height
-                    new_img = Image.new('RGB', (self.width, self.height), color='black')
-                    new_img.paste(img, (0, 0))
-                    img = new_img
-                else:
-                    logger.warning(f"Unsupported encoding type: {encoding_type}")
+    def _receive_frames(self) -> None:
+        """Background loop that keeps an incremental update request outstanding."""
+        try:
+            self._send(self._framebuffer_update_request(self.framebuffer is not None))
+            while not self._receiver_stop.is_set():
+                # Wait for the next message; a quiet socket just means the screen is idle
+                if not self._reader.buffered:
+                    readable, _, _ = select.select([self.socket], [], [], RECEIVER_POLL_INTERVAL)
+                    if not readable:
+                        continue
+
+                # Only an update that starts after a round trip request was sent can answer it
+                acks = self._acks_pending
+                message_type = self._recv_exact(1)
+                if not message_type:
+                    logger.error("Connection closed by server")
+                    break
+                if message_type[0] != ServerMessage.FRAMEBUFFER_UPDATE:
+                    # Handlers change state that other threads read and wait for (colour map, clipboard)
+                    with self._frame_ready:
+                        if not self._dispatch_message(message_type[0]):
+                            break
+                        self._frame_ready.notify_all()
                     continue
 
-            # Store the frame for future incremental updates
-            self._last_frame = img
+                # Apply the whole update before publishing it as the latest frame
+                with self._frame_ready:
+                    if self.framebuffer is None:
+                        self.framebuffer = self._new_framebuffer()
+                    if not self._read_framebuffer_update(self.framebuffer):
+                        break
+                    self._frame_applied(self.framebuffer)
+                    if acks and self._acks_pending:
+                        self._acks_pending -= 1
+                    self._frame_ready.notify_all()
 
-            # Convert image to PNG with optimization
-            img_byte_arr = io.BytesIO()
-            img.save(img_byte_arr, format='PNG', optimize=True, quality=95)
-            img_byte_arr.seek(0)
+                self._send(self._framebuffer_update_request(True))
+        except Exception as e:
+            if not self._receiver_stop.is_set():
+                logger.error(f"Frame receiver error: {str(e)}")
+        finally:
+            if not self._receiver_stop.is_set():
+                # The stream is out of sync; drop the connection so it gets replaced
+                logger.warning(f"Frame receiver for {self.host}:{self.port} stopped, closing connection")
+                self._receiver = None
+                self.close()
+            with self._frame_ready:
+                self._frame_ready.notify_all()
+
+    def _send(self, data: bytes) -> None:
+        """Send a complete message. Safe to call from several threads."""
+        with self._send_lock:
+            self.socket.sendall(data)
+
+    def _recv_into(self, view: memoryview) -> bool:
+        """Receive exactly len(view) bytes from the socket into a writable buffer."""
+        try:
+            self._reader.readinto(view)
+            return True
+        except Exception as e:
+            logger.error(f"Error receiving data: {str(e)}")
+            return False
 
-            return img_byte_arr.getvalue()
+    def _recv_view(self, size: int) -> Optional[memoryview]:
+        """Receive exactly size bytes without copying them.
 
+        The view is only valid until the next receive, so it must be consumed
+        (decompressed, decoded or written to the framebuffer) straight away.
+        """
+        try:
+            return self._reader.read(size)
         except Exception as e:
-            logger.error(f"Error capturing screen: {str(e)}")
+            logger.error(f"Error receiving data: {str(e)}")
             return None
 
+    def _skip(self, size: int) -> bool:
+        """Receive and discard size bytes, SKIP_CHUNK_SIZE at a time."""
+        while size > 0:
+            if self._recv_view(min(size, SKIP_CHUNK_SIZE)) is None:
+                return False
+            size -= SKIP_CHUNK_SIZE
+        return True
+
     def _recv_exact(self, size: int) -> Optional[bytes]:
-        """Receive exactly size bytes from the socket efficiently."""
+        """Receive exactly size bytes from the socket."""
+        data = self._recv_view(size)
+        return bytes(data) if data is not None else None
+
+    def is_alive(self) -> bool:
+        """Check without blocking whether the connection can still be used.
+
+        Messages the server sent on its own while the connection was idle (bells, clipboard
+        changes) are dispatched here.
+
+        Returns:
+            bool: False if the socket is closed, has failed, or holds data we did not ask for
+                  (the protocol stream can no longer be trusted in that case)
+        """
+        if not self.socket:
+            return False
+        if self._receiver is not None:
+            # The receiver owns the socket; it closes the connection when the stream fails
+            return self.frame_receiver_running()
         try:
-            data = bytearray()
-            while len(data) < size:
-                chunk = self.socket.recv(min(self._socket_buffer_size, size - len(data)))
-                if not chunk:
-                    return None
-                data.extend(chunk)
-            return bytes(data)
+            while True:
+                if not self._reader.buffered:
+                    readable, _, errored = select.select([self.socket], [], [self.socket], 0)
+                    if errored:
+                        return False
+                    if not readable:
+                        return True
+                if not self._read_unsolicited():
+                    return False
         except Exception as e:
-            logger.error(f"Error receiving data: {str(e)}")
-            return None
+            logger.debug("Health check failed: %s", e)
+            return False
+
+    def _read_unsolicited(self) -> bool:
+        """Read one server message that arrived while no request was waiting for its reply.
+
+        Returns:
+            bool: False if it could not be read or is a FramebufferUpdate nobody asked for (the
+                  protocol stream can no longer be trusted in that case)
+        """
+        message_type = self._recv_exact(1)
+        if not message_type:
+            return False
+        if message_type[0] != ServerMessage.FRAMEBUFFER_UPDATE:
+            return self._dispatch_message(message_type[0])
+        # Only replies to requests of a stopped frame receiver or a timed out round trip are expected
+        if self._acks_pending:
+            self._acks_pending -= 1
+        elif self._update_pending:
+            self._update_pending = False
+        else:
+            return False
+        return self._apply_update()
 
     def close(self):
         """Close the connection to the remote MacOs machine."""
+        self.stop_frame_receiver(drain=False)
         if self.socket:
             try:
                 self.socket.close()
@@ -779,12 +2376,11 @@ class VNCClient:
                 pass
             self.socket = None
 
-    def send_key_event(self, key: int, down: bool) -> bool:
-        """Send a key event to the remote MacOs machine.
+    def send_events(self, events: EventWriter) -> bool:
+        """Send the buffered input events of one logical action in a single write.
 
         Args:
-            key: X11 keysym value representing the key
-            down: True for key press, False for key release
+            events: Writer from _event_writer() holding the events; it is emptied
 
         Returns:
             bool: True if successful, False otherwise
@@ -794,20 +2390,36 @@ class VNCClient:
                 logger.error("Not connected to remote MacOs machine")
                 return False
 
-            # Message type 4 = KeyEvent
-            message = bytearray([4])
+            count = events.count
+            data = events.take()
+            if data:
+                event_logger.debug("Sending %d input events (%d bytes)", count, len(data))
+                self._send(data)
+                if events.position is not None:
+                    self.pointer_position = events.position
+            return True
 
-            # Down flag (1 = pressed, 0 = released)
-            message.extend([1 if down else 0])
+        except Exception as e:
+            logger.error(f"Error sending input events: {str(e)}")
+            return False
+
+    def send_key_event(self, key: int, down: bool) -> bool:
+        """Send a key event to the remote MacOs machine.
 
-            # Padding (2 bytes)
-            message.extend([0, 0])
+        Args:
+            key: X11 keysym value representing the key
+            down: True for key press, False for key release
 
-            # Key (4 bytes, big endian)
-            message.extend(key.to_bytes(4, byteorder='big'))
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            if not self.socket:
+                logger.error("Not connected to remote MacOs machine")
+                return False
 
-            logger.debug(f"Sending KeyEvent: key=0x{key:08x}, down={down}")
-            self.socket.sendall(message)
+            event_logger.debug("Sending KeyEvent: key=0x%08x, down=%s", key, down)
+            self._send(self._key_event_message(key, down))
             return True
 
         except Exception as e:
@@ -837,24 +2449,8 @@ class VNCClient:
                 logger.error("Not connected to remote MacOs machine")
                 return False
 
-            # Ensure coordinates are within framebuffer bounds
-            x = max(0, min(x, self.width - 1))
-            y = max(0, min(y, self.height - 1))
-
-            # Message type 5 = PointerEvent
-            message = bytearray([5])
-
-            # Button mask (1 byte)
-            message.extend([button_mask & 0xFF])
-
-            # X position (2 bytes, big endian)
-            message.extend(x.to_bytes(2, byteorder='big'))
-
-            # Y position (2 bytes, big endian)
-            message.extend(y.to_bytes(2, byteorder='big'))
-
-            logger.debug(f"Sending PointerEvent: x={x}, y={y}, button_mask={button_mask:08b}")
-            self.socket.sendall(message)
+            event_logger.debug("Sending PointerEvent: x=%d, y=%d, button_mask=0x%02x", x, y, button_mask)
+            self._send(self._pointer_event_message(x, y, button_mask))
             return True
 
         except Exception as e:
@@ -881,109 +2477,220 @@ class VNCClient:
 
             # Calculate button mask
             button_mask = 1 << (button - 1)
+            events = self._event_writer()
+
+            # Move mouse to position first (no buttons pressed), then press
+            events.pointer(x, y, 0).pointer(x, y, button_mask)
+            for click in range(2 if double_click else 1):
+                if click:
+                    # Wait between clicks, then press again
+                    time.sleep(delay_ms / 1000.0)
+                    events.pointer(x, y, button_mask)
+                if not self.send_events(events):
+                    return False
 
-            # Move mouse to position first (no buttons pressed)
-            if not self.send_pointer_event(x, y, 0):
-                return False
+                # Wait for press-release delay, then release
+                time.sleep(delay_ms / 1000.0)
+                if not self.send_events(events.pointer(x, y, 0)):
+                    return False
 
-            # Single click or first click of double-click
-            if not self.send_pointer_event(x, y, button_mask):
-                return False
+            return True
 
-            # Wait for press-release delay
-            time.sleep(delay_ms / 1000.0)
+        except Exception as e:
+            logger.error(f"Error sending mouse click: {str(e)}")
+            return False
 
-            # Release button
-            if not self.send_pointer_event(x, y, 0):
-                return False
+    def send_text(self, text: str, mode: Optional[str] = None) -> bool:
+        """Type text as key press/release events, or paste it when it is long.
 
-            # If double click, perform second click
-            if double_click:
-                # Wait between clicks
-                time.sleep(delay_ms / 1000.0)
+        If VNC_PASTE_THRESHOLD is set, text of that many characters or more is pasted (see
+        paste_text()) when the clipboard can carry it. Otherwise the keystrokes are paced by a TypingPacer: in "adaptive" mode
+        they are sent in bursts, each acknowledged by the server before the next one.
 
-                # Second press
-                if not self.send_pointer_event(x, y, button_mask):
-                    return False
+        Args:
+            text: The text to send
+            mode: "adaptive" or "fixed" (default: VNC_TYPING_MODE)
 
-                # Wait for press-release delay
-                time.sleep(delay_ms / 1000.0)
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            if not self.socket:
+                logger.error("Not connected to remote MacOs machine")
+                return False
 
-                # Second release
-                if not self.send_pointer_event(x, y, 0):
+            if VNC_PASTE_THRESHOLD and len(text) >= VNC_PASTE_THRESHOLD and self.clipboard.can_send(text):
+                return self.paste_text(text)
+
+            pacer = TypingPacer(mode)
+            events = self._event_writer()
+            for burst in pacer.bursts(text):
+                # Shift (if needed), key presses and releases of the burst go out in one write
+                for char in burst:
+                    key, need_shift = self._char_to_keysym(char)
+                    events.keystroke(key, need_shift)
+                if not self.send_events(events):
                     return False
 
+                if pacer.adaptive:
+                    # Let the server catch up before the next burst
+                    pacer.acknowledged(self.round_trip(ACK_TIMEOUT))
+                else:
+                    # Small delay between keys to avoid overwhelming the server
+                    time.sleep(pacer.delay)
+
             return True
 
         except Exception as e:
-            logger.error(f"Error sending mouse click: {str(e)}")
+            logger.error(f"Error sending text: {str(e)}")
             return False
 
-    def send_text(self, text: str) -> bool:
-        """Send text as a series of key press/release events.
+    def paste_text(self, text: str) -> bool:
+        """Paste text by setting the remote clipboard (ClientCutText) and pressing Command+V.
+
+        Much faster than typing long text, but it replaces the clipboard contents of the
+        remote Mac. See set_clipboard() for the text that can be pasted.
 
         Args:
-            text: The text to send
+            text: The text to paste
 
         Returns:
             bool: True if successful, False otherwise
         """
+        logger.debug("Pasting %d characters through the clipboard", len(text))
+        if not self.set_clipboard(text):
+            return False
+        return self.send_key_combination([COMMAND_KEYSYM, ord('v')])
+
+    def set_clipboard(self, text: str) -> bool:
+        """Put text on the clipboard of the remote Mac.
+
+        Without the extended clipboard (UTF-8) the server only accepts Latin-1 text.
+
+        Args:
+            text: The text to put on the clipboard
+
+        Returns:
+            bool: True once the server has processed it, False otherwise
+        """
         try:
             if not self.socket:
                 logger.error("Not connected to remote MacOs machine")
                 return False
 
-            # Standard ASCII to X11 keysym mapping for printable ASCII characters
-            # For most characters, the keysym is just the ASCII value
-            success = True
-
-            for char in text:
-                # Special key mapping for common non-printable characters
-                if char == '\n' or char == '\r':  # Return/Enter
-                    key = 0xff0d
-                elif char == '\t':  # Tab
-                    key = 0xff09
-                elif char == '\b':  # Backspace
-                    key = 0xff08
-                elif char == ' ':  # Space
-                    key = 0x20
-                else:
-                    # For printable ASCII and Unicode characters
-                    key = ord(char)
+            self._send(self.clipboard.set_message(text))
+            # Make sure the clipboard is set before anything relies on it
+            return self.round_trip(ACK_TIMEOUT) is not None
 
-                # If it's an uppercase letter, we need to simulate a shift press
-                need_shift = char.isupper() or char in '~!@#$%^&*()_+{}|:"<>?'
+        except Exception as e:
+            logger.error(f"Error setting clipboard: {str(e)}")
+            return False
 
-                if need_shift:
-                    # Press shift (left shift keysym = 0xffe1)
-                    if not self.send_key_event(0xffe1, True):
-                        success = False
-                        break
+    def get_clipboard(self, copy_selection: bool = False, timeout: float = 3.0) -> Optional[str]:
+        """Read the clipboard of the remote Mac.
 
-                # Press key
-                if not self.send_key_event(key, True):
-                    success = False
-                    break
+        The server sends the clipboard text (ServerCutText) whenever it changes; with the
+        extended clipboard it can also be asked for the current text.
 
-                # Release key
-                if not self.send_key_event(key, False):
-                    success = False
-                    break
+        Args:
+            copy_selection: Press Command+C first and wait for the copied text
+            timeout: Seconds to wait for clipboard text from the server
+
+        Returns:
+            Optional[str]: The clipboard text, or None if none arrived in time
+        """
+        try:
+            if not self.socket:
+                logger.error("Not connected to remote MacOs machine")
+                return None
 
-                if need_shift:
-                    # Release shift
-                    if not self.send_key_event(0xffe1, False):
-                        success = False
+            sequence = self.clipboard.sequence
+            if copy_selection:
+                if not self.send_key_combination([COMMAND_KEYSYM, ord('c')]):
+                    return None
+            else:
+                request = self.clipboard.request_message()
+                if request is None and self.clipboard.text is not None:
+                    # The server cannot be asked; it has sent every change so far
+                    return self.clipboard.text
+                if request is not None:
+                    self._send(request)
+
+            def received() -> bool:
+                return self.clipboard.sequence != sequence
+
+            deadline = time.monotonic() + timeout
+            if self.frame_receiver_running():
+                with self._frame_ready:
+                    self._frame_ready.wait_for(lambda: received() or not self.frame_receiver_running(), timeout)
+            else:
+                # Clipboard messages are read while waiting for update replies
+                while not received() and time.monotonic() < deadline:
+                    if self.round_trip(max(deadline - time.monotonic(), 0.1)) is None:
                         break
+                    if not received():
+                        time.sleep(0.1)
+
+            if not received():
+                logger.debug("No clipboard text received within %ss", timeout)
+                return None
+            return self.clipboard.text
+
+        except Exception as e:
+            logger.error(f"Error reading clipboard: {str(e)}")
+            return None
+
+    def round_trip(self, timeout: float = ACK_TIMEOUT) -> Optional[float]:
+        """Measure how long the server takes to process everything sent so far.
+
+        A non-incremental update request for a single pixel must be answered right away,
+        and the server handles messages in order, so its reply acknowledges all earlier
+        input.
+
+        Args:
+            timeout: Seconds to wait for the reply
 
-                # Small delay between keys to avoid overwhelming the server
-                time.sleep(0.01)
+        Returns:
+            Optional[float]: Seconds until the reply, or None if it did not arrive in time. A
+                             late reply leaves the connection usable; it is read before the
+                             reply to the next request.
+        """
+        start = time.monotonic()
+        try:
+            if not self.socket:
+                return None
 
-            return success
+            if self.frame_receiver_running():
+                # The receiver reads the reply; wait until it has counted it off
+                with self._frame_ready:
+                    self._send(self._framebuffer_update_request(False, (0, 0, 1, 1)))
+                    self._acks_pending += 1
+                    if not self._frame_ready.wait_for(
+                            lambda: not self._acks_pending or not self.frame_receiver_running(), timeout):
+                        return None
+                    if self._acks_pending:
+                        return None
+            else:
+                self._send(self._framebuffer_update_request(False, (0, 0, 1, 1)))
+                self._acks_pending += 1
+                deadline = start + timeout
+                while self._acks_pending:
+                    # Bound the wait for the reply to start; the socket timeout is much longer
+                    if not self._reader.buffered:
+                        readable, _, _ = select.select([self.socket], [], [], max(deadline - time.monotonic(), 0))
+                        if not readable:
+                            # Still in flight; the next round trip or capture reads it first
+                            return None
+                    if not self._read_ack():
+                        # Part of the reply may still be in flight, so the stream cannot be trusted
+                        self.close()
+                        return None
+
+            return time.monotonic() - start
 
         except Exception as e:
-            logger.error(f"Error sending text: {str(e)}")
-            return False
+            logger.error(f"Error waiting for the server: {str(e)}")
+            return None
 
     def send_key_combination(self, keys: List[int]) -> bool:
         """Send a key combination (e.g., Ctrl+Alt+Delete).
@@ -999,17 +2706,8 @@ class VNCClient:
                 logger.error("Not connected to remote MacOs machine")
                 return False
 
-            # Press all keys in sequence
-            for key in keys:
-                if not self.send_key_event(key, True):
-                    return False
-
-            # Release all keys in reverse order
-            for key in reversed(keys):
-                if not self.send_key_event(key, False):
-                    return False
-
-            return True
+            # Press all keys in sequence and release them in reverse order, in one write
+            return self.send_events(self._event_writer().key_combination(keys))
 
         except Exception as e:
             logger.error(f"Error sending key combination: {str(e)}")
@@ -0,0 +1,327 @@
+import os
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Tuple, List, Dict, Iterator
+
+from vnc_client import VNCClient
+from metrics import metrics
+
+logger = logging.getLogger('vnc_session')
+
+# Pool configuration
+VNC_POOL_MAX_SIZE = int(os.environ.get('VNC_POOL_MAX_SIZE', '2'))
+VNC_POOL_IDLE_TIMEOUT = float(os.environ.get('VNC_POOL_IDLE_TIMEOUT', '300'))
+VNC_POOL_ACQUIRE_TIMEOUT = float(os.environ.get('VNC_POOL_ACQUIRE_TIMEOUT', '30'))
+# Keep a background frame receiver running on every pooled connection
+VNC_FRAME_RECEIVER = os.environ.get('VNC_FRAME_RECEIVER', '').lower() in ('1', 'true', 'yes', 'on')
+
+# Sessions are shared per (host, port, username)
+SessionKey = Tuple[str, int, str]
+
+
+class PooledSession:
+    """Book-keeping for a single pooled VNC connection."""
+
+    def __init__(self, client: VNCClient, key: SessionKey):
+        self.client = client
+        self.key = key
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+        self.retired = False
+
+
+class PinnedSession:
+    """A connection held for a sequence of tool calls (see VNCSessionPool.pinned())."""
+
+    def __init__(self, client: VNCClient, key: SessionKey):
+        self.client = client
+        self.key = key
+        self.discard = False  # Set when a call released the client with discard=True
+
+
+# Connection that acquire() hands out again instead of taking another one. A context
+# variable, so that it follows the caller into asyncio tasks and asyncio.to_thread() workers.
+_pinned_session: ContextVar[Optional[PinnedSession]] = ContextVar('vnc_pinned_session', default=None)
+
+
+class VNCSessionPool:
+    """Pool of authenticated VNC connections kept open across MCP tool calls.
+
+    Connections are keyed by (host, port, username). Each key holds at most
+    ``max_size`` open connections; callers beyond that wait for a connection to be
+    released. Idle connections are health-checked before reuse, transparently
+    replaced when they have died, and closed once they have been idle for longer
+    than ``idle_timeout`` seconds.
+    """
+
+    def __init__(self, max_size: int = VNC_POOL_MAX_SIZE, idle_timeout: float = VNC_POOL_IDLE_TIMEOUT,
+                 acquire_timeout: float = VNC_POOL_ACQUIRE_TIMEOUT, frame_receiver: bool = VNC_FRAME_RECEIVER):
+        """Initialize the session pool.
+
+        Args:
+            max_size: Maximum number of open connections per (host, port, username)
+            idle_timeout: Seconds an unused connection is kept open (0 disables pooling)
+            acquire_timeout: Seconds to wait for a free connection when the pool is full
+            frame_receiver: Start the background frame receiver on new connections, so
+                            screenshots return the latest frame without a round trip
+        """
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.frame_receiver = frame_receiver
+        self._lock = threading.Condition()
+        self._idle: Dict[SessionKey, List[PooledSession]] = {}
+        self._sizes: Dict[SessionKey, int] = {}
+        self._in_use: Dict[int, PooledSession] = {}
+        self._reaper: Optional[threading.Thread] = None
+        logger.debug(f"Initialized VNC session pool: max_size={self.max_size}, "
+                     f"idle_timeout={self.idle_timeout}s, acquire_timeout={self.acquire_timeout}s")
+
+    def acquire(self, host: str, port: int, password: str, username: Optional[str] = None,
+                encryption: str = "prefer_on") -> Tuple[Optional[VNCClient], Optional[str]]:
+        """Get a connected VNC client, reusing a pooled connection when possible.
+
+        Every successful call must be paired with a call to release().
+
+        Args:
+            host: remote MacOs machine hostname or IP address
+            port: remote MacOs machine port
+            password: remote MacOs machine password
+            username: remote MacOs machine username (optional)
+            encryption: Encryption preference (default: "prefer_on")
+
+        Returns:
+            Tuple[Optional[VNCClient], Optional[str]]: (client, error_message) where client is None
+                                                       if no connection could be established
+        """
+        key = (host, port, username or "")
+        pinned = _pinned_session.get()
+        if pinned is not None and pinned.key == key:
+            if pinned.discard:
+                return None, "The pinned VNC session was lost after an earlier error"
+            return pinned.client, None
+        deadline = time.monotonic() + self.acquire_timeout
+
+        while True:
+            with self._lock:
+                self._evict_idle_locked()
+                session, error_msg = self._reserve_locked(key, deadline)
+            if error_msg:
+                logger.error(error_msg)
+                metrics.increment("vnc_pool_acquires_total", result="timeout")
+                return None, error_msg
+            if session is None:
+                # A slot was reserved; the handshake itself happens outside the lock
+                break
+
+            # The health check does socket I/O, so it runs without holding up other acquires
+            if session.client.is_alive():
+                with self._lock:
+                    session.last_used = time.monotonic()
+                    session.uses += 1
+                logger.debug("Reusing pooled VNC session to %s:%s (use #%d)", host, port, session.uses)
+                metrics.increment("vnc_pool_acquires_total", result="reused")
+                return session.client, None
+            logger.info(f"Pooled VNC session to {host}:{port} failed health check, reconnecting")
+            with self._lock:
+                self._in_use.pop(id(session.client), None)
+                self._discard_locked(session)
+
+        client = None
+        try:
+            client = VNCClient(host=host, port=port, password=password, username=username, encryption=encryption)
+            success, error_message = client.connect()
+        except Exception as e:
+            success, error_message = False, f"Error connecting to {host}:{port}: {str(e)}"
+            logger.error(error_message)
+        metrics.increment("vnc_connects_total", result="success" if success else "failure")
+
+        with self._lock:
+            if not success:
+                # Give the reserved slot back, however the connection failed
+                if client is not None:
+                    client.close()
+                self._sizes[key] -= 1
+                self._lock.notify_all()
+                metrics.increment("vnc_pool_acquires_total", result="failed")
+                return None, error_message
+
+            if self.frame_receiver:
+                client.start_frame_receiver()
+            session = PooledSession(client, key)
+            session.uses = 1
+            self._in_use[id(client)] = session
+            self._ensure_reaper_locked()
+            metrics.increment("vnc_pool_acquires_total", result="new")
+            logger.info(f"Opened new pooled VNC session to {host}:{port} "
+                        f"({self._sizes[key]}/{self.max_size} for this host)")
+            return client, None
+
+    def _reserve_locked(self, key: SessionKey,
+                        deadline: float) -> Tuple[Optional[PooledSession], Optional[str]]:
+        """Take an idle session or a free slot for a key, waiting until the deadline.
+
+        An idle session is moved to the in-use sessions before its health check, so
+        close_all() retires it like any other session in use. Caller must hold the lock.
+
+        Returns:
+            Tuple[Optional[PooledSession], Optional[str]]: (session, error_message) where
+                session is None if a slot was reserved for a new connection, and
+                error_message is set if the deadline passed
+        """
+        while True:
+            idle = self._idle.get(key)
+            if idle:
+                session = idle.pop()
+                self._in_use[id(session.client)] = session
+                return session, None
+
+            if self._sizes.get(key, 0) < self.max_size:
+                self._sizes[key] = self._sizes.get(key, 0) + 1
+                return None, None
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None, (f"Timed out waiting for a free VNC session to {key[0]}:{key[1]} "
+                              f"(pool size {self.max_size})")
+            self._lock.wait(remaining)
+
+    def release(self, client: VNCClient, discard: bool = False) -> None:
+        """Return a client obtained from acquire() to the pool.
+
+        Args:
+            client: The client to return
+            discard: Close the connection instead of keeping it for reuse, e.g. when
+                     the protocol stream may be out of sync after an error
+        """
+        pinned = _pinned_session.get()
+        if pinned is not None and pinned.client is client:
+            # Still held by the pin; remember the failure for its final release
+            pinned.discard = pinned.discard or discard
+            return
+
+        with self._lock:
+            session = self._in_use.pop(id(client), None)
+            if session is None:
+                logger.warning("Released a VNC client that does not belong to the pool, closing it")
+                client.close()
+                return
+
+            if discard or session.retired or self.idle_timeout <= 0:
+                self._discard_locked(session)
+                return
+
+            session.last_used = time.monotonic()
+            self._idle.setdefault(session.key, []).append(session)
+            self._lock.notify_all()
+
+    @contextmanager
+    def pinned(self, client: VNCClient) -> Iterator[PinnedSession]:
+        """Hand out the same connection to every acquire() for its host inside the block.
+
+        Lets a sequence of tool calls run over one connection. The client must come from
+        acquire(), and the caller still releases it after the block, passing
+        ``discard=pin.discard``.
+
+        Raises:
+            ValueError: If the client is not in use from this pool
+        """
+        with self._lock:
+            session = self._in_use.get(id(client))
+        if session is None:
+            raise ValueError("Only a client acquired from the pool can be pinned")
+        pin = PinnedSession(client, session.key)
+        token = _pinned_session.set(pin)
+        try:
+            yield pin
+        finally:
+            _pinned_session.reset(token)
+
+    def evict_idle(self) -> int:
+        """Close connections that have been idle for longer than the idle timeout.
+
+        Returns:
+            int: Number of connections closed
+        """
+        with self._lock:
+            return self._evict_idle_locked()
+
+    def close_all(self) -> None:
+        """Close all idle connections. Connections currently in use are closed on release."""
+        with self._lock:
+            for sessions in self._idle.values():
+                for session in sessions:
+                    self._sizes[session.key] -= 1
+                    session.client.close()
+            self._idle.clear()
+            for session in self._in_use.values():
+                # Make sure they are not returned to the idle list
+                session.retired = True
+            self._lock.notify_all()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return per-host pool occupancy.
+
+        Returns:
+            Dict mapping "host:port/username" to open, idle and in-use connection counts
+        """
+        with self._lock:
+            result = {}
+            for key, size in self._sizes.items():
+                if size <= 0:
+                    continue
+                idle = len(self._idle.get(key, []))
+                result[f"{key[0]}:{key[1]}/{key[2]}"] = {"open": size, "idle": idle, "in_use": size - idle}
+            return result
+
+    def _discard_locked(self, session: PooledSession) -> None:
+        """Close a session and free its slot. Caller must hold the lock."""
+        self._sizes[session.key] -= 1
+        try:
+            session.client.close()
+        except Exception as e:
+            logger.debug(f"Error closing pooled VNC session: {str(e)}")
+        self._lock.notify_all()
+
+    def _evict_idle_locked(self) -> int:
+        """Close expired idle sessions. Caller must hold the lock."""
+        now = time.monotonic()
+        evicted = 0
+        for key, sessions in list(self._idle.items()):
+            keep = []
+            for session in sessions:
+                if now - session.last_used > self.idle_timeout:
+                    logger.info(f"Evicting VNC session to {key[0]}:{key[1]} after "
+                                f"{now - session.last_used:.0f}s idle")
+                    self._discard_locked(session)
+                    evicted += 1
+                else:
+                    keep.append(session)
+            self._idle[key] = keep
+        return evicted
+
+    def _ensure_reaper_locked(self) -> None:
+        """Start the background idle-eviction thread if needed. Caller must hold the lock."""
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+        if self.idle_timeout <= 0:
+            return
+        self._reaper = threading.Thread(target=self._reap, name="vnc-session-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap(self) -> None:
+        """Periodically evict idle sessions until the pool is empty."""
+        interval = max(1.0, self.idle_timeout / 2)
+        with self._lock:
+            while any(size > 0 for size in self._sizes.values()):
+                self._lock.wait(interval)
+                self._evict_idle_locked()
+            self._reaper = None
+
+
+# Shared pool used by the MCP tool handlers
+session_pool = VNCSessionPool()
@@ -2,7 +2,7 @@ import os
 import sys
 import pytest
 import socket
-from unittest.mock import AsyncMock, patch, MagicMock, create_autospec, PropertyMock
+from unittest.mock import AsyncMock, patch, MagicMock, create_autospec, PropertyMock, ANY
 from typing import Tuple, Optional, Dict, Any
 import inspect
 
@@ -23,17 +23,24 @@ def mock_socket():
 import src.action_handlers as action_handlers
 from src.action_handlers import (
     handle_remote_macos_get_screen,
+    handle_remote_macos_get_screen_region,
+    handle_remote_macos_get_screens,
+    handle_remote_macos_wait_for_screen,
     handle_remote_macos_mouse_scroll,
     handle_remote_macos_mouse_click,
     handle_remote_macos_mouse_double_click,
     handle_remote_macos_mouse_move,
     handle_remote_macos_send_keys,
+    handle_remote_macos_open_application,
+    handle_remote_macos_set_clipboard,
+    handle_remote_macos_get_clipboard,
+    handle_remote_macos_batch,
 )
 
 # Patch paths - the key insight is that we need to patch where the object is USED, not where it's defined
-# In action_handlers.py, the import is "from src.vnc_client import VNCClient, capture_vnc_screen"
+# Handlers get their VNCClient instances from the session pool in vnc_session.py
 ACTION_HANDLERS_PATH = 'src.action_handlers'
-VNC_CLIENT_PATH = 'src.action_handlers.VNCClient'  # Need to patch where it's used
+VNC_CLIENT_PATH = 'vnc_session.VNCClient'  # Need to patch where it's used
 CAPTURE_VNC_SCREEN_PATH = 'src.action_handlers.capture_vnc_screen'  # Need to patch where it's used
 
 # Check which functions are async
@@ -65,6 +72,13 @@ def mock_env_vars():
     }):
         yield
 
+@pytest.fixture(autouse=True)
+def reset_session_pool():
+    """Make sure pooled connections do not leak between tests."""
+    action_handlers.session_pool.close_all()
+    yield
+    action_handlers.session_pool.close_all()
+
 @pytest.mark.asyncio
 @patch(CAPTURE_VNC_SCREEN_PATH, new_callable=AsyncMock)
 async def test_handle_remote_macos_get_screen_success(mock_capture_vnc_screen, mock_env_vars):
@@ -93,9 +107,130 @@ async def test_handle_remote_macos_get_screen_success(mock_capture_vnc_screen, m
         port=TEST_PORT,
         password=TEST_PASSWORD,
         username=TEST_USERNAME,
-        encryption='prefer_on'
+        encryption='prefer_on',
+        pool=action_handlers.session_pool,
+        frame_info=ANY,
+        image_format="png",
+        quality=None,
+        compression=None,
+        since_frame=None,
+        show_cursor=False
     )
 
+@pytest.mark.asyncio
+@patch(CAPTURE_VNC_SCREEN_PATH, new_callable=AsyncMock)
+async def test_handle_remote_macos_get_screen_format(mock_capture_vnc_screen, mock_env_vars):
+    """Test that the screenshot format is chosen per call."""
+    # Arrange
+    mock_capture_vnc_screen.return_value = (True, b'test_image_data', None, (1366, 768))
+
+    # Act
+    result = await handle_remote_macos_get_screen({"format": "JPG", "quality": 60})
+
+    # Assert
+    assert result[0].mimeType == "image/jpeg"
+    kwargs = mock_capture_vnc_screen.call_args.kwargs
+    assert (kwargs["image_format"], kwargs["quality"]) == ("jpeg", 60)
+
+    # Invalid options are reported before a connection is borrowed from the pool
+    mock_capture_vnc_screen.reset_mock()
+    for arguments, error in (({"format": "gif"}, "Unsupported image format"),
+                             ({"quality": 0}, "quality must be between 1 and 100"),
+                             ({"compression": "fastest"}, "compression must be one of")):
+        result = await handle_remote_macos_get_screen(arguments)
+        assert len(result) == 1
+        assert result[0].text.startswith(f"Error: {error}")
+    mock_capture_vnc_screen.assert_not_called()
+
+@pytest.mark.asyncio
+@patch(CAPTURE_VNC_SCREEN_PATH, new_callable=AsyncMock)
+async def test_handle_remote_macos_get_screen_frame_info(mock_capture_vnc_screen, mock_env_vars):
+    """Test that frame sequence and age from the background receiver are reported."""
+    # Arrange
+    async def fake_capture(**kwargs):
+        kwargs["frame_info"].update({"sequence": 42, "age_ms": 15})
+        return True, b'test_image_data', None, (1366, 768)
+    mock_capture_vnc_screen.side_effect = fake_capture
+
+    # Act
+    result = await handle_remote_macos_get_screen({})
+
+    # Assert
+    assert len(result) == 3
+    assert result[2].text == "Frame sequence: 42, age: 15ms"
+
+@pytest.mark.asyncio
+@patch(CAPTURE_VNC_SCREEN_PATH, new_callable=AsyncMock)
+async def test_handle_remote_macos_get_screen_delta(mock_capture_vnc_screen, mock_env_vars):
+    """Test delta screenshots with changed regions and with no change."""
+    # Arrange
+    regions = []
+    async def fake_capture(**kwargs):
+        kwargs["frame_info"].update({"frame": "abcd:7", "regions": regions})
+        return True, None, None, (1366, 768)
+    mock_capture_vnc_screen.side_effect = fake_capture
+
+    # Act - nothing changed
+    result = await handle_remote_macos_get_screen({"since_frame": "abcd:5"})
+
+    # Assert
+    assert len(result) == 1
+    assert result[0].text == "No change since frame abcd:5. Frame: abcd:7"
+    assert mock_capture_vnc_screen.call_args.kwargs["since_frame"] == "abcd:5"
+
+    # Act - one region changed
+    regions.append({"x": 10, "y": 20, "width": 30, "height": 40, "data": b'region'})
+    result = await handle_remote_macos_get_screen({"since_frame": "abcd:5"})
+
+    # Assert
+    assert len(result) == 3
+    assert "x=10, y=20, size 30x40" in result[1].text
+    assert result[2].type == "image"
+
+@pytest.mark.asyncio
+@patch('src.action_handlers.capture_vnc_screen_region', new_callable=AsyncMock)
+async def test_handle_remote_macos_get_screen_region(mock_capture_region, mock_env_vars):
+    """Test capturing a screen region."""
+    # Arrange
+    async def fake_capture(**kwargs):
+        kwargs["frame_info"]["region"] = (200, 100, 400, 300)
+        return True, b'region_data', None, (400, 300)
+    mock_capture_region.side_effect = fake_capture
+
+    # Act
+    result = await handle_remote_macos_get_screen_region({"x": 100, "y": 50, "width": 200, "height": 150})
+
+    # Assert
+    assert len(result) == 2
+    assert result[0].type == "image"
+    assert result[1].text == "Image dimensions: 400x300 (screen pixels x=200, y=100, size 400x300)"
+    kwargs = mock_capture_region.call_args.kwargs
+    assert kwargs["region"] == (100, 50, 200, 150)
+    assert kwargs["source_size"] == (None, None)  # The screenshot size
+    assert kwargs["output_size"] == (None, None)
+
+    with pytest.raises(ValueError):
+        await handle_remote_macos_get_screen_region({"x": 0, "y": 0, "width": 0, "height": 10})
+
+@pytest.mark.asyncio
+@patch('src.action_handlers.wait_for_vnc_screen', new_callable=AsyncMock)
+async def test_handle_remote_macos_wait_for_screen(mock_wait, mock_env_vars):
+    """Test waiting for the screen to settle."""
+    # Arrange
+    mock_wait.return_value = (True, {"status": "stable", "elapsed_ms": 900, "changes": 3, "frame": "abcd:9"},
+                              None, None)
+
+    # Act
+    result = await handle_remote_macos_wait_for_screen({"until": "stable", "stable_ms": 300})
+
+    # Assert
+    assert result[0].text == "Screen stable for 300ms after 900ms (3 change(s) while waiting). Frame: abcd:9"
+    kwargs = mock_wait.call_args.kwargs
+    assert (kwargs["until"], kwargs["stable_ms"], kwargs["region"]) == ("stable", 300, None)
+
+    with pytest.raises(ValueError):
+        await handle_remote_macos_wait_for_screen({"x": 10})
+
 @pytest.mark.asyncio
 @patch(CAPTURE_VNC_SCREEN_PATH, new_callable=AsyncMock)
 async def test_handle_remote_macos_get_screen_failure(mock_capture_vnc_screen, mock_env_vars):
@@ -133,7 +268,7 @@ async def test_handle_remote_macos_mouse_scroll(mock_env_vars):
         mock_instance.width = 1920
         mock_instance.height = 1080
         mock_instance.send_pointer_event.return_value = True
-        mock_instance.send_key_event.return_value = True
+        mock_instance.send_key_combination.return_value = True
         
         # Act
         if IS_MOUSE_SCROLL_ASYNC:
@@ -153,7 +288,8 @@ async def test_handle_remote_macos_mouse_scroll(mock_env_vars):
         assert len(result) == 1
         assert result[0].type == "text"
         mock_instance.connect.assert_called_once()
-        mock_instance.close.assert_called_once()
+        # Connection is kept open in the session pool for the next call
+        mock_instance.close.assert_not_called()
 
 @pytest.mark.asyncio
 async def test_handle_remote_macos_mouse_click(mock_env_vars):
@@ -188,7 +324,29 @@ async def test_handle_remote_macos_mouse_click(mock_env_vars):
         assert result[0].type == "text"
         mock_instance.connect.assert_called_once()
         mock_instance.send_mouse_click.assert_called_once()
-        mock_instance.close.assert_called_once()
+        # Connection is kept open in the session pool for the next call
+        mock_instance.close.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_handle_remote_macos_mouse_click_screenshot_coordinates(mock_env_vars):
+    """Test that coordinates default to the screenshot size."""
+    with patch(VNC_CLIENT_PATH) as MockVNCClass:
+        mock_instance = MagicMock()
+        MockVNCClass.return_value = mock_instance
+        mock_instance.connect.return_value = (True, None)
+        # A 16:10 screen is captured as 1366x768 unless VNC_OUTPUT_MODE keeps its aspect ratio
+        mock_instance.width = 2560
+        mock_instance.height = 1600
+        mock_instance.send_mouse_click.return_value = True
+
+        result = handle_remote_macos_mouse_click({"x": 1365, "y": 384})
+
+        mock_instance.send_mouse_click.assert_called_once_with(2558, 800, 1, False)
+        assert "Source dimensions: 1366x768" in result[0].text
+        assert "Target dimensions: 2560x1600" in result[0].text
+
+        with pytest.raises(ValueError):
+            handle_remote_macos_mouse_click({"x": 1, "y": 1, "source_width": 0})
 
 @pytest.mark.asyncio
 async def test_handle_remote_macos_mouse_double_click(mock_env_vars):
@@ -223,7 +381,8 @@ async def test_handle_remote_macos_mouse_double_click(mock_env_vars):
         assert result[0].type == "text"
         mock_instance.connect.assert_called_once()
         mock_instance.send_mouse_click.assert_called_once()
-        mock_instance.close.assert_called_once()
+        # Connection is kept open in the session pool for the next call
+        mock_instance.close.assert_not_called()
 
 @pytest.mark.asyncio
 async def test_handle_remote_macos_mouse_move(mock_env_vars):
@@ -256,7 +415,8 @@ async def test_handle_remote_macos_mouse_move(mock_env_vars):
         assert result[0].type == "text"
         mock_instance.connect.assert_called_once()
         mock_instance.send_pointer_event.assert_called_once()
-        mock_instance.close.assert_called_once()
+        # Connection is kept open in the session pool for the next call
+        mock_instance.close.assert_not_called()
 
 @pytest.mark.asyncio
 async def test_handle_remote_macos_send_keys_text(mock_env_vars):
@@ -285,7 +445,8 @@ async def test_handle_remote_macos_send_keys_text(mock_env_vars):
         assert result[0].type == "text"
         mock_instance.connect.assert_called_once()
         mock_instance.send_text.assert_called_once_with("Hello World")
-        mock_instance.close.assert_called_once()
+        # Connection is kept open in the session pool for the next call
+        mock_instance.close.assert_not_called()
 
 @pytest.mark.asyncio
 async def test_handle_remote_macos_send_keys_special(mock_env_vars):
@@ -297,7 +458,7 @@ async def test_handle_remote_macos_send_keys_special(mock_env_vars):
         
         # Configure mock behavior
         mock_instance.connect.return_value = (True, None)
-        mock_instance.send_key_event.return_value = True
+        mock_instance.send_key_combination.return_value = True
         
         # Act
         if IS_SEND_KEYS_ASYNC:
@@ -313,8 +474,9 @@ async def test_handle_remote_macos_send_keys_special(mock_env_vars):
         assert len(result) == 1
         assert result[0].type == "text"
         mock_instance.connect.assert_called_once()
-        mock_instance.send_key_event.assert_called()
-        mock_instance.close.assert_called_once()
+        mock_instance.send_key_combination.assert_called_once_with([0xff0d])
+        # Connection is kept open in the session pool for the next call
+        mock_instance.close.assert_not_called()
 
 @pytest.mark.asyncio
 async def test_handle_remote_macos_send_keys_combination(mock_env_vars):
@@ -343,7 +505,23 @@ async def test_handle_remote_macos_send_keys_combination(mock_env_vars):
         assert result[0].type == "text"
         mock_instance.connect.assert_called_once()
         mock_instance.send_key_combination.assert_called_once()
-        mock_instance.close.assert_called_once()
+        # Connection is kept open in the session pool for the next call
+        mock_instance.close.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_handle_remote_macos_open_application(mock_env_vars):
+    """Test that Spotlight is opened and the app launched with one write per keystroke."""
+    with patch(VNC_CLIENT_PATH) as MockVNCClass, patch('src.action_handlers.time.sleep'):
+        mock_instance = MagicMock()
+        MockVNCClass.return_value = mock_instance
+        mock_instance.connect.return_value = (True, None)
+
+        result = handle_remote_macos_open_application({"identifier": "Safari"})
+
+        assert result[0].text.startswith("Launched application: Safari")
+        assert mock_instance.send_key_combination.call_args_list == [(([0xffeb, 0x20],),), (([0xff0d],),)]
+        mock_instance.send_text.assert_called_once_with("Safari")
+        mock_instance.send_key_event.assert_not_called()
 
 @pytest.mark.asyncio
 async def test_handle_connection_error(mock_env_vars):
@@ -377,4 +555,198 @@ async def test_handle_connection_error(mock_env_vars):
         assert "Connection failed" in result[0].text
         mock_instance.connect.assert_called_once()
         # Note: close() is not called when connection fails because we return early
-        # This is correct behavior based on the implementation 
\ No newline at end of file
+        # This is correct behavior based on the implementation 
+
+@pytest.mark.asyncio
+async def test_handlers_reuse_pooled_connection(mock_env_vars):
+    """Test that consecutive tool calls share one VNC connection."""
+    with patch(VNC_CLIENT_PATH) as MockVNCClass:
+        # Setup mock VNC instance
+        mock_instance = MagicMock()
+        MockVNCClass.return_value = mock_instance
+        mock_instance.connect.return_value = (True, None)
+        mock_instance.is_alive.return_value = True
+        mock_instance.width = 1920
+        mock_instance.height = 1080
+        mock_instance.send_mouse_click.return_value = True
+        mock_instance.send_pointer_event.return_value = True
+
+        # Act
+        handle_remote_macos_mouse_click({"x": 100, "y": 200})
+        handle_remote_macos_mouse_move({"x": 300, "y": 400})
+
+        # Assert - one handshake served both calls
+        MockVNCClass.assert_called_once()
+        mock_instance.connect.assert_called_once()
+        mock_instance.send_mouse_click.assert_called_once()
+        mock_instance.send_pointer_event.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_handlers_reconnect_dead_pooled_connection(mock_env_vars):
+    """Test that a pooled connection failing its health check is replaced."""
+    with patch(VNC_CLIENT_PATH) as MockVNCClass:
+        # Setup two mock VNC instances, the first one dies after use
+        dead_instance = MagicMock()
+        dead_instance.connect.return_value = (True, None)
+        dead_instance.is_alive.return_value = False
+        dead_instance.width = 1920
+        dead_instance.height = 1080
+        fresh_instance = MagicMock()
+        fresh_instance.connect.return_value = (True, None)
+        fresh_instance.width = 1920
+        fresh_instance.height = 1080
+        MockVNCClass.side_effect = [dead_instance, fresh_instance]
+
+        # Act
+        handle_remote_macos_mouse_move({"x": 100, "y": 200})
+        result = handle_remote_macos_mouse_move({"x": 300, "y": 400})
+
+        # Assert
+        assert result[0].type == "text"
+        dead_instance.close.assert_called_once()
+        fresh_instance.connect.assert_called_once()
+        fresh_instance.send_pointer_event.assert_called_once()
+
+
+@pytest.mark.asyncio
+@patch(CAPTURE_VNC_SCREEN_PATH)
+async def test_handle_remote_macos_batch(mock_capture_vnc_screen, mock_env_vars):
+    """Test that a batch runs its steps in order over one pinned connection."""
+    with patch(VNC_CLIENT_PATH) as MockVNCClass:
+        mock_instance = MagicMock()
+        MockVNCClass.return_value = mock_instance
+        mock_instance.connect.return_value = (True, None)
+        # An idle connection failing its health check would be replaced; a pinned one is not checked
+        mock_instance.is_alive.return_value = False
+        mock_instance.width, mock_instance.height = 1366, 768
+        mock_instance.send_mouse_click.return_value = True
+        mock_instance.send_text.return_value = True
+        mock_capture_vnc_screen.return_value = (True, b'test_image_data', None, (1366, 768))
+
+        result = await handle_remote_macos_batch({
+            "actions": [
+                {"action": "click", "x": 100, "y": 200},
+                {"action": "keys", "text": "hello"},
+            ],
+            "screenshot": {"format": "jpeg"},
+        })
+
+        assert [content.type for content in result] == ["text", "text", "image", "text", "text"]
+        assert result[0].text.startswith("Step 1 (click): Mouse click (button 1)")
+        assert result[1].text.startswith("Step 2 (keys): ")
+        assert result[2].mimeType == "image/jpeg"
+        assert result[3].text == "Step 3 (screenshot): Image dimensions: 1366x768"
+        assert result[4].text.startswith("Batch completed 3/3 steps")
+        assert MockVNCClass.call_count == 1
+        mock_instance.send_mouse_click.assert_called_once_with(100, 200, 1, False)
+        mock_instance.send_text.assert_called_once_with("hello")
+        assert mock_capture_vnc_screen.call_args.kwargs["image_format"] == "jpeg"
+
+
+@pytest.mark.asyncio
+async def test_handle_remote_macos_batch_stop_on_error(mock_env_vars):
+    """Test that a failing step skips the rest of the batch."""
+    with patch(VNC_CLIENT_PATH) as MockVNCClass:
+        mock_instance = MagicMock()
+        MockVNCClass.return_value = mock_instance
+        mock_instance.connect.return_value = (True, None)
+
+        result = await handle_remote_macos_batch({
+            "actions": [{"action": "click", "y": 200}, {"action": "keys", "text": "hello"}]
+        })
+
+        assert result[0].text == "Step 1 (click) failed: x and y coordinates are required"
+        assert result[1].text.startswith("Batch completed 0/2 steps")
+        mock_instance.send_text.assert_not_called()
+
+    with pytest.raises(ValueError):
+        await handle_remote_macos_batch({"actions": [{"action": "reboot"}]})
+
+
+@pytest.mark.asyncio
+async def test_handle_remote_macos_batch_argument_error_keeps_connection(mock_env_vars):
+    """Test that a step with a bad region fails on its own without dropping the connection."""
+    with patch(VNC_CLIENT_PATH) as MockVNCClass:
+        mock_instance = MagicMock()
+        MockVNCClass.return_value = mock_instance
+        mock_instance.connect.return_value = (True, None)
+        mock_instance.width, mock_instance.height = 1366, 768
+
+        result = await handle_remote_macos_batch({
+            "actions": [{"action": "wait", "x": 5000, "y": 0, "width": 10, "height": 10},
+                        {"action": "keys", "text": "hello"}],
+            "stop_on_error": False,
+        })
+
+        assert result[0].text.startswith("Step 1 (wait) failed: Region (5000, 0, 10, 10) is outside")
+        assert result[1].text.startswith("Step 2 (keys): ")
+        assert result[2].text.startswith("Batch completed 1/2 steps")
+        assert not any("connection was lost" in content.text for content in result)
+        mock_instance.wait_for_screen.assert_not_called()
+        mock_instance.send_text.assert_called_once_with("hello")
+        mock_instance.close.assert_not_called()
+
+
+
+@pytest.mark.asyncio
+async def test_handlers_target_named_host(mock_env_vars):
+    """Test that the host argument selects a configured machine and its own pool."""
+    from host_registry import HostRegistry, MacHost
+    default = action_handlers.hosts.resolve()
+    mini = MacHost("mini-01", "10.0.0.11", 5901, "mini-password", max_sessions=1)
+    with patch(VNC_CLIENT_PATH) as MockVNCClass, \
+            patch.object(action_handlers, "hosts", HostRegistry([default, mini])):
+        mock_instance = MagicMock()
+        MockVNCClass.return_value = mock_instance
+        mock_instance.connect.return_value = (True, None)
+        mock_instance.width, mock_instance.height = 1920, 1080
+
+        handle_remote_macos_mouse_move({"x": 100, "y": 200, "host": "mini-01"})
+        result = await handle_remote_macos_batch({"actions": [{"action": "move", "x": 1, "y": 2}], "host": "mini-01"})
+
+        MockVNCClass.assert_called_once_with(host="10.0.0.11", port=5901, password="mini-password",
+                                             username="", encryption="prefer_on")
+        assert result[-1].text.startswith("Batch completed 1/1 steps")
+        assert mini.pool.stats() == {"10.0.0.11:5901/": {"open": 1, "idle": 1, "in_use": 0}}
+        assert action_handlers.session_pool.stats() == {}
+        mini.pool.close_all()
+
+        with pytest.raises(ValueError, match="Unknown host 'mini-02'"):
+            handle_remote_macos_mouse_move({"x": 100, "y": 200, "host": "mini-02"})
+        with pytest.raises(ValueError, match="all steps run on the batch's host"):
+            await handle_remote_macos_batch({"actions": [{"action": "move", "x": 1, "y": 2, "host": "mini-01"}]})
+
+
+@pytest.mark.asyncio
+async def test_handle_remote_macos_get_screens(mock_env_vars):
+    """Test that a fleet screenshot returns what it can capture within the timeout."""
+    import asyncio
+    from host_registry import HostRegistry, MacHost
+    fleet = HostRegistry([MacHost(name, address) for name, address in
+                          [("mini-01", "10.0.0.11"), ("mini-02", "10.0.0.12"), ("mini-03", "10.0.0.13")]])
+
+    async def capture(**kwargs):
+        if kwargs["host"] == "10.0.0.12":
+            await asyncio.sleep(5)
+        if kwargs["host"] == "10.0.0.13":
+            return False, None, "Connection refused", None
+        return True, b'test_image_data', None, (320, 180)
+
+    with patch(CAPTURE_VNC_SCREEN_PATH, side_effect=capture) as mock_capture, \
+            patch.object(action_handlers, "hosts", fleet):
+        result = await handle_remote_macos_get_screens({"timeout": 0.1, "thumbnail_width": 320, "format": "jpeg"})
+
+        assert [content.type for content in result] == ["text", "image", "text", "text", "text"]
+        assert result[0].text == "Host mini-01 (10.0.0.11:5900): image dimensions 320x180"
+        assert result[1].mimeType == "image/jpeg"
+        assert result[2].text == "Host mini-02 failed: No screenshot within 0.1s"
+        assert result[3].text == "Host mini-03 failed: Connection refused"
+        assert result[4].text.startswith("Captured 1/3 hosts")
+        assert mock_capture.call_args.kwargs["thumbnail_size"] == (320, None)
+        assert mock_capture.call_args.kwargs["pool"] is fleet.resolve("mini-03").pool
+
+        with pytest.raises(ValueError, match="Unknown host 'mini-04'"):
+            await handle_remote_macos_get_screens({"hosts": ["mini-01", "mini-04"]})
+        mock_capture.reset_mock()
+        await handle_remote_macos_get_screens({"hosts": ["mini-03", "mini-03"]})
+        mock_capture.assert_called_once()
@@ -0,0 +1,82 @@
+import os
+import sys
+import zlib
+import pytest
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.clipboard import (Clipboard, CAPS, NOTIFY, PEEK, PROVIDE, REQUEST, TEXT_FORMAT, CUT_TEXT, FLAGS,
+                           extended_message)
+
+
+def server_message(message: bytes):
+    """Split an extended message the way a client reads it: (length, data)."""
+    _, length = CUT_TEXT.unpack_from(message)
+    return length, message[CUT_TEXT.size:]
+
+
+def flags(message: bytes) -> int:
+    return FLAGS.unpack_from(message, CUT_TEXT.size)[0]
+
+
+class TestClipboard:
+    """Test suite for the clipboard state."""
+
+    def test_standard_clipboard(self):
+        """Test Latin-1 clipboard text without the extended clipboard."""
+        clipboard = Clipboard()
+        assert clipboard.received(4, "caf\xe9".encode('latin-1')) == []
+        assert (clipboard.text, clipboard.sequence) == ("caf\xe9", 1)
+
+        assert not clipboard.extended
+        assert clipboard.request_message() is None
+        assert clipboard.set_message("a\r\nb") == bytes([6, 0, 0, 0, 0, 0, 0, 3]) + b"a\nb"
+        assert not clipboard.can_send("☃")
+        with pytest.raises(UnicodeEncodeError):
+            clipboard.set_message("☃")
+
+    def test_extended_clipboard(self):
+        """Test negotiating the extended clipboard and exchanging UTF-8 text."""
+        clipboard = Clipboard(max_size=1000)
+        caps = extended_message(CAPS | REQUEST | NOTIFY | PROVIDE | TEXT_FORMAT, FLAGS.pack(1 << 20))
+        replies = clipboard.received(*server_message(caps))
+        # Our capabilities are announced in reply
+        assert len(replies) == 1 and flags(replies[0]) & CAPS
+        assert clipboard.extended and clipboard.can_send("☃")
+
+        # Text is sent as zlib-compressed, null-terminated UTF-8 with CRLF line endings
+        message = clipboard.set_message("☃\nx")
+        assert flags(message) == PROVIDE | TEXT_FORMAT
+        data = zlib.decompress(message[CUT_TEXT.size + FLAGS.size:])
+        assert data == FLAGS.pack(7) + "☃\r\nx\0".encode('utf-8')
+
+        # The server's provide message carries the same layout
+        assert clipboard.received(*server_message(message)) == []
+        assert (clipboard.text, clipboard.sequence) == ("☃\nx", 1)
+
+        # A change notification is answered with a request, a request with our text
+        notify = clipboard.received(*server_message(extended_message(NOTIFY | TEXT_FORMAT)))
+        assert [flags(reply) for reply in notify] == [REQUEST | TEXT_FORMAT]
+        request = clipboard.received(*server_message(extended_message(REQUEST | TEXT_FORMAT)))
+        assert [flags(reply) for reply in request] == [PROVIDE | TEXT_FORMAT]
+        peek = clipboard.received(*server_message(extended_message(PEEK)))
+        assert [flags(reply) for reply in peek] == [NOTIFY | TEXT_FORMAT]
+        assert flags(clipboard.request_message()) == REQUEST | TEXT_FORMAT
+
+    def test_invalid_extended_messages(self):
+        """Test that oversized and malformed clipboard data is ignored."""
+        clipboard = Clipboard(max_size=4)
+        clipboard.received(*server_message(extended_message(CAPS | PROVIDE | TEXT_FORMAT, FLAGS.pack(4))))
+        large = extended_message(PROVIDE | TEXT_FORMAT, zlib.compress(FLAGS.pack(6) + b"hello\0"))
+        broken = extended_message(PROVIDE | TEXT_FORMAT, b"not zlib")
+        for message in (large, broken):
+            assert clipboard.received(*server_message(message)) == []
+        assert clipboard.received(-2, b"\0\0") == []
+        assert clipboard.sequence == 0
+        assert clipboard.accepts(4) and not clipboard.accepts(5)
+        assert clipboard.accepts(-64) and not clipboard.accepts(-1000)
+
+        # A server without text support keeps the standard clipboard
+        clipboard = Clipboard()
+        clipboard.received(*server_message(extended_message(CAPS | PROVIDE)))
+        assert not clipboard.extended
@@ -0,0 +1,50 @@
+import os
+import sys
+from PIL import Image
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.cursor import Cursor, cursor_data_size
+from src.vnc_client import PixelFormat
+
+# 32-bit big-endian 0x00RRGGBB
+PIXEL_FORMAT = PixelFormat(bytes([32, 24, 1, 1, 0, 255, 0, 255, 0, 255, 16, 8, 0, 0, 0, 0]))
+RED = bytes([0, 255, 0, 0])
+BLUE = bytes([0, 0, 0, 255])
+
+
+class TestCursor:
+    """Test suite for the cursor shape."""
+
+    def test_decode(self):
+        """Test decoding pixels and the transparency mask of a cursor."""
+        # 3x2 pointer; the mask is one byte per row, most significant bit first
+        pixels = RED * 3 + BLUE * 3
+        mask = bytes([0b10100000, 0b11000000])
+        assert cursor_data_size(3, 2, PIXEL_FORMAT) == len(pixels + mask)
+
+        cursor = Cursor.decode(1, 0, 3, 2, pixels + mask, PIXEL_FORMAT)
+        assert cursor.hotspot == (1, 0)
+        assert cursor.image.getpixel((0, 0)) == (255, 0, 0, 255)
+        assert cursor.image.getpixel((1, 0))[3] == 0
+        assert cursor.image.getpixel((1, 1)) == (0, 0, 255, 255)
+        assert cursor.image.getpixel((2, 1))[3] == 0
+
+        # An empty shape hides the pointer
+        assert Cursor.decode(0, 0, 0, 0, b'', PIXEL_FORMAT) is None
+
+    def test_draw(self):
+        """Test that the pointer is drawn with its hotspot at the position, clipped to the image."""
+        cursor = Cursor.decode(1, 1, 2, 2, RED * 4 + bytes([0b11000000, 0b01000000]), PIXEL_FORMAT)
+        assert cursor.rect(5, 5) == (4, 4, 2, 2)
+
+        img = Image.new('RGB', (6, 6), (0, 255, 0))
+        cursor.draw(img, 5, 5)
+        assert [img.getpixel(p) for p in [(4, 4), (5, 4), (4, 5), (5, 5)]] == [
+            (255, 0, 0), (255, 0, 0), (0, 255, 0), (255, 0, 0)]
+        assert img.getpixel((3, 3)) == (0, 255, 0)
+
+        # Partly outside the image
+        img = Image.new('RGB', (2, 2))
+        cursor.draw(img, 0, 0)
+        assert img.getpixel((0, 0)) == (255, 0, 0)
@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import hashlib
+import pytest
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.dh_keys import DHKeyPool, dh_parameters, generate_key_pair
+from src.vnc_client import apple_auth_response
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+# 1024-bit MODP group prime (RFC 2409)
+DH_PRIME = int(
+    "FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD129024E088A67CC74"
+    "020BBEA63B139B22514A08798E3404DDEF9519B3CD3A431B302B0A6DF25F1437"
+    "4FE1356D6D51C245E485B576625E7EC6F44C42E9A637ED6B0BFF5CB6F406B7ED"
+    "EE386BFB5A899FA5AE9F24117C4B1FE649286651ECE65381FFFFFFFFFFFFFFFF", 16)
+
+
+def wait_for_keys(pool: DHKeyPool, count: int) -> None:
+    """Wait until the background thread has generated count key pairs."""
+    deadline = time.monotonic() + 5
+    while pool.ready(DH_PRIME, 2) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_parameters_cached_per_group():
+    """Test that a group's parameters are loaded (and checked) once."""
+    assert dh_parameters(DH_PRIME, 2) is dh_parameters(DH_PRIME, 2)
+
+
+def test_key_pair_is_valid():
+    """Test that the public value belongs to the private exponent."""
+    private, public = generate_key_pair(DH_PRIME, 2)
+    assert pow(2, private, DH_PRIME) == public
+
+
+def test_pool_pregenerates_unique_keys():
+    """Test that key pairs are generated ahead of time and handed out once."""
+    pool = DHKeyPool(size=3)
+    first = pool.take(DH_PRIME, 2)
+    wait_for_keys(pool, 3)
+    assert pool.ready(DH_PRIME, 2) == 3
+
+    taken = [pool.take(DH_PRIME, 2) for _ in range(3)]
+    assert len({first, *taken}) == 4
+
+
+def test_pool_disabled():
+    """Test that a pool of size 0 generates every key pair on demand."""
+    pool = DHKeyPool(size=0)
+    pool.take(DH_PRIME, 2)
+    assert pool.ready(DH_PRIME, 2) == 0
+
+
+def test_apple_auth_response_decrypts():
+    """Test that the server can decrypt the credentials with the shared key."""
+    server_private = 12345
+    server_public = pow(2, server_private, DH_PRIME).to_bytes(128, 'big')
+    response = apple_auth_response(2, 128, DH_PRIME.to_bytes(128, 'big'), server_public, "user", "secret")
+
+    client_public = int.from_bytes(response[128:], 'big')
+    shared = pow(client_public, server_private, DH_PRIME).to_bytes(128, 'big')
+    decryptor = Cipher(algorithms.AES(hashlib.md5(shared).digest()), modes.ECB()).decryptor()
+    creds = decryptor.update(response[:128]) + decryptor.finalize()
+    assert creds[:5] == b"user\0"
+    assert creds[64:71] == b"secret\0"
+
+
+def test_apple_auth_rejects_invalid_server_key():
+    """Test that degenerate server public keys are refused."""
+    with pytest.raises(ValueError):
+        apple_auth_response(2, 128, DH_PRIME.to_bytes(128, 'big'), (1).to_bytes(128, 'big'), "user", "secret")
@@ -0,0 +1,31 @@
+import os
+import sys
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.event_writer import EventWriter, key_event, keystroke, pointer_event
+
+
+class TestEventWriter:
+    """Test suite for the input event writer."""
+
+    def test_messages(self):
+        """Test the RFB layout of KeyEvent and PointerEvent messages."""
+        assert key_event(0xff0d, True) == bytes([4, 1, 0, 0, 0, 0, 0xff, 0x0d])
+        assert pointer_event(300, 2, 0x101) == bytes([5, 1, 1, 44, 0, 2])
+
+    def test_keystroke_with_shift(self):
+        """Test that shift wraps the key press and release."""
+        assert keystroke(ord('A'), True) == (key_event(0xffe1, True) + key_event(ord('A'), True)
+                                             + key_event(ord('A'), False) + key_event(0xffe1, False))
+
+    def test_batching(self):
+        """Test that events are buffered until taken, with pointer positions clamped."""
+        events = EventWriter(100, 50)
+        events.pointer(-5, 80, 0).key_combination([0xffeb, ord('c')])
+
+        assert events.count == 5
+        data = events.take()
+        assert data == (pointer_event(0, 49, 0) + key_event(0xffeb, True) + key_event(ord('c'), True)
+                        + key_event(ord('c'), False) + key_event(0xffeb, False))
+        assert (len(events), events.count) == (0, 0)
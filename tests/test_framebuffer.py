@@ -0,0 +1,118 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.framebuffer import Framebuffer, merge_regions, rgb_to_pixels, pixels_to_rgb
+from src.vnc_client import PixelFormat
+
+# 32-bit true colour, red/green/blue shifts 16/8/0
+BIG_ENDIAN_32 = PixelFormat(bytes([32, 24, 1, 1, 0, 255, 0, 255, 0, 255, 16, 8, 0, 0, 0, 0]))
+LITTLE_ENDIAN_32 = PixelFormat(bytes([32, 24, 0, 1, 0, 255, 0, 255, 0, 255, 16, 8, 0, 0, 0, 0]))
+# 16-bit RGB565
+BIG_ENDIAN_16 = PixelFormat(bytes([16, 16, 1, 1, 0, 31, 0, 63, 0, 31, 11, 5, 0, 0, 0, 0]))
+LITTLE_ENDIAN_16 = PixelFormat(bytes([16, 16, 0, 1, 0, 31, 0, 63, 0, 31, 11, 5, 0, 0, 0, 0]))
+# 8-bit BGR233
+TRUE_COLOUR_8 = PixelFormat(bytes([8, 8, 0, 1, 0, 7, 0, 7, 0, 3, 0, 3, 6, 0, 0, 0]))
+# 8-bit colour map
+COLOUR_MAP_8 = PixelFormat(bytes([8, 8, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]))
+
+
+class TestFramebuffer:
+    """Test suite for Framebuffer class."""
+
+    @pytest.mark.parametrize("pixel_format, red, blue", [
+        # Big-endian 0x00RRGGBB arrives as 00 RR GG BB
+        (BIG_ENDIAN_32, bytes([0, 255, 0, 0]), bytes([0, 0, 0, 255])),
+        # Little-endian arrives as BB GG RR 00
+        (LITTLE_ENDIAN_32, bytes([0, 0, 255, 0]), bytes([255, 0, 0, 0])),
+        (BIG_ENDIAN_16, bytes([0xF8, 0x00]), bytes([0x00, 0x1F])),
+        (LITTLE_ENDIAN_16, bytes([0x00, 0xF8]), bytes([0x1F, 0x00])),
+        (TRUE_COLOUR_8, bytes([0x07]), bytes([0xC0])),
+    ])
+    def test_write_and_to_image(self, pixel_format, red, blue):
+        """Test that packed pixels are converted to RGB only when an image is requested."""
+        fb = Framebuffer(2, 1, pixel_format)
+        fb.write(0, 0, 2, 1, red + blue)
+
+        img = fb.to_image()
+        assert img.size == (2, 1)
+        assert img.getpixel((0, 0)) == (255, 0, 0)
+        assert img.getpixel((1, 0)) == (0, 0, 255)
+
+    @pytest.mark.parametrize("pixel_format", [BIG_ENDIAN_32, LITTLE_ENDIAN_32, BIG_ENDIAN_16, TRUE_COLOUR_8])
+    def test_rgb_to_pixels_round_trip(self, pixel_format):
+        """Test packing RGB values into the pixel format."""
+        fb = Framebuffer(3, 1, pixel_format)
+        fb.put_rgb(0, 0, np.array([[[255, 0, 0], [0, 255, 0], [0, 0, 255]]], dtype=np.uint8))
+        assert list(fb.to_image().getdata()) == [(255, 0, 0), (0, 255, 0), (0, 0, 255)]
+        assert rgb_to_pixels(np.array([255, 255, 255]), BIG_ENDIAN_32).tolist() == [0, 255, 255, 255]
+
+    def test_channel_scaling(self):
+        """Test that intermediate channel values are scaled to the full 0-255 range."""
+        # RGB565 with red 16/31, green 32/63, blue 31/31
+        pixels = np.array([[[0x84, 0x1F]]], dtype=np.uint8)
+        assert pixels_to_rgb(pixels, BIG_ENDIAN_16).tolist() == [[[132, 130, 255]]]
+
+    def test_colour_map(self):
+        """Test colour map pixel formats."""
+        colour_map = np.array([[0, 0, 0], [255, 0, 0], [0, 0, 255]], dtype=np.uint8)
+        fb = Framebuffer(4, 1, COLOUR_MAP_8)
+        fb.write(0, 0, 4, 1, bytes([1, 2, 0, 200]))
+
+        img = fb.to_image(colour_map)
+        # Indices outside the colour map are black
+        assert list(img.getdata()) == [(255, 0, 0), (0, 0, 255), (0, 0, 0), (0, 0, 0)]
+        # Without a colour map the screen is black rather than failing
+        assert fb.to_image().getpixel((0, 0)) == (0, 0, 0)
+
+    def test_fill_and_copy_rect(self):
+        """Test solid fills and overlapping CopyRect."""
+        fb = Framebuffer(4, 2, BIG_ENDIAN_32)
+        fb.fill(0, 0, 1, 2, bytes([0, 255, 0, 0]))
+        fb.fill_rgb(1, 0, 1, 2, (0, 255, 0))
+
+        # Shift the two left columns one to the right, overlapping the source
+        fb.copy_rect(0, 0, 1, 0, 2, 2)
+
+        img = fb.to_image()
+        assert [img.getpixel((x, 1)) for x in range(4)] == [(255, 0, 0), (255, 0, 0), (0, 255, 0), (0, 0, 0)]
+
+    def test_row_views(self):
+        """Test that full-width rectangles are written through a single contiguous view."""
+        fb = Framebuffer(4, 3, BIG_ENDIAN_32)
+        full = list(fb.row_views(0, 1, 4, 2))
+        partial = list(fb.row_views(1, 0, 2, 3))
+        assert [len(view) for view in full] == [4 * 2 * 4]
+        assert [len(view) for view in partial] == [2 * 4] * 3
+
+        partial[2][:] = bytes([0, 255, 0, 0]) * 2
+        assert fb.to_image().getpixel((2, 2)) == (255, 0, 0)
+
+    def test_resize(self):
+        """Test that resizing keeps the overlapping contents."""
+        fb = Framebuffer(2, 2, BIG_ENDIAN_32)
+        fb.fill_rgb(0, 0, 2, 2, (255, 0, 0))
+        fb.resize(3, 1)
+        assert (fb.width, fb.height) == (3, 1)
+        assert list(fb.to_image().getdata()) == [(255, 0, 0), (255, 0, 0), (0, 0, 0)]
+
+    def test_changed_regions(self):
+        """Test that changed pixels are reported as merged, tile-aligned rectangles."""
+        fb = Framebuffer(200, 150, BIG_ENDIAN_32)
+        assert fb.take_dirty() == [(0, 0, 200, 150)]
+        previous = fb.pixels.copy()
+        assert fb.changed_regions(previous) == []
+
+        fb.fill_rgb(5, 5, 1, 1, (255, 0, 0))
+        fb.fill_rgb(5, 70, 1, 1, (255, 0, 0))
+        fb.fill_rgb(199, 149, 1, 1, (255, 0, 0))
+        # The two tiles in the first column merge; the bottom-right tile is clipped to the screen
+        assert fb.changed_regions(previous) == [(0, 0, 64, 128), (192, 128, 8, 22)]
+
+    def test_merge_regions(self):
+        """Test merging overlapping update rectangles."""
+        rects = [(0, 0, 10, 10), (5, 5, 100, 10), (0, 140, 200, 10)]
+        assert merge_regions(rects, 200, 150, tile_size=64) == [(0, 0, 128, 64), (0, 128, 200, 22)]
@@ -0,0 +1,120 @@
+import os
+import sys
+import json
+import pytest
+from unittest.mock import patch
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.host_registry import DEFAULT_HOST, HostRegistry, MacHost, load_hosts, parse_host_list
+from src.vnc_session import VNCSessionPool
+
+DEFAULTS = {"password": "secret", "username": "admin", "encryption": "prefer_on"}
+
+
+def test_resolve_default_and_named_hosts():
+    """Test that calls without a host go to the default machine."""
+    default = MacHost(DEFAULT_HOST, "mac.local")
+    other = MacHost("mini-01", "10.0.0.11")
+    registry = HostRegistry([default, other])
+
+    assert registry.resolve() is default
+    assert registry.resolve("mini-01") is other
+    assert registry.names() == [DEFAULT_HOST, "mini-01"]
+    with pytest.raises(ValueError, match="Unknown host 'mini-02'"):
+        registry.resolve("mini-02")
+
+
+def test_resolve_without_default():
+    """Test that the host may only be omitted when it is unambiguous."""
+    single = HostRegistry([MacHost("mini-01", "10.0.0.11")])
+    assert single.resolve().name == "mini-01"
+
+    fleet = HostRegistry([MacHost("mini-01", "10.0.0.11"), MacHost("mini-02", "10.0.0.12")])
+    with pytest.raises(ValueError, match="host is required, one of: mini-01, mini-02"):
+        fleet.resolve()
+    with pytest.raises(ValueError, match="No remote MacOs machine is configured"):
+        HostRegistry().resolve()
+    with pytest.raises(ValueError, match="Duplicate host name"):
+        fleet.add(MacHost("mini-01", "10.0.0.13"))
+
+
+def test_hosts_have_their_own_pools():
+    """Test that every machine gets a session pool of its own size."""
+    shared = VNCSessionPool(max_size=2)
+    default = MacHost(DEFAULT_HOST, "mac.local", pool=shared)
+    mini = MacHost("mini-01", "10.0.0.11", max_sessions=4)
+
+    assert default.pool is shared
+    assert mini.pool is not shared
+    assert mini.max_sessions == 4
+
+
+def test_parse_host_list():
+    """Test parsing the MACOS_HOSTS list."""
+    hosts = parse_host_list("mini-01=10.0.0.11, mini-02=10.0.0.12:5901,10.0.0.13", dict(DEFAULTS, port=5900))
+
+    assert [(host.name, host.host, host.port) for host in hosts] == [
+        ("mini-01", "10.0.0.11", 5900), ("mini-02", "10.0.0.12", 5901), ("10.0.0.13", "10.0.0.13", 5900)]
+    assert all(host.password == "secret" and host.username == "admin" for host in hosts)
+    with pytest.raises(ValueError, match="Invalid port"):
+        parse_host_list("mini-01=10.0.0.11:vnc", DEFAULTS)
+    with pytest.raises(ValueError, match="expected name=host"):
+        parse_host_list("mini-01=", DEFAULTS)
+
+
+def test_parse_host_list_ipv6():
+    """Test that IPv6 addresses are accepted in brackets only."""
+    hosts = parse_host_list("mini-01=[fd00::11]:5901,[fd00::12]", dict(DEFAULTS, port=5900))
+
+    assert [(host.name, host.host, host.port) for host in hosts] == [
+        ("mini-01", "fd00::11", 5901), ("fd00::12", "fd00::12", 5900)]
+    with pytest.raises(ValueError, match=r"must be written as \[address\]"):
+        parse_host_list("mini-01=fd00::11", DEFAULTS)
+    with pytest.raises(ValueError, match="expected name="):
+        parse_host_list("mini-01=[fd00::11", DEFAULTS)
+
+
+def test_duplicate_machines_share_a_pool():
+    """Test that a machine listed under two names keeps a single connection limit."""
+    default = MacHost(DEFAULT_HOST, "10.0.0.11", username="admin")
+    registry = load_hosts(default=default, defaults=DEFAULTS,
+                          host_list="mini-01=10.0.0.11,mini-01b=10.0.0.11:5900,mini-02=10.0.0.11:5901")
+
+    assert registry.resolve("mini-01").pool is default.pool
+    assert registry.resolve("mini-01b").pool is default.pool
+    assert registry.resolve("mini-02").pool is not default.pool
+
+
+def test_load_hosts_file(tmp_path):
+    """Test loading machines from MACOS_HOSTS_FILE with per-host settings."""
+    path = tmp_path / "hosts.json"
+    path.write_text(json.dumps({
+        "mini-01": {"host": "10.0.0.11", "max_sessions": 1},
+        "mini-02": {"host": "10.0.0.12", "port": 5901, "username": "ci", "password_env": "MINI02_PASSWORD"},
+    }))
+    default = MacHost(DEFAULT_HOST, "mac.local")
+
+    with patch.dict(os.environ, {"MINI02_PASSWORD": "from-env"}):
+        registry = load_hosts(default=default, defaults=DEFAULTS, hosts_file=str(path),
+                              host_list="mini-03=10.0.0.13")
+
+    assert registry.names() == [DEFAULT_HOST, "mini-01", "mini-02", "mini-03"]
+    mini1, mini2 = registry.resolve("mini-01"), registry.resolve("mini-02")
+    assert (mini1.port, mini1.password, mini1.username, mini1.max_sessions) == (5900, "secret", "admin", 1)
+    assert (mini2.port, mini2.password, mini2.username) == (5901, "from-env", "ci")
+    assert registry.resolve() is default
+
+
+def test_load_hosts_file_errors(tmp_path):
+    """Test that invalid host files are reported."""
+    path = tmp_path / "hosts.json"
+
+    with pytest.raises(ValueError, match="Cannot read MACOS_HOSTS_FILE"):
+        load_hosts(hosts_file=str(path))
+    path.write_text(json.dumps({"mini-01": {"port": 5900}}))
+    with pytest.raises(ValueError, match="needs a 'host' setting"):
+        load_hosts(hosts_file=str(path))
+    path.write_text(json.dumps({"mini-01": {"host": "10.0.0.11", "pasword": "typo"}}))
+    with pytest.raises(ValueError, match="unknown settings: pasword"):
+        load_hosts(hosts_file=str(path))
@@ -0,0 +1,57 @@
+import io
+import os
+import sys
+import pytest
+from PIL import Image
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.image_encoder import encode_image, image_options, normalize_format
+
+
+@pytest.fixture
+def screenshot():
+    """A small screenshot-like image."""
+    img = Image.new('RGB', (64, 48), color=(30, 30, 30))
+    img.paste((255, 255, 255), (8, 8, 40, 20))
+    return img
+
+
+class TestImageEncoder:
+    """Test suite for the screenshot encoder."""
+
+    @pytest.mark.parametrize("image_format, expected", [
+        ("png", "PNG"),
+        ("jpeg", "JPEG"),
+        ("webp", "WEBP"),
+    ])
+    def test_encode_formats(self, screenshot, image_format, expected):
+        """Test that each format decodes back to an image of the same size."""
+        data = encode_image(screenshot, image_format, quality=70)
+        img = Image.open(io.BytesIO(data))
+        assert (img.format, img.size) == (expected, (64, 48))
+
+    def test_png_is_lossless(self, screenshot):
+        """Test that every PNG compression setting keeps the pixels intact."""
+        for compression in ("fast", "best", 0, "9"):
+            data = encode_image(screenshot, "png", compression=compression)
+            assert Image.open(io.BytesIO(data)).convert('RGB').tobytes() == screenshot.tobytes()
+
+    def test_invalid_options(self, screenshot):
+        """Test that unsupported formats and out of range settings are rejected."""
+        assert normalize_format("JPG") == "jpeg"
+        with pytest.raises(ValueError):
+            normalize_format("gif")
+        with pytest.raises(ValueError):
+            encode_image(screenshot, "jpeg", quality=0)
+        with pytest.raises(ValueError):
+            encode_image(screenshot, "png", compression="tiny")
+
+    def test_image_options(self):
+        """Test validating options without an image, filling in the defaults."""
+        assert image_options("JPG", "60", "9") == ("jpeg", 60, 9)
+        assert image_options("png") == ("png", 80, "fast")
+        with pytest.raises(ValueError, match="quality must be a number"):
+            image_options("jpeg", quality="high")
+        with pytest.raises(ValueError, match="compression level"):
+            image_options("png", compression=10)
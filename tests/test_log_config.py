@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import logging
+import pytest
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.log_config as log_config
+from src.log_config import SampledLogger, configure_logging, parse_levels
+
+
+@pytest.fixture
+def restore_logging():
+    """Put the root logger back the way the test run configured it."""
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    if log_config._handler is not None:
+        root.removeHandler(log_config._handler)
+        log_config._handler.close()
+        log_config._handler = None
+    root.handlers[:] = handlers
+    root.setLevel(level)
+    logging.getLogger('test_log_config').setLevel(logging.NOTSET)
+
+
+def test_parse_levels():
+    """Test parsing per-logger levels."""
+    assert parse_levels("vnc_client=debug, action_handlers=WARNING") == {
+        "vnc_client": logging.DEBUG, "action_handlers": logging.WARNING}
+    assert parse_levels("") == {}
+    with pytest.raises(ValueError, match="Unknown log level"):
+        parse_levels("vnc_client=LOUD")
+    with pytest.raises(ValueError, match="expected logger=LEVEL"):
+        parse_levels("vnc_client")
+
+
+def test_json_log_file(tmp_path, restore_logging):
+    """Test JSON lines written to a file, with extra fields and per-logger levels."""
+    path = tmp_path / "server.log"
+    configure_logging(level="WARNING", levels="test_log_config=INFO", log_format="json", log_file=str(path))
+    # Reconfiguring replaces the handler instead of adding another one
+    configure_logging(level="WARNING", levels="test_log_config=INFO", log_format="json", log_file=str(path))
+
+    logger = logging.getLogger('test_log_config')
+    logger.info("Connected to %s", "mini-01", extra={"host": "10.0.0.11"})
+    logging.getLogger('test_log_config_other').info("Not logged")
+    log_config._handler.flush()
+
+    entries = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(entries) == 1
+    assert entries[0]["message"] == "Connected to mini-01"
+    assert (entries[0]["level"], entries[0]["logger"], entries[0]["host"]) == ("INFO", "test_log_config", "10.0.0.11")
+
+    with pytest.raises(ValueError):
+        configure_logging(log_format="xml")
+
+
+def test_sampled_logger(caplog):
+    """Test that per-event messages are sampled and skipped when DEBUG is off."""
+    logger = logging.getLogger('test_log_config')
+    sampled = SampledLogger(logger, every=10)
+
+    with caplog.at_level(logging.INFO, logger='test_log_config'):
+        sampled.debug("Sending KeyEvent: key=0x%08x", 0x61)
+    assert caplog.records == []
+
+    with caplog.at_level(logging.DEBUG, logger='test_log_config'):
+        for key in range(25):
+            sampled.debug("Sending KeyEvent: key=0x%08x", key)
+    assert [record.getMessage() for record in caplog.records] == [
+        "Sending KeyEvent: key=0x00000000 (event 1, logging 1 in 10)",
+        "Sending KeyEvent: key=0x0000000a (event 11, logging 1 in 10)",
+        "Sending KeyEvent: key=0x00000014 (event 21, logging 1 in 10)",
+    ]
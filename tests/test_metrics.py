@@ -0,0 +1,71 @@
+import os
+import sys
+import urllib.request
+import pytest
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.metrics import Metrics, start_prometheus_server
+import src.metrics as metrics_module
+
+
+def test_counters_and_histograms():
+    """Test that values are kept per metric and label set."""
+    metrics = Metrics()
+    metrics.increment("vnc_connects_total", result="success")
+    metrics.increment("vnc_connects_total", result="success")
+    metrics.increment("vnc_connects_total", result="failure")
+    metrics.observe("vnc_capture_stage_seconds", 0.004, stage="encode")
+    metrics.observe("vnc_capture_stage_seconds", 0.02, stage="encode")
+
+    snapshot = metrics.snapshot()
+    assert snapshot["vnc_connects_total"] == [
+        {"labels": {"result": "failure"}, "value": 1}, {"labels": {"result": "success"}, "value": 2}]
+    encode = snapshot["vnc_capture_stage_seconds"][0]
+    assert encode["labels"] == {"stage": "encode"}
+    assert (encode["count"], encode["sum_ms"], encode["mean_ms"]) == (2, 24.0, 12.0)
+    assert (encode["buckets"]["0.0025"], encode["buckets"]["0.005"], encode["buckets"]["+Inf"]) == (0, 1, 2)
+
+    metrics.reset()
+    assert metrics.snapshot() == {}
+
+
+def test_timer_records_failures():
+    """Test that a timed block is recorded when it raises."""
+    metrics = Metrics()
+    with pytest.raises(RuntimeError):
+        with metrics.timer("mcp_tool_seconds", tool="remote_macos_get_screen"):
+            raise RuntimeError("boom")
+    assert metrics.snapshot()["mcp_tool_seconds"][0]["count"] == 1
+
+
+def test_prometheus_format():
+    """Test the Prometheus text exposition output."""
+    metrics = Metrics()
+    metrics.increment("vnc_pool_acquires_total", result="reused")
+    metrics.observe("vnc_handshake_seconds", 0.2)
+
+    lines = metrics.to_prometheus().splitlines()
+    assert "# TYPE vnc_pool_acquires_total counter" in lines
+    assert 'vnc_pool_acquires_total{result="reused"} 1' in lines
+    assert "# TYPE vnc_handshake_seconds histogram" in lines
+    assert 'vnc_handshake_seconds_bucket{le="0.1"} 0' in lines
+    assert 'vnc_handshake_seconds_bucket{le="0.25"} 1' in lines
+    assert 'vnc_handshake_seconds_bucket{le="+Inf"} 1' in lines
+    assert "vnc_handshake_seconds_count 1" in lines
+
+
+def test_prometheus_server():
+    """Test serving the shared metrics over HTTP."""
+    metrics_module.metrics.increment("mcp_tool_calls_total", tool="remote_macos_batch", result="ok")
+    server = start_prometheus_server(0, "127.0.0.1")
+    try:
+        url = f"http://127.0.0.1:{server.server_port}"
+        with urllib.request.urlopen(f"{url}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert 'mcp_tool_calls_total{result="ok",tool="remote_macos_batch"}' in response.read().decode()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/other", timeout=5)
+    finally:
+        server.shutdown()
+        server.server_close()
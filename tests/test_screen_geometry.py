@@ -0,0 +1,86 @@
+import os
+import sys
+import pytest
+from PIL import Image
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.screen_geometry import ScreenGeometry, screen_geometry
+
+
+class TestScreenGeometry:
+    """Test suite for the screen geometry."""
+
+    @pytest.mark.parametrize("screen, mode, expected", [
+        ((2560, 1600), "fit", (1229, 768)),
+        ((1920, 1080), "fit", (1366, 768)),  # 16:9 is not shaved to 1365x768
+        ((1024, 768), "fit", (1024, 768)),
+        ((2560, 1600), "width", (1366, 854)),
+        ((2560, 1600), "stretch", (1366, 768)),
+        ((2560, 1600), "native", (2560, 1600)),
+    ])
+    def test_output_size(self, screen, mode, expected):
+        """Test the output size of each mode."""
+        assert ScreenGeometry(*screen, output_size="1366x768", mode=mode).output_size == expected
+
+    def test_default_mode_keeps_output_size(self):
+        """Test that screenshots keep exactly the output size unless another mode is chosen."""
+        assert ScreenGeometry(2560, 1600, output_size="1366x768").output_size == (1366, 768)
+
+    def test_invalid_settings(self):
+        """Test that invalid settings are rejected."""
+        with pytest.raises(ValueError):
+            ScreenGeometry(1920, 1080, output_size="large")
+        with pytest.raises(ValueError):
+            ScreenGeometry(1920, 1080, mode="zoom")
+        with pytest.raises(ValueError):
+            ScreenGeometry(1920, 1080, resample="sinc")
+
+    def test_to_screen(self):
+        """Test mapping points to screen pixels."""
+        geometry = ScreenGeometry(2560, 1600, output_size="1366x768", mode="fit")
+        # Screenshot coordinates by default
+        assert geometry.to_screen(614.5, 384) == (1280, 800)
+        # Other reference sizes, and clamping to the screen
+        assert geometry.to_screen(683, 384, (1366, 768)) == (1280, 800)
+        assert geometry.to_screen(5000, -10, (1366, 768)) == (2559, 0)
+        with pytest.raises(ValueError):
+            geometry.to_screen(1, 1, (0, 768))
+
+    def test_region_to_screen(self):
+        """Test mapping regions from source coordinates to screen pixels."""
+        geometry = ScreenGeometry(2732, 1536, output_size="1366x768")
+        assert geometry.region_to_screen((683, 384, 100, 50)) == (1366, 768, 200, 100)
+        # Clipped to the screen
+        geometry = ScreenGeometry(1366, 768, output_size="1366x768")
+        assert geometry.region_to_screen((1300, 700, 100, 100), (1366, None)) == (1300, 700, 66, 68)
+        assert geometry.region_to_screen((1400, 0, 10, 10)) is None
+
+    @pytest.mark.parametrize("resample", ["reduce", "box", "bilinear", "lanczos"])
+    def test_scale_image(self, resample):
+        """Test that every filter scales to the output size and keeps flat colours."""
+        geometry = ScreenGeometry(2560, 1600, output_size="1366x768", mode="fit", resample=resample)
+        img = geometry.scale_image(Image.new('RGB', (2560, 1600), color=(200, 10, 10)))
+        assert img.size == (1229, 768)
+        assert img.getpixel((600, 400)) == (200, 10, 10)
+
+    def test_scale_thumbnail(self):
+        """Test that thumbnails fit their bounds and never exceed the output size."""
+        geometry = ScreenGeometry(2560, 1600, output_size="1366x768", mode="fit")
+        img = Image.new('RGB', (2560, 1600))
+        assert geometry.scale_thumbnail(img, (320, None)).size == (320, 200)
+        assert geometry.scale_thumbnail(img, (320, 100)).size == (160, 100)
+        assert geometry.scale_thumbnail(img, (4000, 4000)).size == (1229, 768)
+
+    def test_scale_region(self):
+        """Test that regions are widened to whole output pixels."""
+        geometry = ScreenGeometry(2732, 1536, output_size="1366x768")
+        img = Image.new('RGB', (2732, 1536))
+        region, crop = geometry.scale_region(img, (2701, 1500, 31, 36))
+        assert region == (1350, 750, 16, 18)
+        assert crop.size == (16, 18)
+
+    def test_cached_per_screen_size(self):
+        """Test that the geometry is computed once per screen size."""
+        assert screen_geometry(1920, 1080) is screen_geometry(1920, 1080)
+        assert screen_geometry(1920, 1080) is not screen_geometry(2560, 1600)
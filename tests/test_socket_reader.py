@@ -0,0 +1,70 @@
+import os
+import socket
+import sys
+import pytest
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.socket_reader import SocketReader
+
+
+@pytest.fixture
+def socket_pair():
+    """A connected pair of sockets."""
+    client_sock, server_sock = socket.socketpair()
+    client_sock.settimeout(5)
+    yield client_sock, server_sock
+    client_sock.close()
+    server_sock.close()
+
+
+class TestSocketReader:
+    """Test suite for SocketReader class."""
+
+    def test_small_reads_are_buffered(self, socket_pair):
+        """Test that several short messages are served from one receive."""
+        client_sock, server_sock = socket_pair
+        reader = SocketReader(client_sock, 64)
+        server_sock.sendall(b"\x00\x01abcdefgh")
+
+        assert bytes(reader.read(2)) == b"\x00\x01"
+        assert reader.buffered == 8
+        assert bytes(reader.read(3)) == b"abc"
+        assert bytes(reader.read(5)) == b"defgh"
+        assert reader.buffered == 0
+
+    def test_read_across_buffer_end(self, socket_pair):
+        """Test that unread bytes are kept when the buffer wraps."""
+        client_sock, server_sock = socket_pair
+        reader = SocketReader(client_sock, 8)
+        server_sock.sendall(b"0123456")
+        assert bytes(reader.read(5)) == b"01234"
+
+        server_sock.sendall(b"789")
+        assert bytes(reader.read(5)) == b"56789"
+
+    def test_large_reads_bypass_buffer(self, socket_pair):
+        """Test reads larger than the buffer, both as views and into a destination."""
+        client_sock, server_sock = socket_pair
+        reader = SocketReader(client_sock, 16)
+        payload = bytes(range(256)) * 4
+        server_sock.sendall(b"ab" + payload + payload)
+
+        assert bytes(reader.read(2)) == b"ab"
+        view = reader.read(len(payload))
+        assert isinstance(view, memoryview)
+        assert bytes(view) == payload
+
+        destination = bytearray(len(payload))
+        reader.readinto(memoryview(destination))
+        assert destination == payload
+
+    def test_connection_closed(self, socket_pair):
+        """Test that a short stream raises instead of returning partial data."""
+        client_sock, server_sock = socket_pair
+        reader = SocketReader(client_sock, 16)
+        server_sock.sendall(b"abc")
+        server_sock.shutdown(socket.SHUT_WR)
+
+        with pytest.raises(ConnectionError):
+            reader.read(4)
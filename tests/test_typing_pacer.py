@@ -0,0 +1,34 @@
+import os
+import sys
+import pytest
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.typing_pacer import TypingPacer
+
+
+class TestTypingPacer:
+    """Test suite for the typing pacer."""
+
+    def test_fixed_mode(self):
+        """Test that fixed mode types one character at a time with the configured delay."""
+        pacer = TypingPacer("fixed", delay_ms=25)
+        assert list(pacer.bursts("abc")) == ["a", "b", "c"]
+        assert (pacer.adaptive, pacer.delay) == (False, 0.025)
+
+    def test_adaptive_bursts(self):
+        """Test that bursts grow on fast acknowledgements and shrink on slow ones."""
+        pacer = TypingPacer("adaptive", max_burst=32)
+        bursts = []
+        for burst in pacer.bursts("x" * 100):
+            bursts.append(len(burst))
+            pacer.acknowledged(0.001 if len(bursts) < 3 else None)
+
+        # 8, 16, 32 on fast acknowledgements, then halving after each timeout
+        assert bursts == [8, 16, 32, 16, 8, 4, 2, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1]
+        assert sum(bursts) == 100
+
+    def test_invalid_mode(self):
+        """Test that unknown modes are rejected."""
+        with pytest.raises(ValueError):
+            TypingPacer("turbo")
@@ -3,12 +3,20 @@ import sys
 import pytest
 from unittest.mock import patch, MagicMock, call
 import io
+import numpy as np
 from PIL import Image
 import socket
+import threading
+import time
+import zlib
 
 # Add src to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from src.vnc_client import VNCClient, encrypt_MACOS_PASSWORD, capture_vnc_screen, PixelFormat
+from src.clipboard import Clipboard
+from src.framebuffer import Framebuffer
+from src.vnc_client import (VNCClient, encrypt_MACOS_PASSWORD, capture_vnc_screen, capture_vnc_screen_region,
+                            wait_for_vnc_screen, PixelFormat, Encoding,
+                            ServerMessage, SUPPORTED_ENCODINGS)
 
 class TestVNCClient:
     """Test suite for VNCClient class."""
@@ -100,6 +108,187 @@ class TestVNCClient:
         mock_socket.close.assert_called_once()
         assert vnc_client.socket is None
     
+    def test_is_alive(self, vnc_client, mock_socket):
+        """Test the non-blocking connection health check."""
+        # Not connected
+        assert vnc_client.is_alive() is False
+
+        # Connected and quiet
+        vnc_client.socket = mock_socket
+        with patch('src.vnc_client.select.select', return_value=([], [], [])):
+            assert vnc_client.is_alive() is True
+
+        # Closed by the server or unexpected data pending
+        with patch('src.vnc_client.select.select', return_value=([mock_socket], [], [])):
+            assert vnc_client.is_alive() is False
+
+    def test_is_alive_consumes_idle_messages(self, vnc_client):
+        """Test that clipboard changes sent while idle are consumed, other messages are not expected."""
+        client_sock, server_sock = socket.socketpair()
+        try:
+            vnc_client.socket = client_sock
+            server_sock.sendall(bytes([2, 3, 0, 0, 0, 0, 0, 0, 2]) + b"hi")
+            assert vnc_client.is_alive() is True
+            assert vnc_client.clipboard.text == "hi"
+            server_sock.sendall(bytes([0]))
+            assert vnc_client.is_alive() is False
+        finally:
+            client_sock.close()
+            server_sock.close()
+
+    def test_oversized_clipboard_is_skipped(self, vnc_client):
+        """Test that clipboard text over VNC_CLIPBOARD_MAX_SIZE is skipped without losing the stream."""
+        client_sock, server_sock = socket.socketpair()
+        try:
+            vnc_client.socket = client_sock
+            vnc_client.clipboard = Clipboard(max_size=10)
+            large = b"x" * 200000
+            threading.Thread(target=server_sock.sendall,
+                             args=(bytes([3, 0, 0, 0]) + len(large).to_bytes(4, 'big') + large
+                                   + bytes([3, 0, 0, 0, 0, 0, 0, 2]) + b"ok",), daemon=True).start()
+            with patch.object(vnc_client, '_recv_exact', wraps=vnc_client._recv_exact) as recv_exact:
+                assert vnc_client._read_unsolicited()
+                assert all(size < len(large) for (size,), _ in recv_exact.call_args_list)
+            assert vnc_client.clipboard.text is None
+            assert vnc_client._read_unsolicited()
+            assert vnc_client.clipboard.text == "ok"
+        finally:
+            client_sock.close()
+            server_sock.close()
+
+    def test_frame_receiver(self, vnc_client):
+        """Test that the background receiver keeps the latest frame available."""
+        # Arrange - a connected client on one end of a socket pair
+        client_sock, server_sock = socket.socketpair()
+        vnc_client.socket = client_sock
+        vnc_client.width, vnc_client.height = 2, 1
+        vnc_client.pixel_format = PixelFormat(bytes([32, 24, 1, 1, 0, 255, 0, 255, 0, 255, 16, 8, 0, 0, 0, 0]))
+
+        def framebuffer_update(pixels: bytes) -> bytes:
+            return (bytes([0, 0]) + (1).to_bytes(2, 'big') + bytes(4)
+                    + (2).to_bytes(2, 'big') + (1).to_bytes(2, 'big') + bytes(4) + pixels)
+
+        try:
+            # Act
+            assert vnc_client.start_frame_receiver() is True
+            request = server_sock.recv(10)
+            server_sock.sendall(framebuffer_update(bytes(8)))
+            first = vnc_client.get_latest_frame(timeout=5)
+
+            # The receiver immediately asks for the next incremental update
+            next_request = server_sock.recv(10)
+            server_sock.sendall(bytes([2]))  # Bell messages are counted
+            server_sock.sendall(framebuffer_update(bytes([255, 255, 255, 255]) * 2))
+            for _ in range(50):
+                if vnc_client.frame_sequence >= 2:
+                    break
+                time.sleep(0.02)
+
+            # Assert
+            assert request[0:2] == bytes([3, 0])  # full update first
+            assert next_request[0:2] == bytes([3, 1])  # then incremental
+            assert first.size == (2, 1)
+            assert vnc_client.frame_sequence == 2
+            assert vnc_client.bell_count == 1
+            assert vnc_client.frame_age() is not None
+            assert vnc_client.is_alive() is True
+            png = vnc_client.capture_screen()
+            assert Image.open(io.BytesIO(png)).getpixel((0, 0)) != (0, 0, 0)
+        finally:
+            vnc_client.close()
+            server_sock.close()
+
+        assert vnc_client.frame_receiver_running() is False
+        assert vnc_client.socket is None
+
+    def test_round_trip_with_frame_receiver(self, vnc_client):
+        """Test that the receiver only counts updates read after the request as its reply."""
+        client_sock, server_sock = socket.socketpair()
+        vnc_client.socket = client_sock
+        vnc_client.width, vnc_client.height = 2, 1
+        vnc_client.pixel_format = PixelFormat(bytes([32, 24, 1, 1, 0, 255, 0, 255, 0, 255, 16, 8, 0, 0, 0, 0]))
+        update = (bytes([0, 0]) + (1).to_bytes(2, 'big') + bytes(4) + (1).to_bytes(2, 'big')
+                  + (1).to_bytes(2, 'big') + bytes(4) + bytes(4))
+
+        try:
+            assert vnc_client.start_frame_receiver()
+            server_sock.recv(10)
+            server_sock.sendall(update)
+            assert vnc_client.get_latest_frame(timeout=5) is not None
+
+            # An update that arrived before the request does not answer it
+            assert vnc_client.round_trip(0.2) is None
+            assert vnc_client._acks_pending == 1
+
+            # The late reply is counted off, then the next request gets its own
+            server_sock.sendall(update)
+            for _ in range(50):
+                if not vnc_client._acks_pending:
+                    break
+                time.sleep(0.02)
+            threading.Timer(0.1, server_sock.sendall, [update]).start()
+            assert vnc_client.round_trip(2) is not None
+            assert vnc_client._acks_pending == 0
+        finally:
+            vnc_client.close()
+            server_sock.close()
+
+    def test_stop_frame_receiver_drains_updates_in_flight(self, vnc_client):
+        """Test that an update still in flight when the receiver stops is applied, not left for the next request."""
+        client_sock, server_sock = socket.socketpair()
+        vnc_client.socket = client_sock
+        vnc_client.width, vnc_client.height = 1, 1
+        vnc_client.pixel_format = PixelFormat(bytes([32, 24, 1, 1, 0, 255, 0, 255, 0, 255, 16, 8, 0, 0, 0, 0]))
+        update = (bytes([0, 0]) + (1).to_bytes(2, 'big') + bytes(4) + (1).to_bytes(2, 'big')
+                  + (1).to_bytes(2, 'big') + bytes(4) + bytes(4))
+
+        try:
+            assert vnc_client.start_frame_receiver()
+            server_sock.recv(10)
+            server_sock.sendall(update)
+            assert vnc_client.get_latest_frame(timeout=5) is not None
+            server_sock.recv(10)
+
+            threading.Timer(0.05, server_sock.sendall, [update]).start()
+            with patch('src.vnc_client.RECEIVER_DRAIN_TIMEOUT', 1.0):
+                vnc_client.stop_frame_receiver()
+
+            assert vnc_client.frame_sequence == 2
+            assert vnc_client.is_alive()
+        finally:
+            vnc_client.close()
+            server_sock.close()
+
+    def test_stop_frame_receiver_closes_when_thread_hangs(self, vnc_client):
+        """Test that a receiver which does not stop in time gets its connection dropped."""
+        vnc_client.socket = MagicMock()
+        release = threading.Event()
+        vnc_client._receiver = threading.Thread(target=release.wait, daemon=True)
+        vnc_client._receiver.start()
+        try:
+            vnc_client.stop_frame_receiver(timeout=0.05)
+            assert vnc_client.socket is None
+            assert not vnc_client.is_alive()
+        finally:
+            release.set()
+
+    def test_frame_receiver_closes_on_server_disconnect(self, vnc_client):
+        """Test that a failed receiver drops the connection so the pool replaces it."""
+        client_sock, server_sock = socket.socketpair()
+        vnc_client.socket = client_sock
+        vnc_client.width, vnc_client.height = 2, 1
+
+        vnc_client.start_frame_receiver()
+        server_sock.recv(10)
+        server_sock.close()
+        for _ in range(50):
+            if vnc_client.socket is None:
+                break
+            time.sleep(0.02)
+
+        assert vnc_client.socket is None
+        assert vnc_client.is_alive() is False
+
     @patch('pyDes.des')
     def test_encrypt_password(self, mock_des):
         """Test VNC password encryption."""
@@ -152,6 +341,550 @@ class TestVNCClient:
         assert pixel_format.green_shift == 8
         assert pixel_format.blue_shift == 0
     
+    def test_decode_zrle_rect(self, vnc_client):
+        """Test ZRLE subencodings decoded from one persistent zlib stream."""
+        vnc_client.pixel_format = PixelFormat(bytes([32, 24, 1, 1, 0, 255, 0, 255, 0, 255, 16, 8, 0, 0, 0, 0]))
+        red, green, blue = bytes([255, 0, 0]), bytes([0, 255, 0]), bytes([0, 0, 255])
+        compressor = zlib.compressobj()
+
+        def zrle(tiles: bytes) -> bytes:
+            return compressor.compress(tiles) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+        fb = Framebuffer(70, 6, vnc_client.pixel_format)
+        # Solid tiles, split at the 64 pixel tile boundary
+        assert vnc_client._decode_zrle_rect(zrle(bytes([1]) + red + bytes([1]) + green), 0, 0, 70, 1, fb)
+        # Raw CPIXELs
+        assert vnc_client._decode_zrle_rect(zrle(bytes([0]) + red + green + blue + red), 0, 1, 4, 1, fb)
+        # Packed palette with 2 colours: 1 bit per pixel, MSB first
+        assert vnc_client._decode_zrle_rect(zrle(bytes([2]) + red + blue + bytes([0b01100000])), 0, 2, 4, 1, fb)
+        # Plain RLE: 3 x green, 1 x blue
+        assert vnc_client._decode_zrle_rect(zrle(bytes([128]) + green + bytes([2]) + blue + bytes([0])), 0, 3, 4, 1, fb)
+        # Palette RLE: a single blue pixel followed by a run of 3 red pixels
+        assert vnc_client._decode_zrle_rect(zrle(bytes([130]) + red + blue + bytes([1, 0x80, 2])), 0, 4, 4, 1, fb)
+        # Run length of 255 + 255 + 0 + 1 = 511 pixels across a 64x8 tile
+        big = Framebuffer(64, 8, vnc_client.pixel_format)
+        assert vnc_client._decode_zrle_rect(zrle(bytes([128]) + red + bytes([255, 255, 0]) + blue + bytes([0])),
+                                            0, 0, 64, 8, big)
+
+        img, big = fb.to_image(), big.to_image()
+        row = lambda y: [img.getpixel((x, y)) for x in range(4)]
+        assert img.getpixel((63, 0)) == (255, 0, 0)
+        assert img.getpixel((64, 0)) == (0, 255, 0)
+        assert row(1) == [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 0, 0)]
+        assert row(2) == [(255, 0, 0), (0, 0, 255), (0, 0, 255), (255, 0, 0)]
+        assert row(3) == [(0, 255, 0)] * 3 + [(0, 0, 255)]
+        assert row(4) == [(0, 0, 255)] + [(255, 0, 0)] * 3
+        assert big.getpixel((62, 7)) == (255, 0, 0)
+        assert big.getpixel((63, 7)) == (0, 0, 255)
+
+    def test_decode_zrle_rect_invalid(self, vnc_client):
+        """Test that corrupt ZRLE data is reported as a failure."""
+        vnc_client.pixel_format = PixelFormat(bytes([32, 24, 1, 1, 0, 255, 0, 255, 0, 255, 16, 8, 0, 0, 0, 0]))
+        fb = Framebuffer(4, 1, vnc_client.pixel_format)
+        assert vnc_client._decode_zrle_rect(b'not zlib data', 0, 0, 4, 1, fb) is False
+        assert vnc_client._decode_zrle_rect(zlib.compress(bytes([129])), 0, 0, 4, 1, fb) is False
+
+    def test_capture_screen_zrle(self, vnc_client):
+        """Test a capture answered with a ZRLE rectangle."""
+        client_sock, server_sock = socket.socketpair()
+        vnc_client.socket = client_sock
+        vnc_client.width, vnc_client.height = 2, 1
+        vnc_client.pixel_format = PixelFormat(bytes([32, 24, 1, 1, 0, 255, 0, 255, 0, 255, 16, 8, 0, 0, 0, 0]))
+        payload = zlib.compress(bytes([0, 255, 0, 0, 0, 0, 255]))
+        server_sock.sendall(bytes([0, 0]) + (1).to_bytes(2, 'big') + bytes(4)
+                            + (2).to_bytes(2, 'big') + (1).to_bytes(2, 'big') + (16).to_bytes(4, 'big')
+                            + len(payload).to_bytes(4, 'big') + payload)
+        try:
+            png = vnc_client.capture_screen()
+            img = Image.open(io.BytesIO(png))
+            assert img.getpixel((0, 0)) == (255, 0, 0)
+            assert img.getpixel((1, 0)) == (0, 0, 255)
+        finally:
+            vnc_client.close()
+            server_sock.close()
+
+    def test_capture_screen_tight(self, vnc_client):
+        """Test a capture answered with Tight fill, JPEG, copy, palette and gradient rectangles."""
+        client_sock, server_sock = socket.socketpair()
+        vnc_client.socket = client_sock
+        vnc_client.width, vnc_client.height = 8, 6
+        vnc_client.pixel_format = PixelFormat(bytes([32, 24, 1, 1, 0, 255, 0, 255, 0, 255, 16, 8, 0, 0, 0, 0]))
+        compressors = [zlib.compressobj(), zlib.compressobj()]
+
+        def rect(x: int, y: int, width: int, height: int, body: bytes) -> bytes:
+            return (x.to_bytes(2, 'big') + y.to_bytes(2, 'big') + width.to_bytes(2, 'big')
+                    + height.to_bytes(2, 'big') + (7).to_bytes(4, 'big') + body)
+
+        def compressed(data: bytes, stream_id: int) -> bytes:
+            payload = compressors[stream_id].compress(data) + compressors[stream_id].flush(zlib.Z_SYNC_FLUSH)
+            assert len(payload) < 128  # one byte compact length
+            return bytes([len(payload)]) + payload
+
+        jpeg = io.BytesIO()
+        Image.new('RGB', (8, 1), (0, 0, 255)).save(jpeg, format='JPEG', quality=95)
+        jpeg = jpeg.getvalue()
+        jpeg_length = bytes([(len(jpeg) & 0x7F) | 0x80, len(jpeg) >> 7])
+
+        rects = [
+            # Fill the whole screen green
+            rect(0, 0, 8, 6, bytes([0x80, 0, 255, 0])),
+            # JPEG row
+            rect(0, 1, 8, 1, bytes([0x90]) + jpeg_length + jpeg),
+            # Basic copy filter below the compression threshold: two red pixels, sent uncompressed
+            rect(0, 2, 2, 1, bytes([0x00]) + bytes([255, 0, 0]) * 2),
+            # Basic copy filter with zlib, resetting stream 0 first
+            rect(0, 3, 8, 1, bytes([0x01]) + compressed(bytes([255, 0, 0]) * 8, 0)),
+            # Two colour palette, 1 bit per pixel: red, blue, blue, red, ...
+            rect(0, 4, 8, 1, bytes([0x40, 1, 1, 255, 0, 0, 0, 0, 255, 0b01100110])),
+            # Gradient filter on stream 1: a constant row of (10, 20, 30) encoded as deltas from the left
+            rect(0, 5, 8, 1, bytes([0x50, 2]) + compressed(bytes([10, 20, 30]) + bytes(21), 1)),
+        ]
+        server_sock.sendall(bytes([0, 0]) + len(rects).to_bytes(2, 'big') + b''.join(rects))
+        try:
+            png = vnc_client.capture_screen()
+            img = Image.open(io.BytesIO(png))
+            assert img.getpixel((7, 0)) == (0, 255, 0)
+            r, g, b = img.getpixel((3, 1))
+            assert b > 200 and r < 40 and g < 40
+            assert [img.getpixel((x, 2)) for x in range(3)] == [(255, 0, 0), (255, 0, 0), (0, 255, 0)]
+            assert img.getpixel((7, 3)) == (255, 0, 0)
+            assert [img.getpixel((x, 4)) for x in range(4)] == [(255, 0, 0), (0, 0, 255), (0, 0, 255), (255, 0, 0)]
+            assert [img.getpixel((x, 5)) for x in (0, 7)] == [(10, 20, 30), (10, 20, 30)]
+        finally:
+            vnc_client.close()
+            server_sock.close()
+
+    def test_tight_gradient(self):
+        """Test the vectorized gradient filter against the per-byte predictor of the spec."""
+        width, height = 13, 7
+        data = os.urandom(width * height * 3)
+
+        row = width * 3
+        expected = bytearray(len(data))
+        for pos in range(len(data)):
+            column = pos % row
+            left = expected[pos - 3] if column >= 3 else 0
+            above = expected[pos - row] if pos >= row else 0
+            above_left = expected[pos - row - 3] if pos >= row and column >= 3 else 0
+            expected[pos] = (min(max(left + above - above_left, 0), 255) + data[pos]) & 0xFF
+
+        assert VNCClient._tight_gradient(data, width, height) == bytes(expected)
+        assert VNCClient._tight_gradient(data[:3], 1, 1) == data[:3]
+
+    def test_tight_gradient_16_bit(self, vnc_client):
+        """Test the gradient filter on 16-bit pixels, predicted per colour channel."""
+        # Little-endian RGB565
+        vnc_client.pixel_format = PixelFormat(bytes([16, 16, 0, 1, 0, 31, 0, 63, 0, 31, 11, 5, 0, 0, 0, 0]))
+        width, height = 5, 4
+        diffs = np.frombuffer(os.urandom(width * height * 2), dtype='<u2').reshape(height, width)
+        shifts, maxes = (11, 5, 0), (31, 63, 31)
+
+        expected = np.zeros((height, width), dtype=np.uint32)
+        for y in range(height):
+            for x in range(width):
+                value = 0
+                for shift, channel_max in zip(shifts, maxes):
+                    def channel(yy, xx):
+                        return (int(expected[yy, xx]) >> shift) & channel_max if yy >= 0 and xx >= 0 else 0
+                    prediction = min(max(channel(y, x - 1) + channel(y - 1, x) - channel(y - 1, x - 1), 0), channel_max)
+                    value |= ((prediction + ((int(diffs[y, x]) >> shift) & channel_max)) & channel_max) << shift
+                expected[y, x] = value
+
+        pixels = vnc_client._tight_gradient_pixels(diffs.tobytes(), width, height)
+        assert pixels.shape == (height, width, 2)
+        assert pixels.tobytes() == expected.astype('<u2').tobytes()
+
+    def test_capture_screen_hextile_and_rre(self, vnc_client):
+        """Test a capture answered with Hextile and RRE rectangles and a skipped cursor."""
+        client_sock, server_sock = socket.socketpair()
+        vnc_client.socket = client_sock
+        vnc_client.width, vnc_client.height = 20, 3
+        vnc_client.pixel_format = PixelFormat(bytes([32, 24, 1, 1, 0, 255, 0, 255, 0, 255, 16, 8, 0, 0, 0, 0]))
+        red, green, blue = bytes([0, 255, 0, 0]), bytes([0, 0, 255, 0]), bytes([0, 0, 0, 255])
+
+        def rect(x: int, y: int, width: int, height: int, encoding: int, body: bytes) -> bytes:
+            return (x.to_bytes(2, 'big') + y.to_bytes(2, 'big') + width.to_bytes(2, 'big')
+                    + height.to_bytes(2, 'big') + encoding.to_bytes(4, 'big', signed=True) + body)
+
+        hextile = (
+            # Tile 1 (16x2): red background, one blue foreground subrect at (1, 0) sized 2x1
+            bytes([2 | 4 | 8]) + red + blue + bytes([1, 0x10, 0x10])
+            # Tile 2 (4x2): background carried over, one coloured green subrect at (0, 1) sized 1x1
+            + bytes([8 | 16, 1]) + green + bytes([0x01, 0x00])
+        )
+        rre = (1).to_bytes(4, 'big') + green + blue + (1).to_bytes(2, 'big') + bytes(2) + (1).to_bytes(2, 'big') + (1).to_bytes(2, 'big')
+        rects = [
+            rect(0, 0, 20, 2, 5, hextile),
+            rect(0, 2, 4, 1, 2, rre),
+            # Cursor shape is not decoded yet, but its payload size is known
+            rect(0, 0, 2, 2, -239, bytes(2 * 2 * 4 + 2)),
+        ]
+        server_sock.sendall(bytes([0, 0]) + len(rects).to_bytes(2, 'big') + b''.join(rects))
+        try:
+            png = vnc_client.capture_screen()
+            img = Image.open(io.BytesIO(png))
+            assert [img.getpixel((x, 0)) for x in range(4)] == [(255, 0, 0), (0, 0, 255), (0, 0, 255), (255, 0, 0)]
+            assert img.getpixel((16, 0)) == (255, 0, 0)
+            assert img.getpixel((16, 1)) == (0, 255, 0)
+            assert [img.getpixel((x, 2)) for x in range(3)] == [(0, 255, 0), (0, 0, 255), (0, 255, 0)]
+        finally:
+            vnc_client.close()
+            server_sock.close()
+
+    def test_capture_screen_unknown_encoding_closes(self, vnc_client):
+        """Test that an undecodable rectangle drops the connection instead of desynchronizing it."""
+        client_sock, server_sock = socket.socketpair()
+        vnc_client.socket = client_sock
+        vnc_client.width, vnc_client.height = 2, 1
+        vnc_client.pixel_format = PixelFormat(bytes([32, 24, 1, 1, 0, 255, 0, 255, 0, 255, 16, 8, 0, 0, 0, 0]))
+        server_sock.sendall(bytes([0, 0, 0, 1]) + bytes(4) + (2).to_bytes(2, 'big') + (1).to_bytes(2, 'big')
+                            + (6).to_bytes(4, 'big') + bytes(16))
+        try:
+            assert vnc_client.capture_screen() is None
+            assert vnc_client.socket is None
+        finally:
+            server_sock.close()
+
+    def test_capture_screen_colour_map(self):
+        """Test a capture in the server's native colour map format."""
+        vnc_client = VNCClient(host="test_host", color_depth="server")
+        assert vnc_client._pixel_format_message() is None
+
+        client_sock, server_sock = socket.socketpair()
+        vnc_client.socket = client_sock
+        vnc_client.width, vnc_client.height = 2, 1
+        vnc_client.pixel_format = PixelFormat(bytes([8, 8, 0, 0] + [0] * 12))
+        # SetColourMapEntries for indices 1 and 2 (16-bit values), then a RAW update
+        colour_map = bytes([1, 0]) + (1).to_bytes(2, 'big') + (2).to_bytes(2, 'big') + bytes(
+            [0xFF, 0xFF, 0, 0, 0, 0, 0, 0, 0, 0, 0xFF, 0xFF])
+        update = (bytes([0, 0]) + (1).to_bytes(2, 'big') + bytes(4) + (2).to_bytes(2, 'big')
+                  + (1).to_bytes(2, 'big') + bytes(4) + bytes([2, 1]))
+        server_sock.sendall(colour_map + update)
+        try:
+            img = Image.open(io.BytesIO(vnc_client.capture_screen()))
+            assert img.getpixel((0, 0)) == (0, 0, 255)
+            assert img.getpixel((1, 0)) == (255, 0, 0)
+        finally:
+            vnc_client.close()
+            server_sock.close()
+
+    def test_changes_since(self):
+        """Test tracking which screen regions changed between captures."""
+        vnc_client = VNCClient(host="test_host")
+        client_sock, server_sock = socket.socketpair()
+        vnc_client.socket = client_sock
+        vnc_client.width, vnc_client.height = 128, 64
+        vnc_client.pixel_format = PixelFormat(bytes([32, 24, 1, 1, 0, 255, 0, 255, 0, 255, 16, 8, 0, 0, 0, 0]))
+
+        def full_update(pixels: bytes) -> bytes:
+            # One RAW rectangle covering the whole screen
+            return (bytes([0, 0]) + (1).to_bytes(2, 'big') + bytes(4) + (128).to_bytes(2, 'big')
+                    + (64).to_bytes(2, 'big') + bytes(4) + pixels)
+
+        try:
+            screen = bytearray(128 * 64 * 4)
+            # Until deltas are asked for, a full update is not compared with the previous frame
+            for _ in range(2):
+                server_sock.sendall(full_update(bytes(screen)))
+                assert vnc_client.capture_image() is not None
+            assert vnc_client._frame_changes[-1] == (2, [(0, 0, 128, 64)])
+
+            first = vnc_client.frame_id()
+            assert vnc_client.changes_since(first) == []
+
+            # Change one pixel in the right-hand tile; the server still resends everything
+            screen[(10 * 128 + 100) * 4:(10 * 128 + 101) * 4] = bytes([0, 255, 255, 255])
+            server_sock.sendall(full_update(bytes(screen)))
+            assert vnc_client.capture_image() is not None
+
+            assert vnc_client.frame_id() != first
+            assert vnc_client.changes_since(first) == [(64, 0, 64, 64)]
+            assert vnc_client.changes_since(vnc_client.frame_id()) == []
+            # Frames of other connections, or from the future, need a full screenshot
+            assert vnc_client.changes_since("other:1") is None
+            assert vnc_client.changes_since(f"{vnc_client.session_id}:99") is None
+        finally:
+            vnc_client.close()
+            server_sock.close()
+
+    def test_capture_image_region(self):
+        """Test that a region capture only requests and converts that region."""
+        vnc_client = VNCClient(host="test_host")
+        client_sock, server_sock = socket.socketpair()
+        vnc_client.socket = client_sock
+        vnc_client.width, vnc_client.height = 100, 80
+        vnc_client.pixel_format = PixelFormat(bytes([32, 24, 1, 1, 0, 255, 0, 255, 0, 255, 16, 8, 0, 0, 0, 0]))
+        # The server answers with just the requested 3x2 rectangle at (10, 20)
+        update = (bytes([0, 0]) + (1).to_bytes(2, 'big') + (10).to_bytes(2, 'big') + (20).to_bytes(2, 'big')
+                  + (3).to_bytes(2, 'big') + (2).to_bytes(2, 'big') + bytes(4) + bytes([0, 255, 0, 0]) * 6)
+        server_sock.sendall(update)
+        try:
+            img = vnc_client.capture_image(region=(10, 20, 3, 2))
+            request = server_sock.recv(10)
+            assert request == bytes([3, 0, 0, 10, 0, 20, 0, 3, 0, 2])
+            assert img.size == (3, 2)
+            assert img.getpixel((2, 1)) == (255, 0, 0)
+        finally:
+            vnc_client.close()
+            server_sock.close()
+
+    @patch('src.vnc_client.time.sleep')
+    def test_input_events_are_coalesced(self, mock_sleep, vnc_client):
+        """Test that each keystroke and key combination is sent in a single write."""
+        vnc_client.socket = MagicMock()
+        vnc_client.width, vnc_client.height = 100, 100
+
+        assert vnc_client.send_key_combination([0xffeb, ord('v')])
+        assert vnc_client.send_text("Hi", mode="fixed")
+        assert vnc_client.send_mouse_click(10, 20)
+
+        writes = [call.args[0] for call in vnc_client.socket.sendall.call_args_list]
+        assert [len(data) for data in writes] == [32, 32, 16, 12, 6]
+        assert writes[1][:8] == bytes([4, 1, 0, 0, 0, 0, 0xff, 0xe1])  # Shift for "H"
+
+    @patch('src.vnc_client.time.sleep')
+    def test_long_text_is_typed_unless_paste_is_enabled(self, mock_sleep, vnc_client):
+        """Test that the clipboard is only used for long text when VNC_PASTE_THRESHOLD is set."""
+        vnc_client.socket = MagicMock()
+        vnc_client.width, vnc_client.height = 100, 100
+        text = "a" * 300
+
+        with patch.object(vnc_client, 'paste_text', return_value=True) as mock_paste:
+            assert vnc_client.send_text(text, mode="fixed")
+            mock_paste.assert_not_called()
+            assert vnc_client.socket.sendall.call_count == 300
+
+            with patch('src.vnc_client.VNC_PASTE_THRESHOLD', 200):
+                assert vnc_client.send_text(text, mode="fixed")
+            mock_paste.assert_called_once_with(text)
+
+    def test_send_text_adaptive(self, vnc_client):
+        """Test that adaptive typing sends growing bursts, each acknowledged by the server."""
+        client_sock, server_sock = socket.socketpair()
+        vnc_client.socket = client_sock
+        vnc_client.width, vnc_client.height = 2, 1
+        vnc_client.pixel_format = PixelFormat(bytes([32, 24, 1, 1, 0, 255, 0, 255, 0, 255, 16, 8, 0, 0, 0, 0]))
+        received = []
+
+        def server():
+            # Answer every update request with a 1x1 raw update and record the key presses
+            reader = server_sock.makefile('rb')
+            while True:
+                message_type = reader.read(1)
+                if not message_type:
+                    return
+                body = reader.read({3: 9, 4: 7}[message_type[0]])
+                if message_type[0] == 4 and body[0]:
+                    received.append(int.from_bytes(body[3:7], 'big'))
+                elif message_type[0] == 3:
+                    received.append("ack")
+                    server_sock.sendall(bytes([0, 0, 0, 1]) + bytes(4) + (1).to_bytes(2, 'big')
+                                       + (1).to_bytes(2, 'big') + bytes(4) + bytes(4))
+
+        thread = threading.Thread(target=server, daemon=True)
+        thread.start()
+        try:
+            text = "abcdefghij" * 4
+            assert vnc_client.send_text(text, mode="adaptive")
+        finally:
+            client_sock.close()
+            thread.join(timeout=5)
+            server_sock.close()
+
+        assert [key for key in received if key != "ack"] == [ord(char) for char in text]
+        # Bursts of 8, 16 and the remaining 16 characters
+        assert received.count("ack") == 3
+        assert received[8] == "ack"
+
+    def test_round_trip_timeout(self, vnc_client):
+        """Test that an unanswered round trip returns after its timeout and keeps the connection."""
+        client_sock, server_sock = socket.socketpair()
+        client_sock.settimeout(10)
+        vnc_client.socket = client_sock
+        vnc_client.width, vnc_client.height = 2, 1
+        vnc_client.pixel_format = PixelFormat(bytes([32, 24, 1, 1, 0, 255, 0, 255, 0, 255, 16, 8, 0, 0, 0, 0]))
+        reply = (bytes([0, 0]) + (1).to_bytes(2, 'big') + bytes(4) + (1).to_bytes(2, 'big')
+                 + (1).to_bytes(2, 'big') + bytes(4) + bytes(4))
+
+        try:
+            start = time.monotonic()
+            assert vnc_client.round_trip(0.2) is None
+            assert time.monotonic() - start < 1
+            assert vnc_client.socket is not None
+
+            # The late reply is read before the reply to the next request
+            server_sock.sendall(reply + reply)
+            assert vnc_client.round_trip(1) is not None
+            assert vnc_client.frame_sequence == 2
+            assert vnc_client.is_alive()
+        finally:
+            vnc_client.close()
+            server_sock.close()
+
+    def test_clipboard(self, vnc_client):
+        """Test setting the clipboard and reading back text copied on the server."""
+        client_sock, server_sock = socket.socketpair()
+        vnc_client.socket = client_sock
+        vnc_client.width, vnc_client.height = 2, 1
+        vnc_client.pixel_format = PixelFormat(bytes([32, 24, 1, 1, 0, 255, 0, 255, 0, 255, 16, 8, 0, 0, 0, 0]))
+        received = []
+
+        def server():
+            # Send the clipboard after Command+C, ahead of the reply to the next update request
+            reader = server_sock.makefile('rb')
+            while True:
+                message_type = reader.read(1)
+                if not message_type:
+                    return
+                if message_type[0] == 6:
+                    received.append(reader.read(int.from_bytes(reader.read(7)[3:7], 'big')))
+                    continue
+                body = reader.read({3: 9, 4: 7}[message_type[0]])
+                if message_type[0] == 4 and body[0] and body[3:7] == ord('c').to_bytes(4, 'big'):
+                    server_sock.sendall(bytes([3, 0, 0, 0, 0, 0, 0, 6]) + b"copied")
+                elif message_type[0] == 3:
+                    server_sock.sendall(bytes([0, 0, 0, 1]) + bytes(4) + (1).to_bytes(2, 'big')
+                                       + (1).to_bytes(2, 'big') + bytes(4) + bytes(4))
+
+        thread = threading.Thread(target=server, daemon=True)
+        thread.start()
+        try:
+            assert vnc_client.set_clipboard("hello")
+            assert vnc_client.get_clipboard(copy_selection=True, timeout=2) == "copied"
+            assert vnc_client.get_clipboard() == "copied"
+            assert vnc_client.is_alive()
+        finally:
+            client_sock.close()
+            thread.join(timeout=5)
+            server_sock.close()
+
+        assert received == [b"hello"]
+
+    def test_server_messages_before_update(self, vnc_client):
+        """Test that server messages ahead of an update are dispatched to their handlers."""
+        client_sock, server_sock = socket.socketpair()
+        vnc_client.socket = client_sock
+        vnc_client.width, vnc_client.height = 1, 1
+        vnc_client.pixel_format = PixelFormat(bytes([32, 24, 1, 1, 0, 255, 0, 255, 0, 255, 16, 8, 0, 0, 0, 0]))
+        update = (bytes([0, 0, 0, 1]) + bytes(4) + (1).to_bytes(2, 'big') + (1).to_bytes(2, 'big')
+                  + bytes(4) + bytes([0, 0, 255, 0]))
+        # EndOfContinuousUpdates (150) has no body
+        end_of_updates = []
+        vnc_client.register_message_handler(150, lambda: end_of_updates.append(True) or True)
+
+        try:
+            server_sock.sendall(bytes([2, 150, 3, 0, 0, 0, 0, 0, 0, 2]) + b"hi" + update)
+            assert vnc_client.capture_image().getpixel((0, 0)) == (0, 255, 0)
+            assert (vnc_client.bell_count, end_of_updates, vnc_client.clipboard.text) == (1, [True], "hi")
+
+            # A message without a handler cannot be skipped
+            server_sock.sendall(bytes([151]) + update)
+            assert vnc_client.capture_image() is None
+            assert vnc_client.socket is None
+        finally:
+            client_sock.close()
+            server_sock.close()
+
+        with pytest.raises(ValueError):
+            vnc_client.register_message_handler(ServerMessage.FRAMEBUFFER_UPDATE, lambda: True)
+
+    def test_cursor_pseudo_encoding(self, vnc_client):
+        """Test that the cursor shape is cached and drawn at the pointer position on request."""
+        client_sock, server_sock = socket.socketpair()
+        vnc_client.socket = client_sock
+        vnc_client.width, vnc_client.height = 4, 4
+        vnc_client.pixel_format = PixelFormat(bytes([32, 24, 1, 1, 0, 255, 0, 255, 0, 255, 16, 8, 0, 0, 0, 0]))
+        # A black screen, then a 1x1 red cursor with hotspot (0, 0)
+        screen = (bytes(4) + (4).to_bytes(2, 'big') + (4).to_bytes(2, 'big') + bytes(4) + bytes(64))
+        cursor = (bytes(4) + (1).to_bytes(2, 'big') + (1).to_bytes(2, 'big')
+                  + Encoding.CURSOR.to_bytes(4, 'big', signed=True) + bytes([0, 255, 0, 0]) + bytes([0x80]))
+
+        try:
+            server_sock.sendall(bytes([0, 0, 0, 2]) + screen + cursor)
+            assert vnc_client.capture_image() is not None
+            assert vnc_client.cursor is not None
+            # The cursor is not part of the framebuffer
+            assert all(rect == (0, 0, 4, 4) for rect in vnc_client._frame_changes[-1][1])
+
+            assert vnc_client.send_pointer_event(2, 3, 0)
+            server_sock.recv(6)
+            server_sock.sendall(bytes([0, 0, 0, 0]))
+            img = vnc_client.capture_image(incremental=True, show_cursor=True)
+            assert img.getpixel((2, 3)) == (255, 0, 0)
+            assert img.getpixel((1, 1)) == (0, 0, 0)
+            server_sock.sendall(bytes([0, 0, 0, 0]))
+            assert vnc_client.capture_image(incremental=True).getpixel((2, 3)) == (0, 0, 0)
+        finally:
+            client_sock.close()
+            server_sock.close()
+
+    def test_wait_for_screen(self, vnc_client):
+        """Test waiting for screen changes on the incremental update stream."""
+        client_sock, server_sock = socket.socketpair()
+        vnc_client.socket = client_sock
+        vnc_client.width, vnc_client.height = 2, 1
+        vnc_client.pixel_format = PixelFormat(bytes([32, 24, 1, 1, 0, 255, 0, 255, 0, 255, 16, 8, 0, 0, 0, 0]))
+
+        def framebuffer_update(x: int, pixel: bytes) -> bytes:
+            return (bytes([0, 0]) + (1).to_bytes(2, 'big') + x.to_bytes(2, 'big') + bytes(2)
+                    + (1).to_bytes(2, 'big') + (1).to_bytes(2, 'big') + bytes(4) + pixel)
+
+        try:
+            server_sock.sendall(framebuffer_update(0, bytes(4)))
+            # Nothing changes: "stable" returns after the quiet period
+            result = vnc_client.wait_for_screen("stable", stable_ms=50, timeout=5)
+            assert result["status"] == "stable"
+            # The receiver started for the wait is stopped again; the reply to its last
+            # request is applied by the next health check instead of failing it
+            assert not vnc_client.frame_receiver_running()
+            sequence = vnc_client.frame_sequence
+            server_sock.sendall(framebuffer_update(0, bytes(4)))
+            time.sleep(0.05)
+            assert vnc_client.is_alive()
+            assert vnc_client.frame_sequence == sequence + 1
+
+            # Repainting identical pixels is not a change
+            server_sock.sendall(framebuffer_update(0, bytes(4)))
+            assert vnc_client.wait_for_screen("change", timeout=0.3)["status"] == "timeout"
+
+            # A change outside the watched region is ignored, one inside is reported
+            timer = threading.Timer(0.1, server_sock.sendall, [framebuffer_update(1, bytes([0, 255, 0, 0]))])
+            timer.start()
+            assert vnc_client.wait_for_screen("change", region=(0, 0, 1, 1), timeout=0.5)["status"] == "timeout"
+            timer = threading.Timer(0.1, server_sock.sendall, [framebuffer_update(0, bytes([0, 255, 0, 0]))])
+            timer.start()
+            result = vnc_client.wait_for_screen("change", region=(0, 0, 1, 1), timeout=5)
+            assert (result["status"], result["changes"]) == ("changed", 1)
+            assert result["frame"] == f"{vnc_client.session_id}:{vnc_client.frame_sequence}"
+        finally:
+            vnc_client.close()
+            server_sock.close()
+
+    def test_color_depth(self):
+        """Test the pixel formats requested for each colour depth."""
+        message = VNCClient(host="test_host", color_depth="16")._pixel_format_message()
+        assert message[0] == 0
+        pixel_format = PixelFormat(message[4:20])
+        assert (pixel_format.bits_per_pixel, pixel_format.red_max, pixel_format.green_max) == (16, 31, 63)
+        assert PixelFormat(VNCClient(host="test_host")._pixel_format_message()[4:20]).bits_per_pixel == 32
+
+        with pytest.raises(ValueError):
+            VNCClient(host="test_host", color_depth="12")
+
+    def test_quality_pseudo_encodings(self):
+        """Test the quality and compression level pseudo-encodings."""
+        client = VNCClient(host="test_host", quality_level=3, compress_level=9)
+        encodings = client._client_encodings()
+        assert encodings[0] == Encoding.TIGHT
+        assert encodings[-2:] == [Encoding.QUALITY_LEVEL_0 + 3, Encoding.COMPRESS_LEVEL_0 + 9]
+
+        with patch('src.vnc_client.VNC_QUALITY_LEVEL', ''), patch('src.vnc_client.VNC_COMPRESS_LEVEL', ''):
+            client = VNCClient(host="test_host")
+            assert client._client_encodings() == SUPPORTED_ENCODINGS
+
+        with pytest.raises(ValueError):
+            VNCClient(host="test_host", quality_level=10)
+
     @pytest.mark.asyncio
     @patch('src.vnc_client.VNCClient')
     async def test_capture_vnc_screen_success(self, mock_vnc_client_class):
@@ -163,42 +896,26 @@ class TestVNCClient:
         # Mock connect() to return success
         mock_vnc_instance.connect.return_value = (True, None)
         
-        # Create a small test image for the mock to return
-        test_image = Image.new('RGB', (50, 30), color='red')
-        img_bytes = io.BytesIO()
-        test_image.save(img_bytes, format='PNG')
-        img_bytes.seek(0)
-        screen_data = img_bytes.getvalue()
-        
-        # Mock capture_screen() to return the test image
-        mock_vnc_instance.capture_screen.return_value = screen_data
+        # capture_image() returns the unencoded framebuffer image
+        mock_vnc_instance.capture_image.return_value = Image.new('RGB', (50, 30), color='red')
         mock_vnc_instance.width = 50
         mock_vnc_instance.height = 30
-        
-        # Also mock PIL.Image behavior for scaling
-        with patch('src.vnc_client.Image') as mock_pil:
-            mock_img = MagicMock()
-            mock_pil.open.return_value = mock_img
-            mock_img.resize.return_value = mock_img
-            
-            # Mock BytesIO for getting the output
-            with patch('src.vnc_client.io.BytesIO') as mock_bytesio:
-                mock_output = MagicMock()
-                mock_bytesio.return_value = mock_output
-                mock_output.getvalue.return_value = b'scaled_image_data'
-                
-                # Act
-                success, data, error, dimensions = await capture_vnc_screen(
-                    host="test_host", 
-                    port=5900, 
-                    password="test_password"
-                )
+
+        # Act
+        success, data, error, dimensions = await capture_vnc_screen(
+            host="test_host",
+            port=5900,
+            password="test_password"
+        )
         
         # Assert
         assert success is True
         assert data is not None
         assert error is None
         assert dimensions == (1366, 768)  # Target size after scaling
+        # Scaled and encoded once, in the requested format
+        img = Image.open(io.BytesIO(data))
+        assert (img.format, img.size) == ("PNG", (1366, 768))
         mock_vnc_client_class.assert_called_once_with(
             host="test_host", 
             port=5900, 
@@ -207,9 +924,38 @@ class TestVNCClient:
             encryption="prefer_on"
         )
         mock_vnc_instance.connect.assert_called_once()
-        mock_vnc_instance.capture_screen.assert_called_once()
+        mock_vnc_instance.capture_image.assert_called_once()
         mock_vnc_instance.close.assert_called_once()
     
+    @pytest.mark.asyncio
+    @patch('src.vnc_client.VNCClient')
+    async def test_capture_vnc_screen_delta(self, mock_vnc_client_class):
+        """Test that a delta capture returns scaled crops of the changed regions."""
+        # Arrange - a 2732x1536 screen is scaled by exactly one half
+        mock_vnc_instance = MagicMock()
+        mock_vnc_client_class.return_value = mock_vnc_instance
+        mock_vnc_instance.connect.return_value = (True, None)
+        mock_vnc_instance.capture_image.return_value = Image.new('RGB', (2732, 1536), color='blue')
+        mock_vnc_instance.width, mock_vnc_instance.height = 2732, 1536
+        mock_vnc_instance.frame_age.return_value = None
+        mock_vnc_instance.frame_id.return_value = "abcd:2"
+        mock_vnc_instance.changes_since.return_value = [(64, 0, 64, 64), (2701, 1500, 31, 36)]
+
+        # Act
+        frame_info = {}
+        success, data, error, dimensions = await capture_vnc_screen(
+            host="test_host", port=5900, password="test_password", frame_info=frame_info,
+            since_frame="abcd:1"
+        )
+
+        # Assert
+        assert (success, data, dimensions) == (True, None, (1366, 768))
+        mock_vnc_instance.changes_since.assert_called_once_with("abcd:1")
+        regions = frame_info["regions"]
+        assert [(r["x"], r["y"], r["width"], r["height"]) for r in regions] == [(32, 0, 32, 32), (1350, 750, 16, 18)]
+        assert Image.open(io.BytesIO(regions[0]["data"])).size == (32, 32)
+        assert frame_info["frame"] == "abcd:2"
+
     @pytest.mark.asyncio
     @patch('src.vnc_client.VNCClient')
     async def test_capture_vnc_screen_connection_error(self, mock_vnc_client_class):
@@ -238,6 +984,23 @@ class TestVNCClient:
         mock_vnc_instance.close.assert_called_once()
         mock_vnc_instance.capture_screen.assert_not_called()
     
+    @pytest.mark.asyncio
+    async def test_region_outside_screen_keeps_pooled_connection(self):
+        """Test that a region outside the screen is an argument error, not a broken connection."""
+        vnc = MagicMock()
+        vnc.width, vnc.height = 1366, 768
+        pool = MagicMock()
+        pool.acquire.return_value = (vnc, None)
+
+        with pytest.raises(ValueError, match="outside the 1366x768 screen"):
+            await capture_vnc_screen_region("test_host", 5900, "pw", (2000, 0, 10, 10), pool=pool)
+        with pytest.raises(ValueError, match="outside the 1366x768 screen"):
+            await wait_for_vnc_screen("test_host", 5900, "pw", pool=pool, region=(0, 900, 10, 10))
+
+        assert pool.release.call_args_list == [call(vnc, discard=False)] * 2
+        vnc.capture_image.assert_not_called()
+        vnc.wait_for_screen.assert_not_called()
+
     @patch('socket.socket')
     def test_socket_connection(self, mock_socket_class):
         """Test socket connection in isolation."""
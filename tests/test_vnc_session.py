@@ -0,0 +1,219 @@
+import os
+import sys
+import time
+import threading
+import pytest
+from unittest.mock import patch, MagicMock
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.vnc_session import VNCSessionPool
+
+VNC_CLIENT_PATH = 'src.vnc_session.VNCClient'
+
+
+def make_client(connected: bool = True, alive: bool = True) -> MagicMock:
+    """Create a mock VNCClient."""
+    client = MagicMock()
+    client.connect.return_value = (True, None) if connected else (False, "Connection refused")
+    client.is_alive.return_value = alive
+    return client
+
+
+class TestVNCSessionPool:
+    """Test suite for VNCSessionPool class."""
+
+    def test_acquire_connects_once_and_reuses(self):
+        """Test that a released connection is reused for the same host."""
+        with patch(VNC_CLIENT_PATH) as mock_vnc_class:
+            client = make_client()
+            mock_vnc_class.return_value = client
+            pool = VNCSessionPool(max_size=1, idle_timeout=60)
+
+            first, error = pool.acquire("host", 5900, "pw", "user")
+            pool.release(first)
+            second, _ = pool.acquire("host", 5900, "pw", "user")
+
+            assert error is None
+            assert first is second
+            client.connect.assert_called_once()
+            client.close.assert_not_called()
+            pool.release(second)
+            pool.close_all()
+
+    def test_acquire_separates_keys(self):
+        """Test that sessions are not shared between different usernames."""
+        with patch(VNC_CLIENT_PATH) as mock_vnc_class:
+            mock_vnc_class.side_effect = [make_client(), make_client()]
+            pool = VNCSessionPool(max_size=1, idle_timeout=60)
+
+            first, _ = pool.acquire("host", 5900, "pw", "alice")
+            second, _ = pool.acquire("host", 5900, "pw", "bob")
+
+            assert first is not second
+            assert mock_vnc_class.call_count == 2
+            assert set(pool.stats().keys()) == {"host:5900/alice", "host:5900/bob"}
+            pool.release(first)
+            pool.release(second)
+            pool.close_all()
+
+    def test_acquire_connection_failure(self):
+        """Test that a failed handshake frees the slot and reports the error."""
+        with patch(VNC_CLIENT_PATH) as mock_vnc_class:
+            mock_vnc_class.side_effect = [make_client(connected=False), make_client()]
+            pool = VNCSessionPool(max_size=1, idle_timeout=60)
+
+            client, error = pool.acquire("host", 5900, "pw")
+            assert client is None
+            assert error == "Connection refused"
+
+            client, error = pool.acquire("host", 5900, "pw")
+            assert client is not None
+            assert error is None
+            pool.release(client)
+            pool.close_all()
+
+    def test_acquire_connection_exception_frees_slot(self):
+        """Test that a connect raising instead of returning an error frees the slot."""
+        with patch(VNC_CLIENT_PATH) as mock_vnc_class:
+            broken = make_client()
+            broken.connect.side_effect = OSError("Network is unreachable")
+            mock_vnc_class.side_effect = [RuntimeError("Bad settings"), broken, make_client()]
+            pool = VNCSessionPool(max_size=1, idle_timeout=60, acquire_timeout=0.1)
+
+            for expected in ("Bad settings", "Network is unreachable"):
+                client, error = pool.acquire("host", 5900, "pw")
+                assert client is None
+                assert expected in error
+            broken.close.assert_called_once()
+
+            client, error = pool.acquire("host", 5900, "pw")
+            assert client is not None
+            assert error is None
+            pool.release(client)
+            pool.close_all()
+
+    def test_unhealthy_session_is_replaced(self):
+        """Test that a session failing its health check is closed and reconnected."""
+        with patch(VNC_CLIENT_PATH) as mock_vnc_class:
+            dead, fresh = make_client(alive=False), make_client()
+            mock_vnc_class.side_effect = [dead, fresh]
+            pool = VNCSessionPool(max_size=1, idle_timeout=60)
+
+            client, _ = pool.acquire("host", 5900, "pw")
+            pool.release(client)
+            client, _ = pool.acquire("host", 5900, "pw")
+
+            assert client is fresh
+            dead.close.assert_called_once()
+            pool.release(client)
+            pool.close_all()
+
+    def test_health_check_runs_outside_the_lock(self):
+        """Test that a slow health check does not block other callers of the pool."""
+        with patch(VNC_CLIENT_PATH) as mock_vnc_class:
+            client = make_client()
+            mock_vnc_class.return_value = client
+            pool = VNCSessionPool(max_size=1, idle_timeout=60)
+            acquired, _ = pool.acquire("host", 5900, "pw")
+            pool.release(acquired)
+
+            def is_alive():
+                other = threading.Thread(target=pool.stats)
+                other.start()
+                other.join(timeout=1)
+                return not other.is_alive()
+            client.is_alive.side_effect = is_alive
+
+            reused, error = pool.acquire("host", 5900, "pw")
+            assert (reused, error) == (client, None)
+            client.close.assert_not_called()
+            pool.release(reused)
+            pool.close_all()
+
+    def test_release_discard_closes(self):
+        """Test that discarded sessions are closed instead of pooled."""
+        with patch(VNC_CLIENT_PATH) as mock_vnc_class:
+            client = make_client()
+            mock_vnc_class.return_value = client
+            pool = VNCSessionPool(max_size=1, idle_timeout=60)
+
+            acquired, _ = pool.acquire("host", 5900, "pw")
+            pool.release(acquired, discard=True)
+
+            client.close.assert_called_once()
+            assert pool.stats() == {}
+
+    def test_pool_size_is_bounded(self):
+        """Test that acquire waits for a free session and times out when none is released."""
+        with patch(VNC_CLIENT_PATH) as mock_vnc_class:
+            client = make_client()
+            mock_vnc_class.return_value = client
+            pool = VNCSessionPool(max_size=1, idle_timeout=60, acquire_timeout=0.1)
+
+            held, _ = pool.acquire("host", 5900, "pw")
+            blocked, error = pool.acquire("host", 5900, "pw")
+            assert blocked is None
+            assert "Timed out" in error
+
+            # A release from another thread wakes up the waiting caller
+            pool.acquire_timeout = 5
+            threading.Timer(0.05, pool.release, args=(held,)).start()
+            reused, error = pool.acquire("host", 5900, "pw")
+            assert reused is held
+            client.connect.assert_called_once()
+            pool.release(reused)
+            pool.close_all()
+
+    def test_evict_idle(self):
+        """Test that idle sessions are closed after the idle timeout."""
+        with patch(VNC_CLIENT_PATH) as mock_vnc_class:
+            client = make_client()
+            mock_vnc_class.return_value = client
+            pool = VNCSessionPool(max_size=1, idle_timeout=0.01)
+
+            acquired, _ = pool.acquire("host", 5900, "pw")
+            pool.release(acquired)
+            time.sleep(0.05)
+
+            pool.evict_idle()
+            client.close.assert_called_once()
+            assert pool.stats() == {}
+
+    def test_close_all_retires_sessions_in_use(self):
+        """Test that sessions in use during close_all are closed when released."""
+        with patch(VNC_CLIENT_PATH) as mock_vnc_class:
+            client = make_client()
+            mock_vnc_class.return_value = client
+            pool = VNCSessionPool(max_size=1, idle_timeout=60)
+
+            acquired, _ = pool.acquire("host", 5900, "pw")
+            pool.close_all()
+            client.close.assert_not_called()
+
+            pool.release(acquired)
+            client.close.assert_called_once()
+
+    def test_pinned_session(self):
+        """Test that a pinned client is handed out again inside the block."""
+        with patch(VNC_CLIENT_PATH) as mock_vnc_class:
+            client = make_client()
+            mock_vnc_class.return_value = client
+            pool = VNCSessionPool(max_size=1, idle_timeout=60)
+
+            held, _ = pool.acquire("host", 5900, "pw")
+            with pool.pinned(held) as pin:
+                # The pool is full, but the pinned client is returned without waiting
+                again, error = pool.acquire("host", 5900, "pw")
+                pool.release(again, discard=True)
+                assert (again, error) == (held, None)
+                assert pin.discard
+                # After a failure the pinned connection is not used again
+                assert pool.acquire("host", 5900, "pw")[0] is None
+
+            pool.release(held, discard=pin.discard)
+            client.connect.assert_called_once()
+            client.close.assert_called_once()
+            with pytest.raises(ValueError):
+                with pool.pinned(held):
+                    pass